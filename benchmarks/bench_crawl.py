@@ -0,0 +1,97 @@
+"""
+Runs the whole crawl (Spider, Page and App, async or pipeline engine)
+end to end against local fixture site and reports pages/s,
+apps/s, peak RSS and CPU time. No live site is touched.
+
+Usage:
+
+    python -m benchmarks.bench_crawl [--engine spider|async|pipeline] [--pages N]
+        [--apps-per-page N] [--latency S] [--failure-rate R] [--metadata-only]
+
+Compare numbers of the same arguments between revisions
+to catch performance regressions.
+"""
+import argparse
+import os
+import resource
+import sys
+import tempfile
+import typing as tp
+from time import perf_counter, process_time
+from unittest.mock import patch
+
+from benchmarks.fixture_server import FixtureServer, FixtureSite
+from crawler import main as crawler_main
+from crawler.config import config
+from crawler.metrics import metrics
+
+
+def run(site: FixtureSite, engine: str, latency: float, failure_rate: float,
+        metadata_only: bool) -> tp.Dict[str, float]:
+    with FixtureServer(site, latency=latency, failure_rate=failure_rate) as server, \
+            tempfile.TemporaryDirectory() as directory:
+        pages, apps, files = (metrics.counter(name).get() for name in ('pages_total', 'apps_total', 'files_total'))
+        started, cpu_started = perf_counter(), process_time()
+
+        # Every module reads the same Config instance, so its fields are patched in place
+        with patch.multiple(config,
+                            engine=engine,
+                            proxies=[server.url],
+                            apps_to_fetch=site.apps,
+                            max_depth=site.pages,
+                            metadata_only=metadata_only,
+                            output_path=os.path.join(directory, 'files.txt'),
+                            # Injected failures are retried soon
+                            retry_policies={kind: {'max_retries': 5, 'base_delay': 0.05, 'max_delay': 0.5}
+                                            for kind in ('timeout', 'server', 'blocked', 'error')}):
+            crawler_main.main()
+
+        elapsed, cpu_time = perf_counter() - started, process_time() - cpu_started
+        requests_count = server.requests_count
+
+    pages = metrics.counter('pages_total').get() - pages
+    apps = metrics.counter('apps_total').get() - apps
+    files = metrics.counter('files_total').get() - files
+
+    # ru_maxrss is in kilobytes on Linux, but in bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = max_rss / 2 ** 20 if sys.platform == 'darwin' else max_rss / 2 ** 10
+
+    return {
+        'pages': pages,
+        'apps': apps,
+        'files': files,
+        'requests': requests_count,
+        'elapsed': elapsed,
+        'pages_per_second': pages / elapsed,
+        'apps_per_second': apps / elapsed,
+        'cpu_time': cpu_time,
+        'max_rss_mb': max_rss_mb,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--engine', choices=('spider', 'async', 'pipeline'), default='spider')
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--apps-per-page', type=int, default=4)
+    parser.add_argument('--apk-entries', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--metadata-only', action='store_true')
+    args = parser.parse_args()
+
+    site = FixtureSite(pages=args.pages, fanout=args.fanout,
+                       apps_per_page=args.apps_per_page, apk_entries=args.apk_entries)
+    result = run(site, args.engine, args.latency, args.failure_rate, args.metadata_only)
+
+    print('%(pages)d pages, %(apps)d apps, %(files)d files, %(requests)d requests in %(elapsed).2f s' % result)
+    print('%(pages_per_second)10.1f pages/s' % result)
+    print('%(apps_per_second)10.1f apps/s' % result)
+    print('%(cpu_time)10.2f s CPU time' % result)
+    print('%(max_rss_mb)10.1f MB peak RSS' % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Compares memory of APK entries: original `File` dataclass with
+`__dict__` vs slotted File vs columnar FileBatch.
+
+Usage:
+
+    python -m benchmarks.bench_files [--entries N]
+
+Prints allocated memory blocks and bytes of built entries,
+both in total and per million of entries.
+"""
+import argparse
+import tracemalloc
+import typing as tp
+from dataclasses import dataclass
+
+from crawler.structs import File, FileBatch
+
+MIME_TYPES = ['application/vnd.android.dex', 'image/png', 'text/xml', 'application/octet-stream']
+
+
+@dataclass
+class LegacyFile:
+    # Original crawler.structs.File
+    archive_name: str = None
+    file_name: str = None
+    mime_type: str = None
+    size_deflated: int = None
+    size_compressed: int = None
+    crc: int = None
+    sha256: str = None
+
+
+def build_legacy(entries: int) -> tp.List[LegacyFile]:
+    return [LegacyFile('bench.apk', 'res/drawable/image_%s.png' % i,
+                       MIME_TYPES[i % len(MIME_TYPES)], i * 3, i * 2)
+            for i in range(entries)]
+
+
+def build_slotted(entries: int) -> tp.List[File]:
+    return [File('bench.apk', 'res/drawable/image_%s.png' % i,
+                 MIME_TYPES[i % len(MIME_TYPES)], i * 3, i * 2)
+            for i in range(entries)]
+
+
+def build_batch(entries: int) -> FileBatch:
+    batch = FileBatch('bench.apk')
+    for i in range(entries):
+        batch.append('res/drawable/image_%s.png' % i, MIME_TYPES[i % len(MIME_TYPES)], i * 3, i * 2)
+    return batch
+
+
+def measure(build: tp.Callable[[int], tp.Any], entries: int) -> tp.Tuple[int, int]:
+    """
+    Returns count and size of memory blocks, held by built entries.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build(entries)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    del result
+    return sum(stat.count_diff for stat in stats), sum(stat.size_diff for stat in stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=10 ** 6)
+    args = parser.parse_args()
+
+    scale = 10 ** 6 / args.entries
+    print('%-8s %14s %12s %16s %12s' % ('', 'blocks', 'MB', 'blocks per 1M', 'MB per 1M'))
+    for name, build in (('legacy', build_legacy), ('slotted', build_slotted), ('batch', build_batch)):
+        blocks, size = measure(build, args.entries)
+        print('%-8s %14d %12.1f %16d %12.1f' % (
+            name, blocks, size / 2 ** 20, blocks * scale, size * scale / 2 ** 20))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Counts page fetches, needed to find N apps with
+each frontier scheduler on synthetic APKMirror-like site.
+
+Usage:
+
+    python -m benchmarks.bench_frontier [--apps N] [--seed S]
+
+Site has paginated listing (/page/N/), each listing page links to
+app pages (/apk/...) with a few download links and to sections
+(/apk/vendor/), which are mostly app-less navigation.
+"""
+import argparse
+import random
+import typing as tp
+
+from crawler.config import config
+from crawler.page import Page
+from crawler.scheduler import SCHEDULERS
+
+# path -> (page links, app links)
+Site = tp.Dict[str, tp.Tuple[tp.List[str], tp.List[str]]]
+
+
+def build_site(listing_pages: int, rng: random.Random) -> Site:
+    site: Site = {'/': (['/page/1/', '/apk/vendor-0/'], [])}
+
+    for page in range(1, listing_pages + 1):
+        links = ['/page/%s/' % (page + 1), '/page/%s/' % min(page + 10, listing_pages)]
+        for i in range(10):
+            app = page * 10 + i
+            links.append('/apk/vendor-%s/app-%s/' % (app // 30, app))
+            links.append('/apk/vendor-%s/' % (app // 30))
+        site['/page/%s/' % page] = (links, [])
+
+    for app in range(10, (listing_pages + 1) * 10):
+        vendor = app // 30
+        path = '/apk/vendor-%s/app-%s/' % (vendor, app)
+        apps = ['%sapp-%s-%s-android-apk-download/' % (path, app, release)
+                for release in range(rng.randint(1, 3))]
+        site[path] = (['/apk/vendor-%s/' % vendor, '/page/%s/' % rng.randint(1, listing_pages)], apps)
+
+    for vendor in range(listing_pages // 3 + 2):
+        # Sections link to other sections only
+        site['/apk/vendor-%s/' % vendor] = (['/apk/vendor-%s/' % (vendor + 1), '/'], [])
+
+    return site
+
+
+def crawl(kind: str, site: Site, apps_to_fetch: int, max_depth: int) -> int:
+    """
+    Replays Spider loop over site, returns amount of fetched pages.
+    """
+    scheduler = SCHEDULERS[kind]()
+    scheduler.push(Page(path='/'))
+    visited, apps = {'/'}, set()
+    fetches = 0
+
+    while scheduler and len(apps) < apps_to_fetch:
+        page = scheduler.pop()
+        fetches += 1
+
+        page_links, app_links = site.get(page.path, ([], []))
+        page.page_links, page.app_links = set(page_links), set(app_links)
+        apps.update(app_links)
+
+        for child in page.children():
+            if child.path not in visited and child.recursion_level <= max_depth:
+                visited.add(child.path)
+                scheduler.push(child, parent=page)
+
+    return fetches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--apps', type=int, default=2000)
+    parser.add_argument('--listing-pages', type=int, default=1000)
+    parser.add_argument('--max-depth', type=int, default=config.max_depth)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    site = build_site(args.listing_pages, random.Random(args.seed))
+    print('%s apps, %s pages on site' % (args.apps, len(site)))
+    for kind in SCHEDULERS:
+        fetches = crawl(kind, site, args.apps, args.max_depth)
+        print('%-6s %8s page fetches  %6.2f apps per fetch' % (kind, fetches, args.apps / fetches))
+
+
+if __name__ == '__main__':
+    main()
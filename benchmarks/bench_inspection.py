@@ -0,0 +1,94 @@
+"""
+Measures APK analysis throughput in MB/s of uncompressed
+contents per core: shallow listing vs deep inspection.
+
+Usage:
+
+    python -m benchmarks.bench_inspection [apk ...] [--workers N]
+
+If no APKs are given, synthetic one is used instead.
+With `--workers`, APKs are analysed in process pool to
+show how throughput scales with cores.
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import typing as tp
+from concurrent.futures import ProcessPoolExecutor
+from timeit import default_timer
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+from crawler.app import App
+from crawler.inspection import InspectionStats, inspect_archive
+
+
+def build_synthetic_apk(path: str, size: int = 64 * 1024 ** 2) -> None:
+    rng = random.Random(0)
+    # Half-random data compresses about as well as DEX and resources
+    block = bytes(rng.getrandbits(8) for _ in range(32 * 1024)) + bytes(32 * 1024)
+
+    inner = io.BytesIO()
+    with ZipFile(inner, 'w', compression=ZIP_DEFLATED) as jar:
+        for i in range(16):
+            jar.writestr('com/example/Class%s.class' % i, block)
+
+    with ZipFile(path, 'w', compression=ZIP_DEFLATED) as apk:
+        apk.writestr('classes.dex', block * 64)
+        apk.writestr('lib/inner.jar', inner.getvalue(), compress_type=ZIP_STORED)
+        for i in range(size // len(block) - 64):
+            apk.writestr('res/drawable/image_%s.png' % i, block)
+
+
+def analyse(path: str, deep: bool) -> int:
+    """
+    Returns amount of uncompressed bytes, processed.
+    """
+    with ZipFile(path) as zipfile:
+        if deep:
+            stats = InspectionStats()
+            for _ in inspect_archive(zipfile, 'bench.apk', App._get_mime_type, stats):
+                ...
+            return stats.bytes_read
+
+        for _ in App.list_archive(zipfile, 'bench.apk'):
+            ...
+        return sum(zipinfo.file_size for zipinfo in zipfile.infolist())
+
+
+def measure(paths: tp.List[str], deep: bool, workers: int) -> tp.Tuple[float, float]:
+    started = default_timer()
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            processed = sum(executor.map(analyse, paths, [deep] * len(paths)))
+    else:
+        processed = sum(analyse(path, deep) for path in paths)
+    elapsed = default_timer() - started
+
+    throughput = processed / 2 ** 20 / elapsed
+    return throughput, throughput / workers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('apks', nargs='*')
+    parser.add_argument('--workers', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = args.apks
+        if not paths:
+            path = os.path.join(directory, 'synthetic.apk')
+            build_synthetic_apk(path)
+            paths = [path] * max(args.workers, 1)
+
+        print('%s APKs, %s workers' % (len(paths), args.workers))
+        for deep in (False, True):
+            throughput, per_core = measure(paths, deep, args.workers)
+            print('%-8s %10.1f MB/s  %10.1f MB/s per core' % (
+                'deep' if deep else 'listing', throughput, per_core))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Compares mime type resolution of APK entries: original
+`mimetypes` + `pathlib` function vs memoized table lookup
+and its batch version over `ZipFile.infolist()`.
+
+Usage:
+
+    python -m benchmarks.bench_mime [apk] [--rounds N]
+
+If APK is omitted, synthetic list of entries is used instead.
+"""
+import argparse
+import mimetypes
+import pathlib
+import typing as tp
+from timeit import default_timer
+from zipfile import ZipFile, ZipInfo
+
+from crawler.config import config
+from crawler.mime import get_mime_type, get_mime_types
+
+
+def legacy_get_mime_type(filename: str) -> str:
+    # Original App._get_mime_type
+    mime_type, _ = mimetypes.guess_type(filename, strict=True)
+    if mime_type:
+        return mime_type
+
+    suffix = pathlib.Path(filename).suffix
+    if suffix:
+        return 'application/{}'.format(suffix[1:])
+
+    return config.unknown_mime_failback
+
+
+def build_synthetic_infolist(count: int = 50000) -> tp.List[ZipInfo]:
+    # Typical APK: mostly resources, a few DEX and native libraries
+    names = ['res/layout/view_%s.xml', 'res/drawable-xxhdpi/icon_%s.png', 'res/raw/sound_%s.ogg',
+             'lib/arm64-v8a/libmodule%s.so', 'assets/fonts/font_%s.ttf', 'META-INF/services/%s',
+             'kotlin/collections/%s.kotlin_builtins', 'classes%s.dex', 'resources.arsc']
+    return [ZipInfo(names[i % len(names)].replace('%s', str(i))) for i in range(count)]
+
+
+def measure(function: tp.Callable[[tp.List[ZipInfo]], tp.Any], infolist: tp.List[ZipInfo], rounds: int) -> float:
+    started = default_timer()
+    for _ in range(rounds):
+        function(infolist)
+    return (default_timer() - started) / rounds / len(infolist)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('apk', nargs='?')
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.apk:
+        with ZipFile(args.apk) as zipfile:
+            infolist = zipfile.infolist()
+    else:
+        infolist = build_synthetic_infolist()
+
+    functions = {
+        'legacy': lambda entries: [legacy_get_mime_type(zipinfo.filename) for zipinfo in entries],
+        'table': lambda entries: [get_mime_type(zipinfo.filename) for zipinfo in entries],
+        'batch': get_mime_types,
+    }
+
+    print('%s entries' % len(infolist))
+    baseline = None
+    for name, function in functions.items():
+        elapsed = measure(function, infolist, args.rounds)
+        baseline = baseline or elapsed
+        print('%-8s %8.2f us/entry  x%.1f' % (name, elapsed * 1e6, baseline / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Compares HTML parser backends on saved APKMirror pages.
+
+Usage:
+
+    python -m benchmarks.bench_parsers [pages_dir] [--rounds N]
+
+`pages_dir` should contain saved *.html pages. If it's
+omitted, synthetic listing page is used instead.
+"""
+import argparse
+import pathlib
+import typing as tp
+from timeit import default_timer
+
+from crawler.page import Page
+from crawler.parsers import PARSERS, get_parser
+
+
+def build_synthetic_page(links_count: int = 500) -> str:
+    links = []
+    for i in range(links_count):
+        links.append('<div class="appRow"><a class="fontBlack" '
+                     'href="/apk/vendor-%s/app-%s/app-%s-release/app-%s-android-apk-download/">'
+                     'App %s</a><a href="/page/%s/">%s</a></div>' % (i, i, i, i, i, i, i))
+
+    return '<html><head><link rel="shortlink" href="https://www.apkmirror.com/?p=1">' \
+           '</head><body>%s</body></html>' % ''.join(links)
+
+
+def load_pages(pages_dir: tp.Optional[str]) -> tp.List[str]:
+    if not pages_dir:
+        return [build_synthetic_page()]
+
+    paths = sorted(pathlib.Path(pages_dir).glob('*.html'))
+    assert paths, 'no *.html pages found in %s' % pages_dir
+    return [path.read_text(errors='replace') for path in paths]
+
+
+def extract_links(parser_name: str, html: str) -> tp.Tuple[tp.Set[str], tp.Set[str]]:
+    page = Page('/')
+    page.html = html
+
+    page.extract_links(parser=get_parser(parser_name))
+
+    return page.app_links, page.page_links
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('pages_dir', nargs='?')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages_dir)
+    total_bytes = sum(len(html) for html in pages)
+
+    reference = [extract_links('bs4', html) for html in pages]
+    print('%s pages, %.1f KB total, %s rounds' % (len(pages), total_bytes / 1024, args.rounds))
+
+    for name in PARSERS:
+        try:
+            get_parser(name)
+        except AssertionError as exc:
+            print('%-8s skipped: %s' % (name, exc))
+            continue
+
+        results = [extract_links(name, html) for html in pages]
+        same_links = results == reference
+
+        started = default_timer()
+        for _ in range(args.rounds):
+            for html in pages:
+                extract_links(name, html)
+        elapsed = default_timer() - started
+
+        per_page = elapsed / (args.rounds * len(pages))
+        print('%-8s %8.3f ms/page %8.1f pages/s  same links as bs4: %s' % (
+            name, per_page * 1000, 1 / per_page, same_links))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Measures memory per million visited URLs for
+each visited set kind, compared with plain set.
+
+Usage:
+
+    python -m benchmarks.bench_visited [--count N]
+"""
+import argparse
+import tracemalloc
+import typing as tp
+from timeit import default_timer
+
+from crawler.visited import VISITED_SETS, make_visited_set
+
+
+def generate_paths(count: int) -> tp.Generator[str, None, None]:
+    # Long, APKMirror-like app paths
+    for i in range(count):
+        yield '/apk/vendor-{0}/application-{0}/application-{0}-{1}-release/' \
+              'application-{0}-{1}-android-apk-download/'.format(i // 10, i)
+
+
+def measure(kind: str, count: int) -> tp.Tuple[int, float, float]:
+    # Time is measured separately, tracemalloc slows down allocations
+    tracemalloc.start()
+    visited = make_visited_set(kind)
+    for path in generate_paths(count):
+        visited.add(path)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    started = default_timer()
+    visited = make_visited_set(kind)
+    for path in generate_paths(count):
+        visited.add(path)
+    elapsed = default_timer() - started
+
+    hits_started = default_timer()
+    assert all(path in visited for path in generate_paths(min(count, 10000)))
+    lookup_elapsed = (default_timer() - hits_started) / min(count, 10000)
+
+    return memory, elapsed, lookup_elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=1000000)
+    args = parser.parse_args()
+
+    print('%s paths' % args.count)
+    for kind in VISITED_SETS:
+        memory, elapsed, lookup_elapsed = measure(kind, args.count)
+        per_million = memory / args.count * 1000000
+        print('%-8s %8.1f MB per million  %6.1f bytes/path  %6.2f s to fill  %6.2f us/lookup' % (
+            kind, per_million / 2 ** 20, memory / args.count, elapsed, lookup_elapsed * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Compares listing of downloaded APKs: ZipFile with buffered
+reads and ZipInfo objects vs mmap-backed central directory scan.
+
+Usage:
+
+    python -m benchmarks.bench_zip_scan [apk ...] [--entries N] [--repeat N]
+
+If no APKs are given, synthetic one with `--entries`
+entries is used instead. Prints archives listed per
+second and peak memory allocated while listing.
+"""
+import argparse
+import os
+import tempfile
+import tracemalloc
+import typing as tp
+from timeit import default_timer
+from zipfile import ZipFile, ZIP_STORED
+
+from crawler.app import App
+
+
+def build_synthetic_apk(path: str, entries: int) -> None:
+    with ZipFile(path, 'w', compression=ZIP_STORED) as apk:
+        for i in range(entries):
+            apk.writestr('res/drawable-xxhdpi-v4/image_%s.png' % i, b'')
+
+
+def list_with_zipfile(path: str) -> int:
+    with open(path, 'rb') as file, ZipFile(file) as zipfile:
+        return len(App.list_archive(zipfile, 'bench.apk'))
+
+
+def list_with_mmap(path: str) -> int:
+    with open(path, 'rb') as file:
+        return len(App.scan_archive(file, 'bench.apk'))
+
+
+def measure(list_archive: tp.Callable[[str], int], paths: tp.List[str], repeat: int) -> tp.Tuple[float, float]:
+    """
+    Returns archives per second and peak MB allocated.
+    """
+    started = default_timer()
+    for _ in range(repeat):
+        for path in paths:
+            list_archive(path)
+    elapsed = default_timer() - started
+
+    tracemalloc.start()
+    for path in paths:
+        list_archive(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return repeat * len(paths) / elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('apks', nargs='*')
+    parser.add_argument('--entries', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = args.apks
+        if not paths:
+            path = os.path.join(directory, 'synthetic.apk')
+            build_synthetic_apk(path, args.entries)
+            paths = [path]
+
+        print('%s APKs, %s repeats' % (len(paths), args.repeat))
+        for name, list_archive in (('zipfile', list_with_zipfile), ('mmap', list_with_mmap)):
+            rate, peak = measure(list_archive, paths, args.repeat)
+            print('%-8s %10.1f APKs/s %10.2f MB peak' % (name, rate, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Local stand-in of APKMirror for offline benchmarks and tests.
+
+Serves synthetic site graph: listing pages, app pages with
+'shortlink' tags, download handler redirects and APK-like ZIPs.
+Server accepts both direct and proxied requests (absolute URIs
+in request line), so it's used as the only proxy of crawler
+and `config.network_location` stays untouched.
+
+Usage:
+
+    python -m benchmarks.fixture_server [--port N] [--pages N] ...
+
+or from code:
+
+    with FixtureServer(FixtureSite(pages=100)) as server:
+        config.proxies = [server.url]
+        ...
+"""
+import argparse
+import io
+import random
+import re
+import threading
+import typing as tp
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from crawler.config import config
+
+PAGE_PATTERN = re.compile(r'^/page/(\d+)/$')
+APP_PATTERN = re.compile(r'^/apk/fixture/app-(\d+)/app-\d+-download/$')
+APK_PATTERN = re.compile(r'^/wp-content/uploads/app-(\d+)\.apk$')
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FixtureSite:
+    """
+    Deterministic site graph. Page N links to pages N * fanout + 1 ...
+    N * fanout + fanout (tree), to root page (cycle) and to its
+    `apps_per_page` apps. Root page is page 0. Download ID of
+    app is its number + 1, so it's never 0.
+    """
+
+    def __init__(self,
+                 pages: int = 100,
+                 fanout: int = 3,
+                 apps_per_page: int = 5,
+                 apk_entries: int = 50,
+                 apk_entry_size: int = 4096):
+        self.pages: int = pages
+        self.fanout: int = fanout
+        self.apps_per_page: int = apps_per_page
+        self.apk_entries: int = apk_entries
+        self.apk_entry_size: int = apk_entry_size
+
+    @property
+    def apps(self) -> int:
+        return self.pages * self.apps_per_page
+
+    @staticmethod
+    def page_path(page: int) -> str:
+        return '/' if page == 0 else '/page/%s/' % page
+
+    @staticmethod
+    def app_path(app: int) -> str:
+        return '/apk/fixture/app-%s/app-%s-download/' % (app, app)
+
+    def page_html(self, page: int) -> str:
+        children = range(page * self.fanout + 1, min(page * self.fanout + self.fanout, self.pages - 1) + 1)
+        apps = range(page * self.apps_per_page, (page + 1) * self.apps_per_page)
+
+        links = [self.page_path(child) for child in children] + ['/'] + \
+            [self.app_path(app) for app in apps]
+        return '<html><body>%s</body></html>' % ''.join(
+            '<div class="row"><a href="http://%s%s">link</a></div>' % (config.network_location, link)
+            for link in links)
+
+    def app_html(self, app: int) -> str:
+        return '<html><head><link rel="shortlink" href="http://%s/?p=%s"></head>' \
+               '<body><a href="%s?id=%s">Download</a></body></html>' % (
+                   config.network_location, app + 1, config.download_handler_path, app + 1)
+
+    @lru_cache(maxsize=256)
+    def apk(self, app: int) -> bytes:
+        rng = random.Random(app)
+        buffer = io.BytesIO()
+        with ZipFile(buffer, 'w', compression=ZIP_DEFLATED) as apk:
+            apk.writestr('AndroidManifest.xml', '<manifest package="com.fixture.app%s"/>' % app)
+            apk.writestr('classes.dex', _random_bytes(rng, self.apk_entry_size))
+            for entry in range(self.apk_entries - 2):
+                # Half-random data compresses about as well as resources
+                data = _random_bytes(rng, self.apk_entry_size // 2) + bytes(self.apk_entry_size // 2)
+                apk.writestr('res/drawable/image_%s.png' % entry, data)
+        return buffer.getvalue()
+
+
+class FixtureServer:
+    """
+    Serves FixtureSite over HTTP from background thread.
+
+    Each request waits `latency` seconds, and `failure_rate`
+    share of requests fails with `failure_status`.
+
+    Usage:
+
+        with FixtureServer(FixtureSite(), latency=0.05, failure_rate=0.01) as server:
+            print(server.url, server.requests_count)
+
+    @contextmanager
+    """
+
+    def __init__(self,
+                 site: FixtureSite = None,
+                 port: int = 0,
+                 latency: float = 0.0,
+                 failure_rate: float = 0.0,
+                 failure_status: int = 503,
+                 seed: int = 0):
+        self.site: FixtureSite = site or FixtureSite()
+        self.port: int = port
+        self.latency: float = latency
+        self.failure_rate: float = failure_rate
+        self.failure_status: int = failure_status
+
+        self.requests_count: int = 0
+        self.failures_count: int = 0
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server: tp.Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return 'http://127.0.0.1:%s' % self.server.server_address[1]
+
+    def __enter__(self) -> 'FixtureServer':
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body are written separately
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fixture._handle(self)
+
+            def log_message(self, format, *args):
+                ...
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        with self.lock:
+            self.requests_count += 1
+            failed = self.random.random() < self.failure_rate
+            if failed:
+                self.failures_count += 1
+
+        if self.latency:
+            sleep(self.latency)
+        if failed:
+            self._respond(handler, self.failure_status, b'Service Unavailable')
+            return
+
+        # Proxied requests come with absolute URI
+        _, _, path, query, _ = urlsplit(handler.path)
+
+        match = PAGE_PATTERN.match(path)
+        if path == '/' or match and int(match.group(1)) < self.site.pages:
+            page = int(match.group(1)) if match else 0
+            self._respond(handler, 200, self.site.page_html(page).encode(), 'text/html; charset=utf-8')
+            return
+
+        match = APP_PATTERN.match(path)
+        if match and int(match.group(1)) < self.site.apps:
+            self._respond(handler, 200, self.site.app_html(int(match.group(1))).encode(), 'text/html; charset=utf-8')
+            return
+
+        if path == config.download_handler_path:
+            download_id = int(parse_qs(query).get('id', ['0'])[0])
+            if 0 < download_id <= self.site.apps:
+                location = 'http://%s/wp-content/uploads/app-%s.apk' % (config.network_location, download_id - 1)
+                self._respond(handler, 302, b'', headers={'Location': location})
+                return
+
+        match = APK_PATTERN.match(path)
+        if match and int(match.group(1)) < self.site.apps:
+            self._respond_apk(handler, self.site.apk(int(match.group(1))))
+            return
+
+        self._respond(handler, 404, b'Not Found')
+
+    def _respond_apk(self, handler: BaseHTTPRequestHandler, apk: bytes) -> None:
+        content_type = 'application/vnd.android.package-archive'
+        match = RANGE_PATTERN.match(handler.headers.get('Range', ''))
+        if not match or match.groups() == ('', ''):
+            self._respond(handler, 200, apk, content_type)
+            return
+
+        first, last = match.groups()
+        if not first:
+            # Suffix range: last N bytes
+            start, end = max(len(apk) - int(last), 0), len(apk) - 1
+        else:
+            start, end = int(first), min(int(last), len(apk) - 1) if last else len(apk) - 1
+
+        self._respond(handler, 206, apk[start:end + 1], content_type, headers={
+            'Content-Range': 'bytes %s-%s/%s' % (start, end, len(apk)),
+        })
+
+    @staticmethod
+    def _respond(handler: BaseHTTPRequestHandler,
+                 status: int,
+                 body: bytes,
+                 content_type: str = 'text/plain',
+                 headers: tp.Dict[str, str] = None) -> None:
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def _random_bytes(rng: random.Random, size: int) -> bytes:
+    return rng.getrandbits(size * 8).to_bytes(size, 'little') if size else b''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--pages', type=int, default=100)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--apps-per-page', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    site = FixtureSite(pages=args.pages, fanout=args.fanout, apps_per_page=args.apps_per_page)
+    with FixtureServer(site, port=args.port, latency=args.latency, failure_rate=args.failure_rate) as server:
+        print('Serving fixture site on %s, use it as proxy' % server.url)
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            ...
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+import logging
+import typing as tp
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from logging import Logger
+from time import perf_counter
+from zipfile import BadZipFile, ZipFile
+
+from crawler.app import App
+from crawler.config import config
+from crawler.inspection import InspectionStats, inspect_archive
+from crawler.metrics import metrics
+from crawler.structs import AppState, FileBatch
+
+
+@dataclass
+class StageStats:
+    # Apps passed through pool
+    apps: int = 0
+    # Seconds, spent on crawling and downloading of apps
+    fetch_time: float = 0.0
+    # Seconds, spent by workers on analysis
+    analysis_time: float = 0.0
+    # Seconds, spent waiting for analysis results
+    wait_time: float = 0.0
+
+
+AnalysisResult = tp.Tuple[FileBatch, tp.Optional[InspectionStats], float]
+
+
+def analyse_archive(path: str, archive_name: str) -> AnalysisResult:
+    """
+    Lists contents of downloaded APK, deeply if `config.deep_inspection`
+    is set. Runs in worker process, so APK is opened by path of App tempfile.
+
+    :return: files, inspection stats and seconds spent.
+    Files are returned as FileBatch, which is cheap to pickle.
+    """
+    started = perf_counter()
+    inspection: tp.Optional[InspectionStats] = None
+
+    if config.deep_inspection:
+        with ZipFile(path) as zipfile:
+            inspection = InspectionStats()
+            files = FileBatch.from_files(
+                inspect_archive(zipfile, archive_name, App._get_mime_type, inspection), archive_name)
+    else:
+        with open(path, 'rb') as file:
+            files = App.scan_archive(file, archive_name)
+
+    return files, inspection, perf_counter() - started
+
+
+class AnalysisPool:
+    """
+    Analyses downloaded APKs in process pool, in parallel with
+    crawling and downloading of next apps.
+
+    Up to `queue_size` downloaded apps wait for analysis at once,
+    after that downloading waits for analysis. Apps are yielded
+    in original order. Apps, already listed via Range requests or
+    deduplication, pass through without analysis. Broken
+    archives are skipped.
+
+    Usage:
+
+        with AnalysisPool(workers=4, queue_size=8) as pool:
+            for app in pool.analyse(apps):
+                for file in app:
+                    ...
+
+        print(pool.stats)
+
+    @contextmanager
+    """
+
+    def __init__(self, workers: int = None, queue_size: int = None, logger: Logger = None):
+        self.workers: int = workers or config.analysis_workers
+        self.queue_size: int = queue_size or config.analysis_queue_size
+        self.executor: tp.Optional[ProcessPoolExecutor] = None
+        self.stats: StageStats = StageStats()
+
+        self.logger = logger
+        if not self.logger:
+            self.logger = logging.getLogger('analysis')
+            self.logger.setLevel(logging.DEBUG)
+
+    def __enter__(self) -> 'AnalysisPool':
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.executor.shutdown()
+        self.executor = None
+
+    def analyse(self, apps: tp.Iterable[App]) -> tp.Generator[App, None, None]:
+        assert self.executor, 'pool should be opened with `with`'
+
+        pending: tp.Deque[tp.Tuple[App, tp.Optional[Future]]] = deque()
+        apps = iter(apps)
+
+        while True:
+            started = perf_counter()
+            app: tp.Optional[App] = next(apps, None)
+            self.stats.fetch_time += perf_counter() - started
+            if app is None:
+                break
+
+            future: tp.Optional[Future] = None
+            if app.state != AppState.LISTED:
+                future = self.executor.submit(analyse_archive, app.tempfile.name, app.filename)
+            pending.append((app, future))
+            metrics.set('analysis_queue_apps', len(pending))
+
+            # Keep order, but don't wait while queue has free slots
+            while pending and (len(pending) >= self.queue_size or self._is_ready(pending[0][1])):
+                app = self._finish(*pending.popleft())
+                if app:
+                    yield app
+
+        while pending:
+            app = self._finish(*pending.popleft())
+            if app:
+                yield app
+
+    def _finish(self, app: App, future: tp.Optional[Future]) -> tp.Optional[App]:
+        self.stats.apps += 1
+        if future is None:
+            return app
+
+        started = perf_counter()
+        try:
+            files, inspection, elapsed = future.result()
+        except BadZipFile as exc:
+            self.logger.error('Cant analyse APK for app %s: %s' % (app.path, exc))
+            app.close()
+            return None
+        finally:
+            self.stats.wait_time += perf_counter() - started
+
+        self.stats.analysis_time += elapsed
+        metrics.observe('zip_scan_seconds', elapsed)
+        app.set_files(files, inspection)
+        return app
+
+    @staticmethod
+    def _is_ready(future: tp.Optional[Future]) -> bool:
+        return future is None or future.done()
@@ -1,20 +1,26 @@
+import hashlib
 import logging
-import mimetypes
-import pathlib
 import typing as tp
 from logging import Logger
 from os.path import basename
-from tempfile import NamedTemporaryFile
+from time import monotonic
 from urllib.parse import urlunsplit, urlsplit
 from zipfile import ZipFile
 
-from bs4 import BeautifulSoup
-from bs4.element import Tag
-
+from crawler.async_session import AsyncProxiedSession
 from crawler.config import config
-from crawler.errors import DownloadError
+from crawler.dedup import DEEP, SHALLOW, KnownArchive, get_dedup_index
+from crawler.download_id_cache import get_download_id_cache
+from crawler.errors import BadArchiveError, DownloadError, FileTooLargeError
+from crawler.inspection import InspectionStats, inspect_archive
+from crawler.metrics import metrics
+from crawler.mime import get_mime_type, get_mime_types
+from crawler.parsers import ShortlinkScanner, get_parser
 from crawler.proxied_session import ProxiedSession
-from crawler.structs import File, AppState
+from crawler.scratch import make_tempfile
+from crawler.structs import File, FileBatch, AppState
+from crawler.zip_directory import MAX_TAIL_SIZE, ZIP64_END_OF_CENTRAL_DIRECTORY, \
+    find_central_directory, iter_central_directory, parse_zip64_central_directory, read_central_directory
 
 
 class App:
@@ -33,6 +39,13 @@ class App:
         for file in app:
             ...
 
+        # Or all contents at once, as columns
+        batch: FileBatch = app.batch()
+
+    Downloaded APK is kept in scratch file (`config.scratch_dir`)
+    until it's listed. Apps, which are dropped before, should
+    be closed to remove it.
+
     @iterable
     """
 
@@ -41,10 +54,23 @@ class App:
         self.download_id: tp.Optional[int] = None
         self.filename: tp.Optional[str] = ''
 
-        self.tempfile: tp.Optional[NamedTemporaryFile] = None
-        self.files: tp.List[File] = []
+        self.tempfile: tp.Optional[tp.IO[bytes]] = None
+        self.files: tp.Union[FileBatch, tp.List[File]] = FileBatch()
+
+        # Filled by deep inspection only
+        self.inspection: tp.Optional[InspectionStats] = None
+
+        # SHA-256 of downloaded APK, used for deduplication
+        self.content_hash: tp.Optional[str] = None
+        self._hasher = None
+
+        # Download stats, bytes and bytes per second
+        self.download_size: int = 0
+        self.download_rate: float = 0.0
+        self.download_started_at: float = 0.0
 
         self.state: AppState = AppState.INITIALIZED
+        self.retries_count: int = 0
 
         self.logger = logger
         if not self.logger:
@@ -61,22 +87,67 @@ class App:
         """
         Iterates over fulfilled File object
         and yields each file info of downloaded APK.
+
+        ref:self.batch
         """
-        with ZipFile(self.tempfile) as zipfile:
-            for zipinfo in zipfile.infolist():
-                file: File = File()
+        yield from self.batch()
 
-                file.archive_name = self.filename
-                file.file_name = zipinfo.filename
-                file.mime_type = self._get_mime_type(zipinfo.filename)
-                file.size_deflated = zipinfo.file_size
-                file.size_compressed = zipinfo.compress_size
+    def batch(self) -> FileBatch:
+        """
+        Lists downloaded APK at once as FileBatch, which is much
+        more compact than File objects. After that app is LISTED.
 
-                yield file
+        If `config.deep_inspection` is set, entries are
+        hashed and nested archives are listed as well.
+        """
+        # Contents are already listed via Range requests or replayed
+        if self.state == AppState.LISTED:
+            if isinstance(self.files, FileBatch):
+                return self.files
+            return FileBatch.from_files(self.files)
 
-        # FIXME: this may be swallowed by context manager
-        self.tempfile.close()
+        # Scratch file is removed even if archive is broken
+        try:
+            with metrics.timer('zip_scan_seconds'):
+                if config.deep_inspection:
+                    with ZipFile(self.tempfile) as zipfile:
+                        self.inspection = InspectionStats()
+                        self.files = FileBatch.from_files(
+                            inspect_archive(zipfile, self.filename, self._get_mime_type, self.inspection),
+                            self.filename)
+                else:
+                    self.files = self.scan_archive(self.tempfile, self.filename)
+        finally:
+            self.close()
+
+        self.state = AppState.LISTED
+        self._observe_inspection()
+        self._remember_files()
+        return self.files
+
+    def set_files(self, files: FileBatch, inspection: InspectionStats = None) -> None:
+        """
+        Takes APK contents, listed outside of App (e.g. by
+        AnalysisPool), instead of reading downloaded archive.
+        """
+        self.files = files
+        self.inspection = inspection
+        self.state = AppState.LISTED
+        self.logger.info('Analysed APK: %s (%s files)' % (self.filename, len(files)))
+
+        self.close()
+        self._observe_inspection()
+        self._remember_files()
 
+    def close(self) -> None:
+        """
+        Removes scratch file of downloaded APK, if it's still kept.
+        """
+        if self.tempfile is not None:
+            self.tempfile.close()
+            self.tempfile = None
+
+    @metrics.timed('download_id_fetch_seconds')
     def fetch_download_id(self) -> None:
         """
         APKMirror uses proxy pages to provide links for downloading APK.
@@ -88,39 +159,402 @@ class App:
         After which Wordpress ID be trivially retrieved from 'shortlink'
         link meta tag of proxy page.
 
-        ref:self._extract_download_id
+        Page is scanned for the tag as it's received, and the rest
+        of it isn't downloaded. If the tag isn't found in head, the
+        whole page is parsed. If `config.download_id_cache_path` is
+        set, page of known app path isn't fetched at all.
+
+        ref:self._scan_download_id
         """
         # assert self.state == AppState.INITIALIZED
 
+        if self._replay_known_download_id():
+            return
+
         with ProxiedSession(proxies=config.proxies) as session:
-            response = session.get(self.absolute_app_url)
-            if response.status_code != 200:
-                raise DownloadError
+            response = session.get(self.absolute_app_url, stream=True)
+            # Unread rest of page is dropped on close
+            with response:
+                if response.status_code != 200:
+                    raise DownloadError(status_code=response.status_code)
+
+                scanner = ShortlinkScanner()
+                chunks = response.iter_content(chunk_size=config.download_id_chunk_size)
+                for chunk in chunks:
+                    if scanner.feed(chunk):
+                        break
+
+                rest = b'' if scanner.shortlink is not None else b''.join(chunks)
+                self.download_id = self._scan_download_id(scanner, rest)
+
+        self._finish_download_id()
+
+    @metrics.timed('download_id_fetch_seconds')
+    async def fetch_download_id_async(self, session: AsyncProxiedSession) -> None:
+        """
+        Same as fetch_download_id, but uses shared
+        AsyncProxiedSession of AsyncSpider.
+        """
+        if self._replay_known_download_id():
+            return
+
+        async with session.get(self.absolute_app_url) as response:
+            if response.status != 200:
+                raise DownloadError(status_code=response.status)
+
+            scanner = ShortlinkScanner()
+            async for chunk in response.content.iter_chunked(config.download_id_chunk_size):
+                if scanner.feed(chunk):
+                    break
 
-            self.download_id = self._extract_download_id(response.content)
+            rest = b'' if scanner.shortlink is not None else await response.read()
+            self.download_id = self._scan_download_id(scanner, rest)
+
+        self._finish_download_id()
+
+    def _scan_download_id(self, scanner: ShortlinkScanner, rest: bytes) -> tp.Optional[int]:
+        """
+        Takes download ID from 'shortlink' tag, found by scanner,
+        or parses the whole page, if scan has failed.
+        """
+        metrics.inc('bytes_total', len(scanner.buffer) + len(rest), kind='app_page')
+        if scanner.shortlink is not None:
+            metrics.inc('download_id_resolutions_total', method='scan')
+            return self._parse_shortlink(scanner.shortlink)
+
+        metrics.inc('download_id_resolutions_total', method='parse')
+        return self._extract_download_id(bytes(scanner.buffer) + rest)
+
+    def _replay_known_download_id(self) -> bool:
+        """
+        Takes download ID from DownloadIdCache, if app path is known.
+        """
+        cache = get_download_id_cache()
+        download_id = cache.get(self.path) if cache else None
+        if download_id is None:
+            return False
+
+        metrics.inc('download_id_resolutions_total', method='cache')
+        self.download_id = download_id
+        self.logger.info('Known download ID for app %s' % self.path)
+        self.state = AppState.FETCHED
+        return True
+
+    def _finish_download_id(self) -> None:
+        cache = get_download_id_cache()
+        if cache and self.download_id is not None:
+            cache.put(self.path, self.download_id)
 
         self.logger.info('Fetched download ID for app %s' % self.path)
         self.state = AppState.FETCHED
 
+    @metrics.timed('apk_download_seconds')
     def download_file(self) -> None:
         """
         We explicitly don't close tempfile until:
 
         - content is extracted;
         - App instance will be force removed by garbage collector.
+
+        If `config.stream_downloads` is set, response body is written
+        to tempfile chunk by chunk, so memory usage doesn't depend on APK size.
         """
         # assert self.state == AppState.FETCHED
 
+        if self._replay_known_download():
+            return
+
         with ProxiedSession(proxies=config.proxies) as session:
-            response = session.get(self.absolute_download_url)
-            assert response.status_code == 200
+            response = session.get(self.absolute_download_url,
+                                   stream=config.stream_downloads)
+            if response.status_code != 200:
+                response.close()
+                raise DownloadError(status_code=response.status_code)
+
+            self._start_download()
+            with response:
+                if config.stream_downloads:
+                    for chunk in response.iter_content(chunk_size=config.download_chunk_size):
+                        self._write_chunk(chunk)
+                else:
+                    self._write_chunk(response.content)
+
+        self._finish_download(response.url)
+
+    @metrics.timed('apk_download_seconds')
+    async def download_file_async(self, session: AsyncProxiedSession) -> None:
+        """
+        Same as download_file, but uses shared
+        AsyncProxiedSession of AsyncSpider.
+        """
+        if self._replay_known_download():
+            return
+
+        async with session.get(self.absolute_download_url) as response:
+            if response.status != 200:
+                raise DownloadError(status_code=response.status)
+
+            self._start_download()
+            if config.stream_downloads:
+                async for chunk in response.content.iter_chunked(config.download_chunk_size):
+                    self._write_chunk(chunk)
+            else:
+                self._write_chunk(await response.read())
+
+        self._finish_download(str(response.url))
+
+    def _start_download(self) -> None:
+        self.tempfile = make_tempfile()
+        self.download_size = 0
+        self.download_started_at = monotonic()
+
+        # Hash APK on the fly only if it may be used
+        self._hasher = hashlib.sha256() if get_dedup_index() else None
+
+    def _write_chunk(self, chunk: bytes) -> None:
+        """
+        Appends chunk to tempfile. Drops tempfile and raises
+        FileTooLargeError, if APK exceeds `config.max_download_size`.
+        """
+        self.download_size += len(chunk)
+        if config.max_download_size and self.download_size > config.max_download_size:
+            self.close()
+            self.logger.error('APK for app %s exceeds %s bytes' % (self.path, config.max_download_size))
+            raise FileTooLargeError
 
-            self.tempfile = NamedTemporaryFile()
-            self.tempfile.write(response.content)
+        self.tempfile.write(chunk)
+        if self._hasher:
+            self._hasher.update(chunk)
 
-        self.filename = self._extract_archive_name_from_url(response.url)
+    def _finish_download(self, url: str) -> None:
+        self.tempfile.flush()
+
+        elapsed = monotonic() - self.download_started_at
+        self.download_rate = self.download_size / elapsed if elapsed else 0.0
+
+        self.filename = self._extract_archive_name_from_url(url)
         self.state = AppState.DOWNLOADED
-        self.logger.info('Downloaded new APK: %s' % self.filename)
+        metrics.inc('bytes_total', self.download_size, kind='apk')
+        self.logger.info('Downloaded new APK: %s (%s bytes, %.0f bytes/s)' % (
+            self.filename, self.download_size, self.download_rate))
+
+        if self._hasher:
+            self.content_hash = self._hasher.hexdigest()
+            self._replay_known_content()
+
+    def fetch_metadata(self) -> None:
+        """
+        Lists APK contents via HTTP Range requests. Only end of
+        central directory record and central directory itself
+        are transferred instead of whole archive.
+
+        If server ignores Range header, or archive tail
+        can't be parsed, falls back to full download.
+        """
+        if self._replay_known_download():
+            return
+
+        with ProxiedSession(proxies=config.proxies) as session:
+            response = session.get(self.absolute_download_url,
+                                   headers=self._range_headers(-MAX_TAIL_SIZE),
+                                   stream=True)
+            if response.status_code == 200:
+                # Range header is ignored, so whole APK is being sent anyway
+                self._start_download()
+                with response:
+                    for chunk in response.iter_content(chunk_size=config.download_chunk_size):
+                        self._write_chunk(chunk)
+                self._finish_download(response.url)
+                return
+
+            if response.status_code != 206:
+                response.close()
+                raise DownloadError(status_code=response.status_code)
+
+            # Use final URL to not follow redirects again
+            url = response.url
+            archive_size = self._parse_content_range(response.headers.get('Content-Range'))
+            tail = response.content
+            tail_offset = archive_size - len(tail)
+
+            def read(offset: int, size: int) -> bytes:
+                if offset >= tail_offset:
+                    return tail[offset - tail_offset:offset - tail_offset + size]
+
+                range_response = session.get(url, headers=self._range_headers(offset, size))
+                if range_response.status_code != 206:
+                    raise DownloadError(status_code=range_response.status_code)
+                return range_response.content
+
+            try:
+                directory = find_central_directory(tail)
+                if directory.zip64_record_offset is not None:
+                    directory = parse_zip64_central_directory(
+                        read(directory.zip64_record_offset, ZIP64_END_OF_CENTRAL_DIRECTORY.size))
+                data = read(directory.offset, directory.size)
+                self._finish_listing(url, data)
+            except BadArchiveError as exc:
+                self.logger.error('Cant list APK for app %s: %s' % (self.path, exc))
+                self.download_file()
+
+    async def fetch_metadata_async(self, session: AsyncProxiedSession) -> None:
+        """
+        Same as fetch_metadata, but uses shared
+        AsyncProxiedSession of AsyncSpider.
+        """
+        if self._replay_known_download():
+            return
+
+        async with session.get(self.absolute_download_url,
+                               headers=self._range_headers(-MAX_TAIL_SIZE)) as response:
+            if response.status == 200:
+                # Range header is ignored, so whole APK is being sent anyway
+                self._start_download()
+                async for chunk in response.content.iter_chunked(config.download_chunk_size):
+                    self._write_chunk(chunk)
+                self._finish_download(str(response.url))
+                return
+
+            if response.status != 206:
+                raise DownloadError(status_code=response.status)
+
+            # Use final URL to not follow redirects again
+            url = str(response.url)
+            archive_size = self._parse_content_range(response.headers.get('Content-Range'))
+            tail = await response.read()
+            tail_offset = archive_size - len(tail)
+
+        async def read(offset: int, size: int) -> bytes:
+            if offset >= tail_offset:
+                return tail[offset - tail_offset:offset - tail_offset + size]
+
+            async with session.get(url, headers=self._range_headers(offset, size)) as range_response:
+                if range_response.status != 206:
+                    raise DownloadError(status_code=range_response.status)
+                return await range_response.read()
+
+        try:
+            directory = find_central_directory(tail)
+            if directory.zip64_record_offset is not None:
+                directory = parse_zip64_central_directory(
+                    await read(directory.zip64_record_offset, ZIP64_END_OF_CENTRAL_DIRECTORY.size))
+            data = await read(directory.offset, directory.size)
+            self._finish_listing(url, data)
+        except BadArchiveError as exc:
+            self.logger.error('Cant list APK for app %s: %s' % (self.path, exc))
+            await self.download_file_async(session)
+
+    def _finish_listing(self, url: str, data: bytes) -> None:
+        self.filename = self._extract_archive_name_from_url(url)
+        self.files = FileBatch(self.filename)
+
+        # Whole archive is not available, so central
+        # directory identifies its contents instead
+        if get_dedup_index():
+            self.content_hash = 'cd:' + hashlib.sha256(data).hexdigest()
+            if self._replay_known_content():
+                return
+
+        for entry in iter_central_directory(data):
+            self.files.append(entry.filename, self._get_mime_type(entry.filename),
+                              entry.file_size, entry.compress_size, entry.crc)
+
+        self.state = AppState.LISTED
+        self.logger.info('Listed new APK: %s (%s files)' % (self.filename, len(self.files)))
+
+        self._remember_files()
+
+    def _replay_known_download(self) -> bool:
+        """
+        Uses stored File list instead of downloading
+        APK, if download_id was already analysed.
+        """
+        index = get_dedup_index()
+        if not index or self.download_id is None:
+            return False
+
+        archive = index.lookup_download(self.download_id, self._get_inspection_mode())
+        if archive is None:
+            return False
+
+        self._replay(archive)
+        return True
+
+    def _replay_known_content(self) -> bool:
+        """
+        Uses stored File list instead of analysing APK, if
+        archive with the same content hash was already analysed.
+        """
+        index = get_dedup_index()
+        archive = index.lookup_content(self.content_hash, self._get_inspection_mode())
+        if archive is None:
+            return False
+
+        if self.download_id is not None:
+            index.link_download(self.download_id, self.content_hash)
+
+        self.close()
+        self._replay(archive)
+        return True
+
+    def _replay(self, archive: KnownArchive) -> None:
+        self.filename = archive.archive_name
+        self.content_hash = archive.content_hash
+        self.files = archive.files
+        self.state = AppState.LISTED
+        self.logger.info('Replayed known APK: %s' % self.filename)
+
+    def _observe_inspection(self) -> None:
+        """
+        Exports DEX and nested archive counts of deeply inspected APK.
+        """
+        if self.inspection is None:
+            return
+
+        metrics.observe('apk_dex_files', self.inspection.dex_count)
+        metrics.inc('dex_files_total', self.inspection.dex_count)
+        metrics.inc('nested_archives_total', self.inspection.nested_archives)
+        metrics.inc('broken_entries_total', self.inspection.broken_entries)
+
+    def _remember_files(self) -> None:
+        index = get_dedup_index()
+        if index and self.content_hash:
+            index.record(self.download_id, self.content_hash, self.filename, self.files,
+                         DEEP if self.inspection is not None else SHALLOW)
+
+    @staticmethod
+    def _get_inspection_mode() -> str:
+        """
+        Returns inspection mode, which replayed File list should be
+        made in. APKs, listed via Range requests, aren't inspected.
+        """
+        return DEEP if config.deep_inspection and not config.metadata_only else SHALLOW
+
+    @staticmethod
+    def _range_headers(offset: int, size: int = None) -> tp.Dict[str, str]:
+        """
+        Builds Range header for `size` bytes starting from `offset`.
+        Negative offset without size requests last bytes of file.
+        """
+        if size is None:
+            byte_range = 'bytes=%s' % offset
+        else:
+            byte_range = 'bytes=%s-%s' % (offset, offset + size - 1)
+
+        # Byte ranges make sense for unencoded body only
+        return {'Range': byte_range, 'Accept-Encoding': 'identity'}
+
+    @staticmethod
+    def _parse_content_range(content_range: tp.Optional[str]) -> int:
+        """
+        Returns full size of file from Content-Range
+        header, e.g. 'bytes 100-199/200' => 200.
+        """
+        try:
+            _, total = content_range.rsplit('/', 1)
+            return int(total)
+        except (AttributeError, ValueError):
+            raise DownloadError
 
     def _extract_download_id(self, html: str) -> tp.Optional[int]:
         """
@@ -128,15 +562,15 @@ class App:
         from download proxy page HTML contests from 'shortlink'
         link meta tag.
         """
-        soup = BeautifulSoup(html, 'html.parser')
-        wordpress_shortlink_tag: Tag = soup.find('link', rel='shortlink')
-
-        shortlink_href = wordpress_shortlink_tag.attrs.get('href')
+        shortlink_href = get_parser().shortlink(html)
         if not shortlink_href:
             return None
+        return self._parse_shortlink(shortlink_href)
 
-        query_param, download_id = shortlink_href.split('=')
+    @staticmethod
+    def _parse_shortlink(shortlink_href: str) -> tp.Optional[int]:
         try:
+            query_param, download_id = shortlink_href.split('=')
             return int(download_id)
         except ValueError as exc:
             return None
@@ -146,21 +580,42 @@ class App:
         scheme, netloc, path, query, fragment = urlsplit(url)
         return basename(path)
 
+    @staticmethod
+    def scan_archive(file: tp.IO[bytes], archive_name: str) -> FileBatch:
+        """
+        Lists archive file via central directory, mapped into
+        memory, without ZipInfo objects and buffered reads. Archives,
+        it can't read (e.g. with data before the first entry), are
+        listed by ZipFile.
+        """
+        try:
+            entries = read_central_directory(file)
+        except BadArchiveError:
+            with ZipFile(file) as zipfile:
+                return App.list_archive(zipfile, archive_name)
+
+        batch: FileBatch = FileBatch(archive_name)
+        for entry, mime_type in zip(entries, get_mime_types(entries)):
+            batch.append(entry.filename, mime_type, entry.file_size, entry.compress_size, entry.crc)
+
+        return batch
+
+    @staticmethod
+    def list_archive(zipfile: ZipFile, archive_name: str) -> FileBatch:
+        batch: FileBatch = FileBatch(archive_name)
+
+        infolist = zipfile.infolist()
+        for zipinfo, mime_type in zip(infolist, get_mime_types(infolist)):
+            batch.append(zipinfo.filename, mime_type, zipinfo.file_size, zipinfo.compress_size, zipinfo.CRC)
+
+        return batch
+
     @staticmethod
     def _get_mime_type(filename: str) -> str:
-        mime_type, _ = mimetypes.guess_type(filename, strict=True)
-        if mime_type:
-            return mime_type
-
-        # If filename has extension, describe it
-        # as custom "application/%s" mime-type
-        suffix = pathlib.Path(filename).suffix
-        if suffix:
-            return 'application/{}'.format(
-                suffix[1:]  # Strip the leading dot from extension
-            )
-
-        return config.unknown_mime_failback
+        """
+        ref:crawler.mime.get_mime_type
+        """
+        return get_mime_type(filename)
 
     @property
     def absolute_app_url(self):
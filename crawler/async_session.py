@@ -0,0 +1,113 @@
+import asyncio
+import typing as tp
+from random import choice
+from time import monotonic
+from types import SimpleNamespace
+
+import aiohttp
+
+from crawler.metrics import metrics
+from crawler.proxied_session import _get_request_headers
+from crawler.proxy_manager import ProxyManager, get_proxy_manager
+from crawler.rate_limiter import RateLimiter, get_rate_limiter, make_trace_config
+
+
+class AsyncProxiedSession:
+    """
+    Asyncio counterpart of ProxiedSession.
+
+    Wraps single aiohttp.ClientSession, so TCP connections
+    are shared between concurrent requests. Each request is routed
+    via random proxy from provided proxies list and gets
+    a new User agent, same as ProxiedSession does.
+
+    Network errors are counted per proxy. With ProxyManager,
+    proxies are chosen by health score, and request outcomes
+    are reported back to it.
+    With RateLimiter, requests wait for host and proxy budgets.
+
+    Usage:
+
+        async with AsyncProxiedSession(
+            proxies=['http://77.88.55.77:8081', 'http://77.88.55.70:8081']
+        ) as session:
+            async with session.get(...) as response:
+                ...
+
+    @contextmanager
+    """
+
+    def __init__(self,
+                 proxies: tp.List[str],
+                 connections_limit: int = 100,
+                 manager: ProxyManager = None,
+                 limiter: RateLimiter = None):
+        assert proxies, 'should instantiate HTTP client with at least one proxy'
+
+        self.proxies: tp.List[str] = proxies
+        self.connections_limit: int = connections_limit
+        self.manager: tp.Optional[ProxyManager] = manager or get_proxy_manager(proxies)
+        self.limiter: tp.Optional[RateLimiter] = limiter or get_rate_limiter()
+        self.session: tp.Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> 'AsyncProxiedSession':
+        connector = aiohttp.TCPConnector(limit=self.connections_limit)
+        trace_configs = [make_trace_config(self.limiter)] if self.limiter else []
+        self.session = aiohttp.ClientSession(connector=connector, trace_configs=trace_configs)
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.session.close()
+        self.session = None
+
+    def get(self,
+            url: str,
+            headers: tp.Dict[str, str] = None,
+            **kwargs) -> tp.AsyncContextManager[aiohttp.ClientResponse]:
+        """
+        Extra `headers` are merged into generated ones,
+        same as requests.Session merges them.
+        """
+        assert self.session, 'session should be opened with `async with`'
+
+        request_headers = _get_request_headers()
+        if headers:
+            request_headers.update(headers)
+
+        proxy = kwargs.setdefault('proxy', self.manager.choose() if self.manager else choice(self.proxies))
+        if self.limiter:
+            kwargs.setdefault('trace_request_ctx', SimpleNamespace(proxy=proxy))
+
+        request = self.session.get(url, headers=request_headers, **kwargs)
+        return _ReportedRequest(request, manager=self.manager, proxy=proxy)
+
+
+class _ReportedRequest:
+    """
+    Counts network error of request in `proxy_errors_total`, same
+    as ProxiedSession does. Reports latency to response headers,
+    status code or network error to ProxyManager, if it's used.
+    """
+
+    def __init__(self, request: tp.AsyncContextManager[aiohttp.ClientResponse],
+                 manager: tp.Optional[ProxyManager], proxy: str):
+        self.request = request
+        self.manager: tp.Optional[ProxyManager] = manager
+        self.proxy: str = proxy
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        started = monotonic()
+        try:
+            response = await self.request.__aenter__()
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            metrics.inc('proxy_errors_total', proxy=self.proxy)
+            if self.manager:
+                self.manager.record_failure(self.proxy)
+            raise
+
+        if self.manager:
+            self.manager.record_response(self.proxy, monotonic() - started, response.status)
+        return response
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return await self.request.__aexit__(exc_type, exc_val, exc_tb)
@@ -0,0 +1,251 @@
+import asyncio
+import logging
+import typing as tp
+from collections import deque
+from logging import Logger
+
+import aiohttp
+
+from crawler.app import App
+from crawler.async_session import AsyncProxiedSession
+from crawler.config import config
+from crawler.errors import DownloadError
+from crawler.metrics import metrics
+from crawler.page import Page
+from crawler.retry import RetryQueue
+from crawler.seen_index import get_seen_index
+from crawler.visited import make_visited_set
+
+# Put to results queue each time any task finishes,
+# so iterator could re-check whether crawling is over
+_TASK_DONE = object()
+
+# Network errors, which are considered as failed
+# download, same as non-200 response codes
+FETCH_ERRORS = (DownloadError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class AsyncSpider:
+    """
+    Asyncio-based concurrent crawler.
+
+    Traverses the same graph as Spider does, but keeps up to
+    `max_concurrent_pages` Pages and `max_concurrent_downloads`
+    APKs being fetched at once via shared AsyncProxiedSession.
+    Each request is routed via random proxy, so throughput
+    scales with amount of proxies in config.
+
+    Yields downloaded App instances in order of completion.
+    Downloaded, but not yet consumed Apps hold their download slot,
+    so no more than `max_concurrent_downloads` tempfiles
+    exist at once.
+
+    Failed Pages and Apps are retried after delay, given by
+    policy of error class (ref:RetryQueue), until policy allows
+    no more retries. Waiting tasks hold no page or download slot.
+
+    Usage:
+
+        spider: AsyncSpider = AsyncSpider(root_path='/')
+
+        async for app in spider:
+            for file in app:
+                ...
+
+    @async_iterator
+    """
+
+    def __init__(self,
+                 root_path: str = '/',
+                 max_depth: int = None,
+                 apps_to_fetch: int = None,
+                 max_concurrent_pages: int = None,
+                 max_concurrent_downloads: int = None,
+                 retries: RetryQueue = None,
+                 app_retries: RetryQueue = None,
+                 logger: Logger = None):
+        self.root_path: str = root_path
+        self.max_depth: int = max_depth if max_depth is not None else config.max_depth
+        self.apps_to_fetch: int = apps_to_fetch if apps_to_fetch is not None else config.apps_to_fetch
+        self.max_concurrent_pages: int = max_concurrent_pages or config.max_concurrent_pages
+        self.max_concurrent_downloads: int = max_concurrent_downloads or config.max_concurrent_downloads
+
+        # Only count retries and give delays, tasks wait in sleeping coroutines
+        self.retries: RetryQueue[Page] = retries if retries is not None else RetryQueue()
+        self.app_retries: RetryQueue[App] = app_retries if app_retries is not None else RetryQueue()
+
+        self.visited_pages: tp.Set[str] = make_visited_set()
+        self.visited_apps: tp.Set[str] = make_visited_set()
+
+        # Apps, which are found, but not scheduled yet,
+        # because apps_to_fetch limit is reached by in-flight Apps
+        self.pending_apps: tp.Deque[App] = deque()
+        self.apps_scheduled: int = 0
+        self.apps_yielded: int = 0
+
+        self.tasks: tp.Set[asyncio.Task] = set()
+        self.results: tp.Optional[asyncio.Queue] = None
+        self.pages_semaphore: tp.Optional[asyncio.Semaphore] = None
+        self.downloads_semaphore: tp.Optional[asyncio.Semaphore] = None
+        self.session: tp.Optional[AsyncProxiedSession] = None
+
+        self.logger = logger
+        if not self.logger:
+            self.logger = logging.getLogger('spider')
+            self.logger.setLevel(logging.DEBUG)
+
+    async def __aiter__(self) -> tp.AsyncGenerator[App, None]:
+        """
+        Crawls graph starting from `root_path`.
+
+        On each iteration yields App instance with downloaded APK.
+        """
+        self.results = asyncio.Queue()
+        self.pages_semaphore = asyncio.Semaphore(self.max_concurrent_pages)
+        self.downloads_semaphore = asyncio.Semaphore(self.max_concurrent_downloads)
+
+        connections_limit = self.max_concurrent_pages + self.max_concurrent_downloads
+        async with AsyncProxiedSession(proxies=config.proxies,
+                                       connections_limit=connections_limit) as session:
+            self.session = session
+
+            root_page: Page = Page(path=self.root_path)
+            self.visited_pages.add(self.root_path)
+            self._spawn(self._crawl_page(root_page))
+
+            try:
+                while self.tasks or not self.results.empty():
+                    app = await self.results.get()
+                    if app is _TASK_DONE:
+                        continue
+
+                    # Free download slot only when App
+                    # is actually taken by consumer
+                    self.downloads_semaphore.release()
+
+                    self.apps_yielded += 1
+                    yield app
+
+                    if self.apps_yielded >= self.apps_to_fetch:
+                        break
+            finally:
+                await self._cancel_tasks()
+                self.session = None
+
+    async def _crawl_page(self, page: Page) -> None:
+        self.logger.debug('Crawling page: %s' % page.path)
+
+        error: tp.Optional[BaseException] = None
+        async with self.pages_semaphore:
+            try:
+                await page.fetch_body_async(self.session)
+            except FETCH_ERRORS as exc:
+                error = exc
+
+        if error is not None:
+            # Re-schedule page after delay, if policy of error allowes.
+            # Page slot is already free while waiting
+            delay = self.retries.backoff(page, error)
+            if delay is not None:
+                await asyncio.sleep(delay)
+                self._spawn(self._crawl_page(page))
+            return
+
+        page.extract_links()
+
+        # In incremental mode only new apps are fetched, and
+        # listing of already seen apps is not descended
+        index = get_seen_index()
+        if index and not index.filter_page(page):
+            page.page_links = set()
+
+        # Do not schedule pages deeper than max recursion depth
+        for child in page.children():
+            if child.path not in self.visited_pages and \
+                    child.recursion_level <= self.max_depth:
+                self.visited_pages.add(child.path)
+                self._spawn(self._crawl_page(child))
+
+        for app_path in page.app_links:
+            if app_path in self.visited_apps:
+                continue
+            self.visited_apps.add(app_path)
+            self.pending_apps.append(App(path=app_path))
+
+        self._schedule_pending_apps()
+        self.logger.info('Tasks in flight: %s' % len(self.tasks))
+        metrics.set('tasks_in_flight', len(self.tasks))
+
+    async def _fetch_app(self, app: App) -> None:
+        # Semaphore is released by iterator after App
+        # is consumed, not by this task
+        await self.downloads_semaphore.acquire()
+
+        index = get_seen_index()
+        try:
+            await app.fetch_download_id_async(self.session)
+            if index and index.skip_known_download(app):
+                self.logger.info('Skipping known release %s' % app.path)
+                self._release_app_slot()
+                return
+
+            if config.metadata_only:
+                await app.fetch_metadata_async(self.session)
+            else:
+                await app.download_file_async(self.session)
+        except FETCH_ERRORS as exc:
+            delay = self.app_retries.backoff(app, exc)
+            if delay is None:
+                self.logger.error('Cant download app %s. Skipping.' % app.path)
+                self._release_app_slot()
+                return
+
+            # App keeps its apps_to_fetch slot, but not download one
+            self.logger.warning('Cant download app %s. Retrying later.' % app.path)
+            self.downloads_semaphore.release()
+            await asyncio.sleep(delay)
+            self._spawn(self._fetch_app(app))
+        except asyncio.CancelledError:
+            self.downloads_semaphore.release()
+            raise
+        except Exception:
+            # Failure of single app must not leak its slots
+            self.logger.exception('Cant process app %s. Skipping.' % app.path)
+            app.close()
+            self._release_app_slot()
+        else:
+            self.results.put_nowait(app)
+
+    def _release_app_slot(self) -> None:
+        """
+        Frees download and apps_to_fetch slots of app,
+        which won't be yielded, for pending ones.
+        """
+        self.downloads_semaphore.release()
+
+        self.apps_scheduled -= 1
+        self._schedule_pending_apps()
+
+    def _schedule_pending_apps(self) -> None:
+        while self.pending_apps and self.apps_scheduled < self.apps_to_fetch:
+            self.apps_scheduled += 1
+            self._spawn(self._fetch_app(self.pending_apps.popleft()))
+
+    def _spawn(self, coroutine: tp.Coroutine) -> None:
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self._on_task_done)
+
+    def _on_task_done(self, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            self.logger.error('Task failed', exc_info=task.exception())
+
+        self.results.put_nowait(_TASK_DONE)
+
+    async def _cancel_tasks(self) -> None:
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,5 +1,5 @@
 import typing as tp
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -26,6 +26,212 @@ class Config:
     # How much times to re-download Page
     max_retries_count: int = 3
 
+    # Delayed retries of failed Pages and Apps per error class:
+    # 'timeout', 'server' (5xx), 'blocked' (403 / 429) and 'error'
+    # (any other, `max_retries_count` times by default). Delay starts
+    # at `base_delay` seconds, doubles with each attempt up to `max_delay`
+    # and is randomized by ±`retry_jitter` share. Errors, which retry
+    # can't fix (e.g. APK over `max_download_size`), are never retried.
+    retry_policies: tp.Dict[str, tp.Dict[str, float]] = field(default_factory=lambda: {
+        'timeout': {'max_retries': 3, 'base_delay': 5.0, 'max_delay': 120.0},
+        'server': {'max_retries': 3, 'base_delay': 15.0, 'max_delay': 300.0},
+        'blocked': {'max_retries': 2, 'base_delay': 60.0, 'max_delay': 900.0},
+        'error': {'base_delay': 5.0, 'max_delay': 60.0},
+    })
+    retry_jitter: float = 0.5
+
+    # Route requests by proxy health score instead of randomly.
+    # After `proxy_failure_threshold` consecutive failures proxy gets
+    # no traffic for backoff, doubling from `proxy_base_backoff`
+    # up to `proxy_max_backoff` seconds. Probe, which result isn't
+    # reported in `proxy_probe_timeout` seconds, counts as failed.
+    proxy_scoring: bool = False
+    proxy_failure_threshold: int = 5
+    proxy_base_backoff: float = 30.0
+    proxy_max_backoff: float = 600.0
+    proxy_probe_timeout: float = 60.0
+
+    # Token bucket budgets: requests per second and burst size per
+    # target host and per proxy. On 429 / 503 both budgets are multiplied
+    # by `rate_limit_slowdown` (Retry-After is honored) and recover by
+    # `rate_limit_recovery` share on each successful response.
+    rate_limiting: bool = False
+    host_rate: float = 2.0
+    host_burst: int = 5
+    proxy_rate: float = 0.5
+    proxy_burst: int = 2
+    rate_limit_slowdown: float = 0.5
+    rate_limit_recovery: float = 0.05
+
+    # How much idle keep-alive sessions to keep per proxy
+    # and how long (seconds) they may stay idle
+    session_pool_size: int = 4
+    session_idle_timeout: float = 60.0
+
+    # Write APKs to disk chunk by chunk instead of
+    # reading whole response body into memory
+    stream_downloads: bool = True
+    download_chunk_size: int = 64 * 1024
+
+    # APKs larger than this (bytes) are dropped, None means no limit
+    max_download_size: tp.Optional[int] = None
+
+    # Directory for downloaded APKs, which are kept until listed,
+    # e.g. tmpfs mount. None means system temp directory.
+    # Files, left by killed crawls of this host, are removed on
+    # start, as well as files of any host, not modified for
+    # `scratch_max_age` seconds (directory may be shared).
+    scratch_dir: tp.Optional[str] = None
+    scratch_max_age: float = 24 * 3600
+
+    # Analyse downloaded APKs in this many worker processes,
+    # in parallel with crawling. 0 analyses them inline.
+    # Up to `analysis_queue_size` APKs wait for analysis at once.
+    analysis_workers: int = 0
+    analysis_queue_size: int = 8
+
+    # Deep inspection of downloaded APKs: CRC and SHA-256 of each
+    # entry, DEX count and listings of nested archives (JARs, ZIPs,
+    # split APKs) up to `inspection_max_depth` levels. Nested archives
+    # larger than `inspection_max_nested_size` bytes are not walked.
+    deep_inspection: bool = False
+    inspection_max_depth: int = 2
+    inspection_max_nested_size: int = 256 * 1024 ** 2
+
+    # List APK contents via HTTP Range requests, fetching
+    # only ZIP central directory instead of whole archive
+    metadata_only: bool = False
+
+    # HTML parser backend for links extraction:
+    # 'stream' — html.parser tokenizer without tree building,
+    # 'bs4' — BeautifulSoup, 'lxml' — requires lxml package
+    html_parser: str = 'stream'
+
+    # Download ID is scanned from raw bytes of app page, which are
+    # read in chunks of `download_id_chunk_size`, until 'shortlink'
+    # tag is found. If it's not found in head or in the first
+    # `download_id_scan_limit` bytes, the whole page is parsed.
+    download_id_chunk_size: int = 8 * 1024
+    download_id_scan_limit: int = 256 * 1024
+
+    # SQLite cache of download_id by app path, so app pages of
+    # known releases are not fetched again. None disables cache.
+    download_id_cache_path: tp.Optional[str] = None
+
+    # Order in which Spider crawls pages:
+    # 'dfs' — depth first, 'bfs' — breadth first, 'best' — best first
+    # by weight of the longest matching path prefix, plus weight per app
+    # link found on parent page, minus penalty per recursion level
+    frontier_strategy: str = 'dfs'
+    frontier_url_weights: tp.Dict[str, float] = field(default_factory=lambda: {
+        '/apk/': 10.0,
+        '/page/': 0.0,
+    })
+    frontier_app_links_weight: float = 1.0
+    frontier_depth_penalty: float = 1.0
+
+    # SQLite file to persist Spider frontier and visited pages to,
+    # so crawling resumes after restart. None disables persistence.
+    frontier_path: tp.Optional[str] = None
+
+    # Store changes are committed in batches of
+    # this size or at least every this many seconds
+    frontier_commit_interval: int = 100
+    frontier_commit_timeout: float = 5.0
+
+    # Structure to keep visited pages in:
+    # 'set' — plain set of paths, 'hashed' — set of 64-bit path hashes,
+    # 'bloom' — scalable Bloom filter with `visited_error_rate`
+    # false positive probability (some pages may be skipped)
+    visited_set: str = 'set'
+    visited_error_rate: float = 0.001
+
+    # Directory for on-disk HTTP cache of pages, None disables cache.
+    # Cached page is fresh for TTL (seconds) of the longest matching
+    # path prefix, then revalidated with ETag / Last-Modified.
+    http_cache_dir: tp.Optional[str] = None
+    http_cache_max_size: int = 1024 ** 3
+    http_cache_ttls: tp.Dict[str, float] = field(default_factory=lambda: {
+        '/': 10 * 60,
+        '/page/': 60 * 60,
+        '/apk/': 6 * 60 * 60,
+    })
+
+    # SQLite index of analysed APKs by download_id and content
+    # hash, so known archives are not downloaded or analysed again.
+    # None disables deduplication.
+    dedup_index_path: tp.Optional[str] = None
+
+    # SQLite index of app paths and download_ids, seen by previous
+    # crawls. If set, crawl is incremental: only new app releases are
+    # fetched, and listing pages (matching any of
+    # `incremental_listing_patterns`), which link to known apps
+    # only, are not descended. None disables incremental mode.
+    seen_index_path: tp.Optional[str] = None
+    incremental_listing_patterns: tp.List[str] = field(default_factory=lambda: [
+        r'^/$',
+        r'^/page/\d+/$',
+        r'^/apk/[^/]+/$',
+    ])
+
+    # Crawling engine to use in main():
+    # 'spider' — serial Spider, 'async' — concurrent AsyncSpider,
+    # 'distributed' — Coordinator with Worker processes,
+    # 'pipeline' — threaded Pipeline of crawl stages
+    engine: str = 'spider'
+
+    # Distributed engine: shared SQLite queue, amount of local
+    # worker processes and seconds after which task, claimed by
+    # silent worker, is returned to queue
+    work_queue_path: str = 'queue.sqlite3'
+    workers_count: int = 4
+    stale_task_timeout: float = 600.0
+
+    # How much Pages and APKs AsyncSpider
+    # keeps being downloaded at once
+    max_concurrent_pages: int = 10
+    max_concurrent_downloads: int = 4
+
+    # Pipeline engine: worker threads of each stage (page fetch,
+    # link extraction, download ID resolution, APK download and
+    # archive analysis) and size of bounded queue before each
+    # stage. Full queue blocks upstream stages (backpressure).
+    pipeline_workers: tp.Dict[str, int] = field(default_factory=lambda: {
+        'fetch': 4,
+        'extract': 1,
+        'resolve': 4,
+        'download': 4,
+        'analyse': 2,
+    })
+    pipeline_queue_size: int = 16
+
+    # Output of crawled files: 'text' — original files.txt lines,
+    # 'jsonl', 'csv', 'sqlite' or 'parquet' (requires pyarrow).
+    # Path defaults to 'files' with extension of format.
+    # Records are written in batches of `output_batch_size` or at
+    # least every `output_flush_interval` seconds. `output_fsync`:
+    # 'never', 'flush' — after each batch, 'close' — once on close.
+    output_format: str = 'text'
+    output_path: tp.Optional[str] = None
+    output_batch_size: int = 1000
+    output_flush_interval: float = 5.0
+    output_fsync: str = 'close'
+
+    # Metrics of crawl are served in Prometheus text format
+    # on `metrics_port` and/or dumped as JSON to `metrics_dump_path`
+    # every `metrics_dump_interval` seconds. Both are off by default.
+    # Distributed worker `i` uses port `metrics_port + i + 1` and
+    # own dump and profile files, e.g. 'metrics.worker-0.json'.
+    metrics_port: tp.Optional[int] = None
+    metrics_dump_path: tp.Optional[str] = None
+    metrics_dump_interval: float = 60.0
+
+    # Profiler of the whole run: None, 'cprofile' or 'tracemalloc'.
+    # Profile is dumped to `profile_path` when crawl is over.
+    profiler: tp.Optional[str] = None
+    profile_path: str = 'crawl.prof'
+    tracemalloc_frames: int = 10
+
     # Will be used, when file in archive
     # has neither known mime-type nor extension
     # ref:http://www.rfc-editor.org/rfc/rfc2046.txt
@@ -0,0 +1,175 @@
+import json
+import sqlite3
+import threading
+import typing as tp
+from dataclasses import dataclass
+
+from crawler.config import config
+from crawler.metrics import metrics
+from crawler.structs import File
+
+# Two levels: download_id resolves to content hash,
+# content hash resolves to stored File list of archive
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS downloads (
+    download_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS archives (
+    content_hash TEXT PRIMARY KEY,
+    archive_name TEXT NOT NULL,
+    files TEXT NOT NULL,
+    inspection TEXT
+);
+'''
+
+# Columns, added to tables of older index files. Archives
+# of unknown inspection mode are never replayed
+MIGRATIONS = {
+    'inspection': 'ALTER TABLE archives ADD COLUMN inspection TEXT',
+}
+
+# Inspection modes of stored File lists: with CRC and
+# SHA-256 of each entry, or plain listing
+DEEP = 'deep'
+SHALLOW = 'shallow'
+
+
+@dataclass
+class KnownArchive:
+    content_hash: str
+    archive_name: str
+    files: tp.List[File]
+
+
+@dataclass
+class DedupStats:
+    # Downloads skipped, because download_id is known
+    download_hits: int = 0
+    # Archives not analysed, because content hash is known
+    content_hits: int = 0
+    # New archives recorded
+    records: int = 0
+
+
+class DedupIndex:
+    """
+    Persistent index of already analysed APKs.
+
+    Different app pages often resolve to the same download_id,
+    and different download_ids may serve the same archive. Known
+    download_id allows to skip download completely, known content
+    hash allows to skip archive analysis. In both cases stored
+    File list is replayed instead, but only if it was made in the
+    same inspection mode (deep or shallow). Archive, analysed in
+    the other mode, replaces the stored File list.
+
+    Usage:
+
+        index = DedupIndex('dedup.sqlite3')
+
+        archive = index.lookup_download(download_id, SHALLOW)
+        if archive is None:
+            ...
+            index.record(download_id, content_hash, archive_name, files, SHALLOW)
+
+    Thread safe.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.stats: DedupStats = DedupStats()
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def lookup_download(self, download_id: int, inspection: str = SHALLOW) -> tp.Optional[KnownArchive]:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT archives.content_hash, archive_name, files FROM downloads '
+                'JOIN archives ON archives.content_hash = downloads.content_hash '
+                'WHERE download_id = ? AND inspection = ?', (download_id, inspection)).fetchone()
+            if row is None:
+                return None
+
+            self.stats.download_hits += 1
+        return self._build_archive(*row)
+
+    def lookup_content(self, content_hash: str, inspection: str = SHALLOW) -> tp.Optional[KnownArchive]:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT content_hash, archive_name, files FROM archives '
+                'WHERE content_hash = ? AND inspection = ?', (content_hash, inspection)).fetchone()
+            if row is None:
+                return None
+
+            self.stats.content_hits += 1
+        return self._build_archive(*row)
+
+    def link_download(self, download_id: int, content_hash: str) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO downloads (download_id, content_hash) VALUES (?, ?)',
+                (download_id, content_hash))
+
+    def record(self, download_id: tp.Optional[int], content_hash: str,
+               archive_name: str, files: tp.Iterable[File], inspection: str = SHALLOW) -> None:
+        rows = []
+        for file in files:
+            row = [file.file_name, file.mime_type, file.size_deflated,
+                   file.size_compressed, file.crc, file.sha256]
+            # Missing CRC and SHA-256 aren't stored
+            while len(row) > 4 and row[-1] is None:
+                row.pop()
+            rows.append(row)
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO archives (content_hash, archive_name, files, inspection) '
+                'VALUES (?, ?, ?, ?)',
+                (content_hash, archive_name, json.dumps(rows, separators=(',', ':')), inspection))
+            if download_id is not None:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO downloads (download_id, content_hash) VALUES (?, ?)',
+                    (download_id, content_hash))
+            self.stats.records += 1
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(archives)')}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self.connection.execute(statement)
+
+    @staticmethod
+    def _build_archive(content_hash: str, archive_name: str, files: str) -> KnownArchive:
+        return KnownArchive(
+            content_hash=content_hash,
+            archive_name=archive_name,
+            files=[File(archive_name, *row) for row in json.loads(files)],
+        )
+
+
+_dedup_index: tp.Optional[DedupIndex] = None
+
+
+def get_dedup_index() -> tp.Optional[DedupIndex]:
+    """
+    Returns shared DedupIndex, if `config.dedup_index_path` is set.
+    """
+    global _dedup_index
+
+    if not config.dedup_index_path:
+        return None
+
+    if _dedup_index is None or _dedup_index.path != config.dedup_index_path:
+        _dedup_index = DedupIndex(config.dedup_index_path)
+    return _dedup_index
+
+
+metrics.register_stats('dedup', lambda: _dedup_index and _dedup_index.stats)
@@ -0,0 +1,426 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sqlite3
+import typing as tp
+from dataclasses import dataclass
+from logging import Logger
+from time import sleep, time
+from zipfile import BadZipFile
+
+from crawler.app import App
+from crawler.config import config
+from crawler.metrics import profiling, reporting
+from crawler.page import Page
+from crawler.retry import RETRY_ERRORS, RetryPolicy, classify_error, get_policy, get_retry_policies
+from crawler.seen_index import get_seen_index
+from crawler.sinks import SINKS, Sink, make_sink
+
+PAGE = 'page'
+APP = 'app'
+
+PENDING = 'pending'
+CLAIMED = 'claimed'
+DONE = 'done'
+# Apps of already known releases, which don't count against apps_to_fetch
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# Every task ever queued stays in table, so UNIQUE
+# constraint provides central dedup of pages and apps
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL,
+    recursion_level INTEGER NOT NULL,
+    retries_count INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    worker TEXT,
+    claimed_at REAL,
+    due_at REAL,
+    UNIQUE (kind, path)
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (state, kind);
+'''
+
+# Columns, added to tables of older queue files
+MIGRATIONS = {
+    'due_at': 'ALTER TABLE tasks ADD COLUMN due_at REAL',
+}
+
+
+@dataclass
+class Task:
+    id: int
+    kind: str
+    path: str
+    recursion_level: int
+    retries_count: int
+
+
+class WorkQueue:
+    """
+    Shared SQLite-backed queue of Page and App tasks.
+
+    Safe to use from several processes (and hosts, if they
+    share file system with proper locking). Tasks are claimed
+    in exclusive transactions, so each task is given to one worker.
+
+    App tasks are claimed first and only while amount of
+    claimed and done apps is less than `apps_to_fetch`, which
+    enforces the limit globally. Apps, skipped as known releases,
+    don't count against it. Page tasks are claimed
+    newest first, resembling DFS order of Spider.
+
+    Failed tasks stay pending with `due_at` after delay, given by
+    retry policy of error class (ref:RetryQueue), and aren't
+    claimed before it. Wall clock is used, as workers may run
+    on different hosts.
+    """
+
+    def __init__(self, path: str, apps_to_fetch: int = None, policies: tp.Dict[str, RetryPolicy] = None):
+        self.path: str = path
+        self.apps_to_fetch: int = apps_to_fetch if apps_to_fetch is not None else config.apps_to_fetch
+        self.policies: tp.Dict[str, RetryPolicy] = policies if policies is not None else get_retry_policies()
+
+        # Transactions are managed explicitly
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(SCHEMA)
+        self._migrate()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def put_pages(self, pages: tp.Iterable[tp.Tuple[str, int]]) -> None:
+        """
+        Queues (path, recursion_level) pages, which were never queued before.
+        """
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO tasks (kind, path, recursion_level, state) VALUES (?, ?, ?, ?)',
+            [(PAGE, path, recursion_level, PENDING) for path, recursion_level in pages])
+
+    def put_apps(self, paths: tp.Iterable[str]) -> None:
+        self.connection.executemany(
+            'INSERT OR IGNORE INTO tasks (kind, path, recursion_level, state) VALUES (?, ?, 0, ?)',
+            [(APP, path, PENDING) for path in paths])
+
+    def claim(self, worker: str) -> tp.Optional[Task]:
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = None
+            if self._count(APP, CLAIMED, DONE) < self.apps_to_fetch:
+                row = self._next(APP)
+            if row is None:
+                row = self._next(PAGE)
+
+            if row is not None:
+                self.connection.execute(
+                    'UPDATE tasks SET state = ?, worker = ?, claimed_at = ? WHERE id = ?',
+                    (CLAIMED, worker, time(), row[0]))
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        else:
+            self.connection.execute('COMMIT')
+
+        return Task(*row) if row is not None else None
+
+    def complete(self, task: Task) -> None:
+        self._set_state(task, DONE)
+
+    def skip(self, task: Task) -> None:
+        self._set_state(task, SKIPPED)
+
+    def give_up(self, task: Task) -> None:
+        self._set_state(task, FAILED)
+
+    def fail(self, task: Task, error: BaseException) -> bool:
+        """
+        Re-queues failed task to be claimed after delay, if
+        policy of error class allows more retries.
+
+        :return: False, if task is failed for good.
+        """
+        policy = get_policy(self.policies, classify_error(error))
+        if task.retries_count >= policy.max_retries:
+            self._set_state(task, FAILED)
+            return False
+
+        self.connection.execute(
+            'UPDATE tasks SET state = ?, retries_count = retries_count + 1, due_at = ? WHERE id = ?',
+            (PENDING, time() + policy.get_delay(task.retries_count + 1), task.id))
+        return True
+
+    def requeue_stale(self, timeout: float) -> int:
+        """
+        Returns tasks, claimed more than `timeout` seconds ago
+        by probably dead workers, back to queue.
+        """
+        cursor = self.connection.execute(
+            'UPDATE tasks SET state = ? WHERE state = ? AND claimed_at < ?',
+            (PENDING, CLAIMED, time() - timeout))
+        return cursor.rowcount
+
+    def is_finished(self) -> bool:
+        if self._count(APP, DONE) >= self.apps_to_fetch:
+            return True
+
+        row = self.connection.execute(
+            'SELECT 1 FROM tasks WHERE state IN (?, ?) LIMIT 1', (PENDING, CLAIMED)).fetchone()
+        return row is None
+
+    def stats(self) -> tp.Dict[str, int]:
+        rows = self.connection.execute(
+            'SELECT kind, state, COUNT(*) FROM tasks GROUP BY kind, state')
+        return {'%s_%s' % (kind, state): count for kind, state, count in rows}
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self.connection.execute('PRAGMA table_info(tasks)')}
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self.connection.execute(statement)
+
+    def _next(self, kind: str) -> tp.Optional[tuple]:
+        return self.connection.execute(
+            'SELECT id, kind, path, recursion_level, retries_count FROM tasks '
+            'WHERE state = ? AND kind = ? AND (due_at IS NULL OR due_at <= ?) '
+            'ORDER BY id DESC LIMIT 1', (PENDING, kind, time())).fetchone()
+
+    def _count(self, kind: str, *states: str) -> int:
+        placeholders = ', '.join('?' * len(states))
+        count, = self.connection.execute(
+            'SELECT COUNT(*) FROM tasks WHERE kind = ? AND state IN (%s)' % placeholders,
+            (kind, *states)).fetchone()
+        return count
+
+    def _set_state(self, task: Task, state: str) -> None:
+        self.connection.execute('UPDATE tasks SET state = ? WHERE id = ?', (state, task.id))
+
+
+class Worker:
+    """
+    Pulls tasks from shared WorkQueue until crawling is over.
+
+    Page tasks are fetched and parsed, found pages and apps
+    are put back to queue. App tasks are downloaded and
+    analysed, files are written to `output_path`.
+    All requests are routed via own subset of proxies.
+
+    Usage:
+
+        Worker(queue_path='queue.sqlite3', name='worker-1',
+               proxies=['http://77.88.55.77:8081']).run()
+    """
+
+    def __init__(self,
+                 queue_path: str,
+                 name: str,
+                 proxies: tp.List[str],
+                 output_path: str = None,
+                 poll_interval: float = 1.0,
+                 logger: Logger = None):
+        self.queue_path: str = queue_path
+        self.name: str = name
+        self.proxies: tp.List[str] = proxies
+        self.output_path: str = output_path or 'files.%s%s' % (name, SINKS[config.output_format].extension)
+        self.poll_interval: float = poll_interval
+
+        self.logger = logger
+        if not self.logger:
+            self.logger = logging.getLogger(name)
+            self.logger.setLevel(logging.DEBUG)
+
+    def run(self) -> None:
+        # Worker runs in own process, so config is not shared
+        config.proxies = self.proxies
+        queue = WorkQueue(self.queue_path)
+
+        try:
+            with make_sink(path=self.output_path) as output:
+                while True:
+                    task = queue.claim(self.name)
+                    if task is None:
+                        if queue.is_finished():
+                            break
+                        sleep(self.poll_interval)
+                        continue
+
+                    try:
+                        if task.kind == PAGE:
+                            self._crawl_page(queue, task)
+                            fetched = True
+                        else:
+                            fetched = self._fetch_app(task, output)
+                    # Broken APK fails only its own task
+                    except RETRY_ERRORS + (BadZipFile,) as exc:
+                        if queue.fail(task, exc):
+                            self.logger.warning('Retrying %s %s later' % (task.kind, task.path))
+                        else:
+                            self.logger.error('Cant process %s %s: %r' % (task.kind, task.path, exc))
+                    # Bug in handling of single task, which retry
+                    # won't fix, must not stop the whole worker
+                    except Exception:
+                        self.logger.exception('Failed to process %s %s' % (task.kind, task.path))
+                        queue.give_up(task)
+                    else:
+                        if fetched:
+                            queue.complete(task)
+                        else:
+                            queue.skip(task)
+        finally:
+            queue.close()
+
+    def _crawl_page(self, queue: WorkQueue, task: Task) -> None:
+        page: Page = Page(path=task.path, recursion_level=task.recursion_level)
+        page.fetch_body()
+        page.extract_links()
+
+        # In incremental mode only new apps are queued, and
+        # listing of already seen apps is not descended
+        index = get_seen_index()
+        if index and not index.filter_page(page):
+            page.page_links = set()
+
+        # Do not queue pages deeper than max recursion depth
+        queue.put_pages((child.path, child.recursion_level) for child in page.children()
+                        if child.recursion_level <= config.max_depth)
+        queue.put_apps(page.app_links)
+
+    def _fetch_app(self, task: Task, output: Sink) -> bool:
+        """
+        :return: False, if app is skipped as known release.
+        """
+        app: App = App(path=task.path)
+        app.fetch_download_id()
+
+        index = get_seen_index()
+        if index and index.skip_known_download(app):
+            self.logger.info('Skipping known release %s' % app.path)
+            return False
+
+        if config.metadata_only:
+            app.fetch_metadata()
+        else:
+            app.download_file()
+
+        # Task is completed right after,
+        # so its files can't wait in buffer
+        output.write_batch(app.batch())
+        output.flush()
+
+        if index:
+            index.remember(app.path, app.download_id)
+        return True
+
+
+class Coordinator:
+    """
+    Seeds shared WorkQueue with root Page, runs `workers_count`
+    local Worker processes, each pinned to own subset of proxies,
+    and watches the queue until crawling is over.
+
+    Workers on other hosts may be started with:
+
+        python -m crawler.distributed worker --queue <path> --index <i> --workers <n>
+
+    Usage:
+
+        Coordinator(queue_path='queue.sqlite3', workers_count=4).run()
+    """
+
+    def __init__(self,
+                 queue_path: str,
+                 workers_count: int,
+                 root_path: str = '/',
+                 stale_timeout: float = None,
+                 logger: Logger = None):
+        self.queue_path: str = queue_path
+        self.workers_count: int = workers_count
+        self.root_path: str = root_path
+        self.stale_timeout: float = stale_timeout or config.stale_task_timeout
+
+        self.logger = logger
+        if not self.logger:
+            self.logger = logging.getLogger('coordinator')
+            self.logger.setLevel(logging.DEBUG)
+
+    def run(self, poll_interval: float = 5.0) -> None:
+        queue = WorkQueue(self.queue_path)
+        queue.put_pages([(self.root_path, 0)])
+
+        processes = [
+            multiprocessing.Process(target=run_worker,
+                                    args=(self.queue_path, index, self.workers_count))
+            for index in range(self.workers_count)
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            # Without local workers, wait for remote ones
+            while any(process.is_alive() for process in processes) or \
+                    not processes and not queue.is_finished():
+                requeued = queue.requeue_stale(self.stale_timeout)
+                if requeued:
+                    self.logger.info('Re-queued %s stale tasks' % requeued)
+
+                self.logger.info('Queue stats: %s' % queue.stats())
+                sleep(poll_interval)
+        finally:
+            for process in processes:
+                process.join()
+            queue.close()
+
+
+def get_worker_proxies(index: int, workers_count: int, proxies: tp.List[str]) -> tp.List[str]:
+    """
+    Splits proxies between workers round-robin. If there
+    are less proxies than workers, proxies are shared.
+    """
+    assert proxies, 'should have at least one proxy'
+
+    worker_proxies = proxies[index::workers_count]
+    if not worker_proxies:
+        worker_proxies = [proxies[index % len(proxies)]]
+    return worker_proxies
+
+
+def get_worker_path(path: str, name: str) -> str:
+    """
+    Returns own file of worker next to `path`,
+    e.g. 'metrics.worker-1.json' for 'metrics.json'.
+    """
+    root, extension = os.path.splitext(path)
+    return '%s.%s%s' % (root, name, extension)
+
+
+def run_worker(queue_path: str, index: int, workers_count: int) -> None:
+    proxies = get_worker_proxies(index, workers_count, config.proxies)
+    name = 'worker-%s' % index
+
+    # Worker process has own metrics registry, so it's
+    # reported and profiled apart from coordinator
+    port = config.metrics_port + index + 1 if config.metrics_port is not None else None
+    dump_path = get_worker_path(config.metrics_dump_path, name) if config.metrics_dump_path else None
+
+    with profiling(path=get_worker_path(config.profile_path, name)), \
+            reporting(port=port, dump_path=dump_path):
+        Worker(queue_path=queue_path, name=name, proxies=proxies).run()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('role', choices=['coordinator', 'worker'])
+    parser.add_argument('--queue', default=config.work_queue_path)
+    parser.add_argument('--workers', type=int, default=config.workers_count)
+    parser.add_argument('--index', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.role == 'coordinator':
+        Coordinator(queue_path=args.queue, workers_count=args.workers,
+                    root_path=config.root_path).run()
+    else:
+        run_worker(args.queue, args.index, args.workers)
@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+import typing as tp
+from dataclasses import dataclass
+from time import time
+
+from crawler.config import config
+from crawler.metrics import metrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS download_ids (
+    path TEXT PRIMARY KEY,
+    download_id INTEGER NOT NULL,
+    fetched_at REAL NOT NULL
+);
+'''
+
+
+@dataclass
+class DownloadIdStats:
+    # App pages not fetched, because download_id is cached
+    hits: int = 0
+    # App pages fetched
+    misses: int = 0
+
+
+class DownloadIdCache:
+    """
+    Persistent cache of download_id by app path. App page of
+    release always links to the same APK, so its download_id
+    never changes, and the page isn't fetched again.
+
+    Usage:
+
+        cache = DownloadIdCache('download_ids.sqlite3')
+
+        download_id = cache.get(app.path)
+        if download_id is None:
+            ...
+            cache.put(app.path, download_id)
+
+    Thread safe.
+    """
+
+    def __init__(self, path: str):
+        self.path: str = path
+        self.stats: DownloadIdStats = DownloadIdStats()
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def get(self, path: str) -> tp.Optional[int]:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT download_id FROM download_ids WHERE path = ?', (path,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            self.stats.hits += 1
+        return row[0]
+
+    def put(self, path: str, download_id: int) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO download_ids (path, download_id, fetched_at) VALUES (?, ?, ?)',
+                (path, download_id, time()))
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+_download_id_cache: tp.Optional[DownloadIdCache] = None
+
+
+def get_download_id_cache() -> tp.Optional[DownloadIdCache]:
+    """
+    Returns shared DownloadIdCache, if `config.download_id_cache_path` is set.
+    """
+    global _download_id_cache
+
+    if not config.download_id_cache_path:
+        return None
+
+    if _download_id_cache is None or _download_id_cache.path != config.download_id_cache_path:
+        _download_id_cache = DownloadIdCache(config.download_id_cache_path)
+    return _download_id_cache
+
+
+metrics.register_stats('download_id_cache', lambda: _download_id_cache and _download_id_cache.stats)
@@ -1,2 +1,20 @@
+import typing as tp
+
+
 class DownloadError(Exception):
+    """
+    Optional `status_code` of failed response
+    is used to choose retry policy.
+    """
+
+    def __init__(self, *args, status_code: tp.Optional[int] = None):
+        super().__init__(*args)
+        self.status_code: tp.Optional[int] = status_code
+
+
+class FileTooLargeError(DownloadError):
+    ...
+
+
+class BadArchiveError(Exception):
     ...
@@ -0,0 +1,110 @@
+import sqlite3
+import typing as tp
+from time import monotonic
+
+from crawler.config import config
+
+# Single table keeps both frontier and visited set:
+# every page ever queued is visited, pending ones have done = 0.
+# `priority` and `position` restore order of pages in Spider frontier.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pages (
+    path TEXT PRIMARY KEY,
+    recursion_level INTEGER NOT NULL,
+    retries_count INTEGER NOT NULL,
+    priority REAL NOT NULL,
+    position INTEGER NOT NULL,
+    done INTEGER NOT NULL
+)
+'''
+
+PageRow = tp.Tuple[str, int, int, float, int, int]
+
+
+class FrontierStore:
+    """
+    On-disk SQLite frontier and visited set of Spider.
+
+    Every change of Spider frontier is recorded as a full row state
+    and buffered in memory. Buffer is written in a single transaction
+    each `commit_interval` changes or `commit_timeout` seconds,
+    so per-page overhead stays negligible. Changes are applied in order,
+    so after crash store keeps consistent, a bit outdated state.
+    Pages, popped but not marked done, are crawled again after resume.
+
+    Usage:
+
+        store = FrontierStore('frontier.sqlite3')
+        spider = Spider(root_path='/', store=store)
+
+        for page in spider:
+            ...
+
+        store.close()
+    """
+
+    def __init__(self, path: str, commit_interval: int = None, commit_timeout: float = None):
+        self.path: str = path
+        self.commit_interval: int = commit_interval or config.frontier_commit_interval
+        self.commit_timeout: float = commit_timeout or config.frontier_commit_timeout
+
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+
+        self.buffer: tp.List[PageRow] = []
+        self.last_commit_at: float = monotonic()
+
+    def __enter__(self) -> 'FrontierStore':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def is_empty(self) -> bool:
+        row = self.connection.execute('SELECT 1 FROM pages LIMIT 1').fetchone()
+        return row is None and not self.buffer
+
+    def frontier(self) -> tp.Generator[tp.Tuple[str, int, int, float, int], None, None]:
+        """
+        Yields (path, recursion_level, retries_count, priority, position)
+        of not yet crawled pages in order of crawling.
+        """
+        self.flush()
+        yield from self.connection.execute(
+            'SELECT path, recursion_level, retries_count, priority, position FROM pages '
+            'WHERE done = 0 ORDER BY priority, position')
+
+    def visited(self) -> tp.Generator[str, None, None]:
+        self.flush()
+        for path, in self.connection.execute('SELECT path FROM pages'):
+            yield path
+
+    def push(self, path: str, recursion_level: int, retries_count: int,
+             priority: float, position: int) -> None:
+        self._record((path, recursion_level, retries_count, priority, position, 0))
+
+    def mark_done(self, path: str, recursion_level: int, retries_count: int = 0) -> None:
+        self._record((path, recursion_level, retries_count, 0.0, 0, 1))
+
+    def flush(self) -> None:
+        if self.buffer:
+            with self.connection:
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO pages '
+                    '(path, recursion_level, retries_count, priority, position, done) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', self.buffer)
+            self.buffer = []
+
+        self.last_commit_at = monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        self.connection.close()
+
+    def _record(self, row: PageRow) -> None:
+        self.buffer.append(row)
+
+        if len(self.buffer) >= self.commit_interval or \
+                monotonic() - self.last_commit_at >= self.commit_timeout:
+            self.flush()
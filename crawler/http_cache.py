@@ -0,0 +1,254 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import typing as tp
+from dataclasses import dataclass
+from time import time
+from urllib.parse import urlsplit
+
+from crawler.config import config
+from crawler.metrics import metrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    body_hash TEXT NOT NULL,
+    encoding TEXT,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+CREATE INDEX IF NOT EXISTS entries_body_hash ON entries (body_hash);
+'''
+
+
+@dataclass
+class CacheEntry:
+    url: str
+    body_hash: str
+    encoding: tp.Optional[str]
+    etag: tp.Optional[str]
+    last_modified: tp.Optional[str]
+    size: int
+    fetched_at: float
+    accessed_at: float
+
+
+@dataclass
+class CacheStats:
+    # Fresh entries, served without request
+    hits: int = 0
+    # Stale entries, confirmed by 304 Not Modified
+    revalidations: int = 0
+    # Bodies, downloaded and stored
+    misses: int = 0
+    # Entries, removed to fit max_size
+    evictions: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.revalidations + self.misses
+        return (self.hits + self.revalidations) / total if total else 0.0
+
+
+class HttpCache:
+    """
+    On-disk HTTP cache for crawled pages.
+
+    Bodies are stored content-addressed by SHA-256, so
+    identical pages take disk space once. Entry is fresh during
+    TTL of the longest matching URL path prefix from `ttls`.
+    Stale entries are revalidated with If-None-Match /
+    If-Modified-Since headers. Least recently used entries are
+    evicted when total size of bodies exceeds `max_size` bytes.
+
+    Usage:
+
+        cache = HttpCache('cache/', max_size=2 ** 30, ttls={'/': 600, '/apk/': 86400})
+
+        entry = cache.lookup(url)
+        if entry and cache.is_fresh(entry):
+            html = cache.read(entry)
+
+    Thread safe.
+    """
+
+    def __init__(self, directory: str, max_size: int = None, ttls: tp.Dict[str, float] = None):
+        self.directory: str = directory
+        self.max_size: int = max_size or config.http_cache_max_size
+        self.ttls: tp.Dict[str, float] = ttls if ttls is not None else config.http_cache_ttls
+        self.stats: CacheStats = CacheStats()
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.join(directory, 'bodies'), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(directory, 'index.sqlite3'),
+                                          check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+        self.total_size: int
+        self.total_size, = self.connection.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()
+
+    def lookup(self, url: str) -> tp.Optional[CacheEntry]:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT url, body_hash, encoding, etag, last_modified, size, fetched_at, accessed_at '
+                'FROM entries WHERE url = ?', (url,)).fetchone()
+        return CacheEntry(*row) if row else None
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        return time() - entry.fetched_at < self.get_ttl(entry.url)
+
+    def get_ttl(self, url: str) -> float:
+        path = urlsplit(url).path or '/'
+        prefixes = [prefix for prefix in self.ttls if path.startswith(prefix)]
+        if not prefixes:
+            return 0.0
+        return self.ttls[max(prefixes, key=len)]
+
+    @staticmethod
+    def conditional_headers(entry: tp.Optional[CacheEntry]) -> tp.Dict[str, str]:
+        headers = {}
+        if entry is None:
+            return headers
+
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def read(self, entry: CacheEntry, revalidated: bool = False,
+             headers: tp.Mapping[str, str] = None) -> tp.Optional[str]:
+        """
+        Returns decoded body of entry. Entry, which is
+        `revalidated` by 304 response, becomes fresh again
+        and takes validators from its `headers`, if they're sent.
+
+        :return: None, if body is lost, e.g. removed by hand,
+            so entry is dropped and page must be fetched again.
+        """
+        try:
+            with open(self._body_path(entry.body_hash), 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            self._drop(entry)
+            return None
+
+        headers = headers or {}
+        now = time()
+        with self.lock:
+            if revalidated:
+                self.stats.revalidations += 1
+                entry.fetched_at = now
+                entry.etag = headers.get('ETag') or entry.etag
+                entry.last_modified = headers.get('Last-Modified') or entry.last_modified
+            else:
+                self.stats.hits += 1
+
+            with self.connection:
+                self.connection.execute(
+                    'UPDATE entries SET etag = ?, last_modified = ?, fetched_at = ?, accessed_at = ? '
+                    'WHERE url = ?',
+                    (entry.etag, entry.last_modified, entry.fetched_at, now, entry.url))
+
+        return body.decode(entry.encoding or 'utf-8', errors='replace')
+
+    def store(self, url: str, body: bytes, encoding: str = None, headers: tp.Mapping[str, str] = None) -> None:
+        headers = headers or {}
+        body_hash = hashlib.sha256(body).hexdigest()
+
+        # Same body may be already stored for another URL
+        body_path = self._body_path(body_hash)
+        if not os.path.exists(body_path):
+            os.makedirs(os.path.dirname(body_path), exist_ok=True)
+            temp_path = '%s.%s.tmp' % (body_path, threading.get_ident())
+            with open(temp_path, 'wb') as f:
+                f.write(body)
+            os.replace(temp_path, body_path)
+
+        now = time()
+        with self.lock:
+            self.stats.misses += 1
+
+            previous = self.connection.execute(
+                'SELECT body_hash, size FROM entries WHERE url = ?', (url,)).fetchone()
+            with self.connection:
+                self.connection.execute(
+                    'INSERT OR REPLACE INTO entries '
+                    '(url, body_hash, encoding, etag, last_modified, size, fetched_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (url, body_hash, encoding, headers.get('ETag'), headers.get('Last-Modified'),
+                     len(body), now, now))
+
+            self.total_size += len(body)
+            if previous:
+                previous_hash, previous_size = previous
+                self.total_size -= previous_size
+                if previous_hash != body_hash:
+                    self._remove_body_if_unused(previous_hash)
+
+            self._evict()
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+    def _drop(self, entry: CacheEntry) -> None:
+        with self.lock:
+            # Entry may be stored again meanwhile
+            with self.connection:
+                cursor = self.connection.execute(
+                    'DELETE FROM entries WHERE url = ? AND body_hash = ?', (entry.url, entry.body_hash))
+            if cursor.rowcount:
+                self.total_size -= entry.size
+
+    def _evict(self) -> None:
+        while self.total_size > self.max_size:
+            row = self.connection.execute(
+                'SELECT url, body_hash, size FROM entries ORDER BY accessed_at LIMIT 1').fetchone()
+            if row is None:
+                break
+
+            url, body_hash, size = row
+            with self.connection:
+                self.connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self.total_size -= size
+            self.stats.evictions += 1
+            self._remove_body_if_unused(body_hash)
+
+    def _remove_body_if_unused(self, body_hash: str) -> None:
+        row = self.connection.execute(
+            'SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1', (body_hash,)).fetchone()
+        if row is None:
+            try:
+                os.remove(self._body_path(body_hash))
+            except FileNotFoundError:
+                ...
+
+    def _body_path(self, body_hash: str) -> str:
+        return os.path.join(self.directory, 'bodies', body_hash[:2], body_hash)
+
+
+_http_cache: tp.Optional[HttpCache] = None
+
+
+def get_http_cache() -> tp.Optional[HttpCache]:
+    """
+    Returns shared HttpCache, if `config.http_cache_dir` is set.
+    """
+    global _http_cache
+
+    if not config.http_cache_dir:
+        return None
+
+    if _http_cache is None or _http_cache.directory != config.http_cache_dir:
+        _http_cache = HttpCache(config.http_cache_dir)
+    return _http_cache
+
+
+metrics.register_stats('http_cache', lambda: _http_cache and _http_cache.stats)
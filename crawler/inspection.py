@@ -0,0 +1,118 @@
+import hashlib
+import re
+import typing as tp
+import zlib
+from dataclasses import dataclass
+from zipfile import BadZipFile, ZipFile, ZipInfo
+
+from crawler.config import config
+from crawler.structs import File
+
+# Entries, which are walked as nested archives:
+# libraries, plain archives and split APK bundles
+NESTED_ARCHIVE_SUFFIXES = ('.apk', '.apks', '.apkm', '.xapk', '.jar', '.aar', '.zip')
+
+# Dalvik executables in root of APK: classes.dex, classes2.dex...
+DEX_PATTERN = re.compile(r'^classes\d*\.dex$')
+
+# Separates path of nested archive from path inside it
+NESTED_SEPARATOR = '!/'
+
+# Errors of single entry, which don't break the whole archive:
+# CRC mismatch, encryption, unsupported compression, broken stream
+ENTRY_ERRORS = (BadZipFile, RuntimeError, NotImplementedError, zlib.error, EOFError)
+
+
+@dataclass
+class InspectionStats:
+    # Dalvik executables, including ones of nested APKs
+    dex_count: int = 0
+    # Nested archives, which were listed
+    nested_archives: int = 0
+    # Entries, which failed CRC check or couldn't be read
+    broken_entries: int = 0
+    # Uncompressed bytes, which were hashed
+    bytes_read: int = 0
+
+
+def inspect_archive(zipfile: ZipFile,
+                    archive_name: str,
+                    get_mime_type: tp.Callable[[str], str],
+                    stats: InspectionStats,
+                    max_depth: int = None,
+                    max_nested_size: int = None,
+                    prefix: str = '',
+                    depth: int = 0) -> tp.Generator[File, None, None]:
+    """
+    Yields File of each entry with CRC and SHA-256 of its contents.
+
+    Entries are streamed chunk by chunk, CRC is verified by ZipFile on
+    the fly. Nested archives up to `max_nested_size` bytes are read right
+    from seekable entry streams (never extracted) and walked up to
+    `max_depth` levels deep, their entries are named as
+    'lib.jar!/META-INF/MANIFEST.MF'.
+    """
+    if max_depth is None:
+        max_depth = config.inspection_max_depth
+    if max_nested_size is None:
+        max_nested_size = config.inspection_max_nested_size
+
+    for zipinfo in zipfile.infolist():
+        file: File = File(archive_name=archive_name,
+                          file_name=prefix + zipinfo.filename,
+                          mime_type=get_mime_type(zipinfo.filename),
+                          size_deflated=zipinfo.file_size,
+                          size_compressed=zipinfo.compress_size,
+                          crc=zipinfo.CRC)
+
+        if DEX_PATTERN.match(zipinfo.filename):
+            stats.dex_count += 1
+
+        if zipinfo.is_dir():
+            yield file
+            continue
+
+        is_nested = depth < max_depth and zipinfo.file_size <= max_nested_size and \
+            zipinfo.filename.lower().endswith(NESTED_ARCHIVE_SUFFIXES)
+
+        try:
+            file.sha256 = _hash_entry(zipfile, zipinfo)
+        except ENTRY_ERRORS:
+            stats.broken_entries += 1
+            yield file
+            continue
+
+        stats.bytes_read += zipinfo.file_size
+        yield file
+
+        if not is_nested:
+            continue
+
+        # Entry stream is seekable, so nested archive is read
+        # in place, decompressing only parts ZipFile asks for
+        with zipfile.open(zipinfo) as stream:
+            try:
+                nested = ZipFile(stream)
+            except BadZipFile:
+                # E.g. asset, which only looks like archive
+                continue
+
+            stats.nested_archives += 1
+            with nested:
+                yield from inspect_archive(nested, archive_name, get_mime_type, stats,
+                                           max_depth=max_depth,
+                                           max_nested_size=max_nested_size,
+                                           prefix=file.file_name + NESTED_SEPARATOR,
+                                           depth=depth + 1)
+
+
+def _hash_entry(zipfile: ZipFile, zipinfo: ZipInfo) -> str:
+    hasher = hashlib.sha256()
+
+    with zipfile.open(zipinfo) as stream:
+        chunk = stream.read(config.download_chunk_size)
+        while chunk:
+            hasher.update(chunk)
+            chunk = stream.read(config.download_chunk_size)
+
+    return hasher.hexdigest()
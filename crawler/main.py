@@ -1,29 +1,101 @@
+import asyncio
 import typing as tp
 from itertools import chain, islice
 
+from crawler.analysis import AnalysisPool
 from crawler.app import App
+from crawler.async_spider import AsyncSpider
 from crawler.config import config
+from crawler.distributed import Coordinator
+from crawler.frontier_store import FrontierStore
+from crawler.metrics import profiling, reporting
 from crawler.page import Page
+from crawler.pipeline import Pipeline
+from crawler.scratch import sweep_scratch_dir
+from crawler.seen_index import get_seen_index
+from crawler.sinks import Sink, make_sink
 from crawler.spider import Spider
 
 
 def main():
+    sweep_scratch_dir()
+
+    if config.engine == 'async':
+        asyncio.run(async_main())
+        return
+
+    if config.engine == 'distributed':
+        Coordinator(queue_path=config.work_queue_path,
+                    workers_count=config.workers_count,
+                    root_path=config.root_path).run()
+        return
+
+    if config.engine == 'pipeline':
+        with make_sink() as sink, Pipeline(root_path=config.root_path,
+                                           max_depth=config.max_depth) as pipeline:
+            write_files(pipeline, sink)
+        pipeline.logger.info('Stage stats: %s' % pipeline.stats)
+        return
+
+    store: tp.Optional[FrontierStore] = None
+    if config.frontier_path:
+        store = FrontierStore(config.frontier_path)
+
     spider: Spider = Spider(root_path=config.root_path,
-                            max_depth=config.max_depth)
+                            max_depth=config.max_depth,
+                            store=store)
 
     # Build unique pages generator
     pages: tp.Generator[Page, None, None] = \
         (page for page in spider)
 
-    # Build ranged apps generator
+    # Build ranged apps generator, apps still
+    # waiting for retry are fetched last
     apps: tp.Union[islice, tp.Iterator[App]] = \
-        islice(chain.from_iterable(pages), config.apps_to_fetch)
+        islice(chain(chain.from_iterable(pages), spider.retried_apps()), config.apps_to_fetch)
+
+    try:
+        with make_sink() as sink:
+            if not config.analysis_workers:
+                write_files(apps, sink)
+                return
+
+            # APKs are analysed while next ones are downloaded
+            with AnalysisPool() as pool:
+                write_files(pool.analyse(apps), sink)
+            pool.logger.info('Stage timings: %s' % pool.stats)
+    finally:
+        if store:
+            store.close()
+
+
+def write_files(apps: tp.Iterable[App], sink: Sink) -> None:
+    for app in apps:
+        write_app(app, sink)
+
+
+def write_app(app: App, sink: Sink) -> None:
+    """
+    Writes files of app. In incremental mode app is remembered
+    only after that, so app, which files were lost by crash,
+    is fetched again by the next crawl.
+    """
+    sink.write_batch(app.batch())
+
+    index = get_seen_index()
+    if index:
+        index.remember(app.path, app.download_id)
+
+
+async def async_main():
+    spider: AsyncSpider = AsyncSpider(root_path=config.root_path,
+                                      max_depth=config.max_depth)
 
-    with open('files.txt', 'a') as f:
-        for app in apps:
-            for file in app:
-                f.write(file.dumps())
+    with make_sink() as sink:
+        async for app in spider:
+            write_app(app, sink)
 
 
 if __name__ == '__main__':
-    main()
+    with profiling(), reporting():
+        main()
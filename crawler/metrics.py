@@ -0,0 +1,465 @@
+import cProfile
+import functools
+import json
+import logging
+import os
+import threading
+import tracemalloc
+import typing as tp
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from inspect import iscoroutinefunction
+from time import monotonic, perf_counter
+
+from crawler.config import config
+
+# Prefix of exported metric names
+NAMESPACE = 'crawler'
+
+# Upper bounds (seconds) of latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Upper bounds of per-app count histogram buckets
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128)
+
+Labels = tp.Tuple[tp.Tuple[str, str], ...]
+Sample = tp.Tuple[str, Labels, float]
+
+
+class Counter:
+    """
+    Monotonically growing value, optionally split by labels.
+    """
+
+    type: str = 'counter'
+
+    def __init__(self, name: str, help: str = ''):
+        self.name: str = name
+        self.help: str = help
+        self.values: tp.Dict[Labels, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_labels_key(labels), 0)
+
+    def samples(self) -> tp.List[Sample]:
+        with self.lock:
+            return [(self.name, labels, value) for labels, value in self.values.items()]
+
+    def export(self) -> tp.Any:
+        with self.lock:
+            if list(self.values) == [()]:
+                return self.values[()]
+            return {_format_labels(labels) or '': value for labels, value in self.values.items()}
+
+
+class Gauge(Counter):
+    """
+    Current value, e.g. queue depth.
+    """
+
+    type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        with self.lock:
+            self.values[_labels_key(labels)] = value
+
+
+class Histogram:
+    """
+    Distribution of observed values, e.g. latencies,
+    over fixed buckets, plus their sum and count.
+    """
+
+    type: str = 'histogram'
+
+    def __init__(self, name: str, help: str = '', buckets: tp.Sequence[float] = DEFAULT_BUCKETS):
+        self.name: str = name
+        self.help: str = help
+        self.buckets: tp.Tuple[float, ...] = tuple(buckets)
+
+        # The last one is +Inf bucket
+        self.counts: tp.List[int] = [0] * (len(self.buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self) -> tp.Generator[None, None, None]:
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started)
+
+    def samples(self) -> tp.List[Sample]:
+        with self.lock:
+            samples: tp.List[Sample] = []
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+                cumulative += count
+                samples.append((self.name + '_bucket', (('le', _format_bound(bound)),), cumulative))
+
+            samples.append((self.name + '_sum', (), self.sum))
+            samples.append((self.name + '_count', (), self.count))
+            return samples
+
+    def export(self) -> tp.Dict[str, tp.Any]:
+        with self.lock:
+            return {
+                'count': self.count,
+                'sum': self.sum,
+                'mean': self.sum / self.count if self.count else 0.0,
+                'buckets': {_format_bound(bound): count
+                            for bound, count in zip(self.buckets + (float('inf'),), self.counts)},
+            }
+
+
+Metric = tp.Union[Counter, Gauge, Histogram]
+
+
+class MetricsRegistry:
+    """
+    Named counters, gauges and histograms of crawl.
+
+    Metrics are created on first use. Collectors are called before
+    each export, so stats of other components (proxies, rate limiter,
+    caches) are exported as gauges without hooks on hot paths.
+
+    Usage:
+
+        metrics.inc('pages_total')
+        metrics.set('frontier_pages', len(frontier))
+
+        with metrics.timer('page_fetch_seconds'):
+            ...
+
+        @metrics.timed('html_parse_seconds')
+        def extract_links(self):
+            ...
+
+        print(metrics.render())
+
+    Thread safe.
+    """
+
+    def __init__(self):
+        self.metrics: tp.Dict[str, Metric] = {}
+        self.collectors: tp.List[tp.Callable[['MetricsRegistry'], None]] = []
+        self.started_at: float = monotonic()
+        self.lock = threading.Lock()
+
+    def counter(self, name: str, help: str = '') -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str = '') -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str = '', buckets: tp.Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        self.counter(name).inc(amount, **labels)
+
+    def set(self, name: str, value: float, **labels) -> None:
+        self.gauge(name).set(value, **labels)
+
+    def observe(self, name: str, value: float) -> None:
+        self.histogram(name).observe(value)
+
+    def timer(self, name: str) -> tp.ContextManager[None]:
+        return self.histogram(name).time()
+
+    def timed(self, name: str) -> tp.Callable:
+        """
+        Decorator, which observes duration of each
+        call of function or coroutine function.
+        """
+        def decorator(function: tp.Callable) -> tp.Callable:
+            if iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def wrapper(*args, **kwargs):
+                    with self.timer(name):
+                        return await function(*args, **kwargs)
+            else:
+                @functools.wraps(function)
+                def wrapper(*args, **kwargs):
+                    with self.timer(name):
+                        return function(*args, **kwargs)
+            return wrapper
+
+        return decorator
+
+    def register_collector(self, collector: tp.Callable[['MetricsRegistry'], None]) -> None:
+        with self.lock:
+            self.collectors.append(collector)
+
+    def register_stats(self, prefix: str, get_stats: tp.Callable[[], tp.Any]) -> None:
+        """
+        Exports numeric fields of stats dataclass, e.g. CacheStats.hits
+        as `<prefix>_hits` gauge. `get_stats` returns current stats
+        or None, if component is not used.
+        """
+        def collect(registry: 'MetricsRegistry') -> None:
+            stats = get_stats()
+            if stats is None:
+                return
+            for name, value in asdict(stats).items():
+                if isinstance(value, (int, float)):
+                    registry.set('%s_%s' % (prefix, name), value)
+
+        self.register_collector(collect)
+
+    def collect(self) -> tp.List[Metric]:
+        with self.lock:
+            collectors = list(self.collectors)
+        for collector in collectors:
+            collector(self)
+
+        with self.lock:
+            return sorted(self.metrics.values(), key=lambda metric: metric.name)
+
+    def render(self) -> str:
+        """
+        Returns metrics in Prometheus text exposition format.
+        """
+        lines: tp.List[str] = []
+        for metric in self.collect():
+            name = '%s_%s' % (NAMESPACE, metric.name)
+            if metric.help:
+                lines.append('# HELP %s %s' % (name, metric.help))
+            lines.append('# TYPE %s %s' % (name, metric.type))
+            for sample_name, labels, value in metric.samples():
+                lines.append('%s_%s%s %s' % (NAMESPACE, sample_name, _format_labels(labels), value))
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self) -> tp.Dict[str, tp.Any]:
+        """
+        Returns metrics as JSON serializable dict. Counters
+        are accompanied with average rates per second.
+        """
+        uptime = monotonic() - self.started_at
+        metrics = self.collect()
+
+        exported: tp.Dict[str, tp.Any] = {'uptime': uptime}
+        rates: tp.Dict[str, float] = {}
+        for metric in metrics:
+            exported[metric.name] = metric.export()
+            if metric.type == 'counter' and uptime:
+                rates[metric.name] = sum(value for _, _, value in metric.samples()) / uptime
+        exported['rates'] = rates
+
+        return exported
+
+    def dump(self, path: str) -> None:
+        """
+        Writes JSON export, atomically replacing previous one.
+        """
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.export(), f, indent=2, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def _get(self, metric_class: tp.Type, name: str, *args) -> tp.Any:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, *args)
+
+        assert isinstance(metric, metric_class), 'metric %s is %s' % (name, metric.type)
+        return metric
+
+
+class MetricsServer:
+    """
+    Serves Prometheus text of registry over HTTP
+    on `port` from background thread.
+
+    Usage:
+
+        with MetricsServer(port=9100):
+            ...
+
+    @contextmanager
+    """
+
+    def __init__(self, port: int = None, registry: MetricsRegistry = None):
+        self.port: int = port if port is not None else config.metrics_port
+        self.registry: MetricsRegistry = registry or metrics
+        self.server: tp.Optional[ThreadingHTTPServer] = None
+
+    def __enter__(self) -> 'MetricsServer':
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Scrapes are not worth logging
+                ...
+
+        self.server = ThreadingHTTPServer(('', self.port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+
+
+class MetricsDumper:
+    """
+    Periodically dumps JSON export of registry to `path`
+    from background thread, and once more on exit.
+
+    Usage:
+
+        with MetricsDumper(path='metrics.json', interval=60):
+            ...
+
+    @contextmanager
+    """
+
+    def __init__(self, path: str = None, interval: float = None, registry: MetricsRegistry = None):
+        self.path: str = path or config.metrics_dump_path
+        self.interval: float = interval or config.metrics_dump_interval
+        self.registry: MetricsRegistry = registry or metrics
+        self.stopped = threading.Event()
+        self.thread: tp.Optional[threading.Thread] = None
+
+    def __enter__(self) -> 'MetricsDumper':
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.registry.dump(self.path)
+
+    def _run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.registry.dump(self.path)
+
+
+@contextmanager
+def reporting(port: int = None, dump_path: str = None) -> tp.Generator[None, None, None]:
+    """
+    Exposes metrics for duration of crawl: over HTTP, if
+    `config.metrics_port` is set, and as periodic JSON
+    dumps, if `config.metrics_dump_path` is set.
+
+    @contextmanager
+    """
+    port = port if port is not None else config.metrics_port
+    dump_path = dump_path or config.metrics_dump_path
+
+    with ExitStack() as stack:
+        if port is not None:
+            stack.enter_context(MetricsServer(port=port))
+        if dump_path:
+            stack.enter_context(MetricsDumper(path=dump_path))
+        yield
+
+
+@contextmanager
+def profiling(kind: str = None, path: str = None) -> tp.Generator[None, None, None]:
+    """
+    Profiles crawl with `config.profiler`: 'cprofile' dumps stats for
+    `pstats` / snakeviz, 'tracemalloc' dumps snapshot of allocations
+    for `tracemalloc.Snapshot.load`. Does nothing, if profiler is not set.
+
+    @contextmanager
+    """
+    kind = kind or config.profiler
+    path = path or config.profile_path
+    if not kind:
+        yield
+        return
+
+    assert kind in ('cprofile', 'tracemalloc'), 'unknown profiler %s' % kind
+    logger = logging.getLogger('metrics')
+
+    if kind == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    else:
+        tracemalloc.start(config.tracemalloc_frames)
+        try:
+            yield
+        finally:
+            tracemalloc.take_snapshot().dump(path)
+            tracemalloc.stop()
+
+    logger.info('Dumped %s profile to %s' % (kind, path))
+
+
+def _labels_key(labels: tp.Dict[str, tp.Any]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, value.replace('\\', r'\\').replace('"', r'\"'))
+                             for name, value in labels)
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+metrics: MetricsRegistry = MetricsRegistry()
+
+# Core metrics are declared upfront, so they are
+# exported with help text even before first use
+metrics.counter('pages_total', 'Pages fetched, including ones from HTTP cache')
+metrics.counter('apps_total', 'Apps, which files were written to output')
+metrics.counter('files_total', 'Files of apps, written to output')
+metrics.counter('bytes_total', 'Bytes downloaded, by kind of resource')
+metrics.counter('proxy_errors_total', 'Network errors of requests, by proxy')
+metrics.counter('download_id_resolutions_total', 'Download IDs resolved, by method: scan, parse or cache')
+metrics.counter('dex_files_total', 'DEX files of deeply inspected APKs, including nested ones')
+metrics.counter('nested_archives_total', 'Nested archives of deeply inspected APKs')
+metrics.counter('broken_entries_total', 'Entries of deeply inspected APKs, which failed CRC check')
+metrics.histogram('page_fetch_seconds', 'Page fetch latency')
+metrics.histogram('html_parse_seconds', 'Link extraction latency')
+metrics.histogram('download_id_fetch_seconds', 'Download ID fetch latency')
+metrics.histogram('apk_download_seconds', 'APK download latency')
+metrics.histogram('zip_scan_seconds', 'APK listing or inspection latency')
+metrics.histogram('apk_dex_files', 'DEX files per deeply inspected APK', buckets=COUNT_BUCKETS)
+metrics.gauge('frontier_pages', 'Pages waiting in frontier')
+metrics.gauge('retry_pages', 'Pages waiting for retry')
+metrics.gauge('retry_apps', 'Apps waiting for retry')
+metrics.gauge('analysis_queue_apps', 'Downloaded apps waiting for analysis')
+metrics.gauge('tasks_in_flight', 'Page and app tasks of async engine')
+metrics.gauge('pipeline_queue_items', 'Items waiting before stage of pipeline engine')
+metrics.gauge('pipeline_busy_workers', 'Busy workers of stage of pipeline engine')
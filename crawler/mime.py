@@ -0,0 +1,111 @@
+import mimetypes
+import typing as tp
+from functools import lru_cache
+from zipfile import ZipInfo
+
+from crawler.config import config
+from crawler.zip_directory import ZipEntry
+
+# Types of APK contents, which `mimetypes` misses or gets wrong.
+# Keys are lowercase extensions.
+ANDROID_MIME_TYPES: tp.Dict[str, str] = {
+    '.apk': 'application/vnd.android.package-archive',
+    '.apks': 'application/vnd.android.package-archive',
+    '.dex': 'application/vnd.android.dex',
+    '.odex': 'application/vnd.android.dex',
+    '.vdex': 'application/vnd.android.dex',
+    '.arsc': 'application/vnd.android.arsc',
+    '.so': 'application/x-sharedlib',
+    '.jar': 'application/java-archive',
+    '.aar': 'application/java-archive',
+    '.class': 'application/java-vm',
+    '.webp': 'image/webp',
+    '.ttf': 'font/ttf',
+    '.otf': 'font/otf',
+    '.woff': 'font/woff',
+    '.woff2': 'font/woff2',
+    '.kotlin_module': 'application/x-kotlin-module',
+    '.kotlin_builtins': 'application/x-kotlin-builtins',
+    '.properties': 'text/x-java-properties',
+    '.proto': 'text/x-protobuf',
+    '.pb': 'application/x-protobuf',
+    '.tflite': 'application/x-tflite',
+    '.bin': 'application/octet-stream',
+    '.sf': 'text/plain',
+    '.mf': 'text/plain',
+    '.rsa': 'application/pkcs7-signature',
+    '.dsa': 'application/pkcs7-signature',
+    '.ec': 'application/pkcs7-signature',
+}
+
+# Distinct extensions, which resolved types are kept for
+MIME_CACHE_SIZE = 4096
+
+
+def get_mime_type(filename: str) -> str:
+    """
+    Returns mime type of file in archive by its extension.
+
+    Known Android types come first, then `mimetypes`. Unknown
+    extension is described as custom "application/<extension>"
+    mime type. Without extension `config.unknown_mime_failback` is used.
+    """
+    extension = get_extension(filename)
+    if not extension:
+        return config.unknown_mime_failback
+    return _get_extension_mime_type(extension)
+
+
+def get_mime_types(infolist: tp.Iterable[tp.Union[ZipInfo, ZipEntry]]) -> tp.List[str]:
+    """
+    Batch version of get_mime_type for `ZipFile.infolist()`
+    or entries of `read_central_directory`.
+    """
+    resolved: tp.Dict[str, str] = {}
+    mime_types: tp.List[str] = []
+
+    for zipinfo in infolist:
+        extension = get_extension(zipinfo.filename)
+        mime_type = resolved.get(extension)
+        if mime_type is None:
+            mime_type = _get_extension_mime_type(extension) if extension else config.unknown_mime_failback
+            resolved[extension] = mime_type
+        mime_types.append(mime_type)
+
+    return mime_types
+
+
+def get_extension(filename: str) -> str:
+    """
+    Returns extension of file same way as `pathlib.PurePath.suffix`,
+    but keeps compressed tarball extensions whole, e.g. '.tar.gz'.
+    """
+    name = filename[filename.rfind('/') + 1:]
+    index = name.rfind('.')
+    if not 0 < index < len(name) - 1:
+        return ''
+
+    # 'foo.tar.gz' is 'application/x-tar' for mimetypes
+    if name[index:].lower() in mimetypes.encodings_map:
+        inner_index = name.rfind('.', 0, index)
+        if 0 < inner_index < index - 1:
+            return name[inner_index:]
+
+    return name[index:]
+
+
+@lru_cache(maxsize=MIME_CACHE_SIZE)
+def _get_extension_mime_type(extension: str) -> str:
+    mime_type = ANDROID_MIME_TYPES.get(extension.lower())
+    if mime_type:
+        return mime_type
+
+    mime_type, _ = mimetypes.guess_type('file' + extension, strict=True)
+    if mime_type:
+        return mime_type
+
+    # Only the last extension describes file
+    extension = extension[extension.rfind('.'):]
+    return 'application/{}'.format(
+        extension[1:]  # Strip the leading dot from extension
+    )
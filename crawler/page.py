@@ -2,12 +2,16 @@ import logging
 import typing as tp
 from urllib.parse import urlunsplit
 
-from bs4 import BeautifulSoup
-
 from crawler.app import App
+from crawler.async_session import AsyncProxiedSession
 from crawler.config import config
 from crawler.errors import DownloadError
+from crawler.parsers import get_parser
+from crawler.http_cache import HttpCache, get_http_cache
+from crawler.metrics import metrics
 from crawler.proxied_session import ProxiedSession
+from crawler.retry import RETRY_ERRORS, RetryQueue
+from crawler.seen_index import get_seen_index
 from crawler.structs import PageState
 from crawler.utils import get_path_from_url, is_url_allowed
 
@@ -47,6 +51,9 @@ class Page:
         self.state: PageState = PageState.INITIALIZED
         self.retries_count: int = 0
 
+        # Failed apps are scheduled here, if set
+        self.app_retries: tp.Optional[RetryQueue[App]] = None
+
         self.logger = logger
         if not self.logger:
             self.logger = logging.getLogger('app')
@@ -62,19 +69,23 @@ class Page:
         """
         Iterates over self app links, returning a new
         App object with prefetced APK file.
+
+        If `app_retries` is set, failed apps are retried later, and
+        earlier failed apps, which delay is over, are yielded as well.
         """
         for app_path in self.app_links:
             app = App(path=app_path)
+            if fetch_app(app, self.app_retries):
+                yield app
 
-            # If we're unable to fetch app data,
-            # skip it without retrying
-            try:
-                app.fetch_download_id()
-                app.download_file()
-            except DownloadError as exc:
-                self.logger.error('Cant download app %s. Skipping.' % self.path)
-            else:
+        if self.app_retries is None:
+            return
+
+        app = self.app_retries.pop_due()
+        while app:
+            if fetch_app(app, self.app_retries):
                 yield app
+            app = self.app_retries.pop_due()
 
     def children(self) -> tp.Generator['Page', None, None]:
         """
@@ -89,33 +100,107 @@ class Page:
 
         yield from children
 
+    @metrics.timed('page_fetch_seconds')
     def fetch_body(self):
+        """
+        Downloads page HTML. If HTTP cache is enabled, fresh
+        cached body is used without request, and stale one
+        is revalidated with conditional request.
+        """
+        cache = get_http_cache()
+        entry = cache.lookup(self.absolute_url) if cache else None
+        if entry and cache.is_fresh(entry):
+            html = cache.read(entry)
+            if html is not None:
+                self._set_html(html)
+                return
+            entry = None
+
         with ProxiedSession(proxies=config.proxies) as session:
-            response = session.get(self.absolute_url)
+            response = session.get(self.absolute_url,
+                                   headers=HttpCache.conditional_headers(entry))
+            if response.status_code == 304 and entry:
+                html = cache.read(entry, revalidated=True, headers=response.headers)
+                if html is not None:
+                    self._set_html(html)
+                    return
+
+                # Cached body is lost, so page is fetched in full
+                response = session.get(self.absolute_url)
+
             if response.status_code != 200:
                 self.logger.error('Failed to fetch page body: %s' % self.path)
-                raise DownloadError
+                raise DownloadError(status_code=response.status_code)
 
-            self.html = response.text
-            self.state = PageState.FETCHED
+            metrics.inc('bytes_total', len(response.content), kind='page')
+            if cache:
+                cache.store(self.absolute_url, response.content,
+                            encoding=response.encoding, headers=response.headers)
+            self._set_html(response.text)
 
-    def extract_links(self) -> None:
+    @metrics.timed('page_fetch_seconds')
+    async def fetch_body_async(self, session: AsyncProxiedSession) -> None:
+        """
+        Same as fetch_body, but uses shared
+        AsyncProxiedSession of AsyncSpider.
+        """
+        cache = get_http_cache()
+        entry = cache.lookup(self.absolute_url) if cache else None
+        if entry and cache.is_fresh(entry):
+            html = cache.read(entry)
+            if html is not None:
+                self._set_html(html)
+                return
+            entry = None
+
+        async with session.get(self.absolute_url,
+                               headers=HttpCache.conditional_headers(entry)) as response:
+            if response.status == 304 and entry:
+                html = cache.read(entry, revalidated=True, headers=response.headers)
+                if html is not None:
+                    self._set_html(html)
+                    return
+            else:
+                await self._read_body_async(response, cache)
+                return
+
+        # Cached body is lost, so page is fetched in full
+        async with session.get(self.absolute_url) as response:
+            await self._read_body_async(response, cache)
+
+    async def _read_body_async(self, response, cache: tp.Optional[HttpCache]) -> None:
+        if response.status != 200:
+            self.logger.error('Failed to fetch page body: %s' % self.path)
+            raise DownloadError(status_code=response.status)
+
+        body = await response.read()
+        metrics.inc('bytes_total', len(body), kind='page')
+        if cache:
+            cache.store(self.absolute_url, body,
+                        encoding=response.get_encoding(), headers=response.headers)
+        self._set_html(body.decode(response.get_encoding(), errors='replace'))
+
+    def _set_html(self, html: str) -> None:
+        self.html = html
+        self.state = PageState.FETCHED
+        metrics.inc('pages_total')
+
+    @metrics.timed('html_parse_seconds')
+    def extract_links(self, parser=None) -> None:
         """
         Parses self HTML and extracts links, matching
         allowed patterns to self.app_links and self.page_links.
 
         App links are determined by having DOWNLOAD_SUFFIX.
+        HTML is parsed with `config.html_parser` backend,
+        unless other parser is provided.
         """
         assert self.html, 'page should have valid html'
 
-        soup = BeautifulSoup(self.html, 'html.parser')
-        link_tags = soup.find_all('a')
-
-        for tag in link_tags:
-            href = tag.attrs.get('href')
-            if href is None:
-                continue
+        if parser is None:
+            parser = get_parser()
 
+        for href in parser.hrefs(self.html):
             url_path = get_path_from_url(href)
             if url_path is None:
                 continue
@@ -137,3 +222,34 @@ class Page:
         """
         return urlunsplit(
             (config.scheme, config.network_location, self.path, None, None,))
+
+
+def fetch_app(app: App, retries: RetryQueue = None) -> bool:
+    """
+    Fetches APK of app (or its listing in metadata-only mode).
+    Failed app is scheduled to `retries` if given and allowed
+    by policy, otherwise it's skipped. In incremental mode app
+    of already seen download_id is skipped too. Fetched app is
+    remembered only after its files are written (ref:write_files).
+
+    :return: True, if app is fetched.
+    """
+    index = get_seen_index()
+    try:
+        app.fetch_download_id()
+        if index and index.skip_known_download(app):
+            app.logger.info('Skipping known release %s' % app.path)
+            return False
+
+        if config.metadata_only:
+            app.fetch_metadata()
+        else:
+            app.download_file()
+    except RETRY_ERRORS as exc:
+        if retries is not None and retries.schedule(app, exc):
+            app.logger.warning('Cant download app %s. Retrying later.' % app.path)
+        else:
+            app.logger.error('Cant download app %s. Skipping.' % app.path)
+        return False
+
+    return True
@@ -0,0 +1,227 @@
+import re
+import typing as tp
+from html import unescape
+from html.parser import HTMLParser
+
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+from crawler.config import config
+
+try:
+    import lxml.html
+except ImportError:  # pragma: no cover
+    lxml = None
+
+Html = tp.Union[str, bytes]
+
+# Tags, which ShortlinkScanner looks for: link tag as a
+# whole, and ends of head, after which there is no shortlink
+_HEAD_TAG_PATTERN = re.compile(rb'<link\b[^>]*>|</head\b|<body\b', re.IGNORECASE)
+_ATTRIBUTE_PATTERN = re.compile(rb'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+
+class BeautifulSoupParser:
+    """
+    Reference backend: builds full BeautifulSoup tree.
+    """
+    name = 'bs4'
+
+    def hrefs(self, html: Html) -> tp.List[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        return [tag.attrs['href'] for tag in soup.find_all('a') if 'href' in tag.attrs]
+
+    def shortlink(self, html: Html) -> tp.Optional[str]:
+        soup = BeautifulSoup(html, 'html.parser')
+        tag: Tag = soup.find('link', rel='shortlink')
+        if tag is None:
+            return None
+        return tag.attrs.get('href')
+
+
+class _StopParsing(Exception):
+    ...
+
+
+class _LinksTokenizer(HTMLParser):
+    """
+    Collects attributes of interesting tags right from
+    html.parser tokens. No tree is built.
+    """
+
+    def __init__(self, stop_on_shortlink: bool = False):
+        super().__init__()
+        self.hrefs: tp.List[str] = []
+        self.shortlink: tp.Optional[str] = None
+        self.shortlink_found: bool = False
+        self.stop_on_shortlink: bool = stop_on_shortlink
+
+    def handle_starttag(self, tag: str, attrs: tp.List[tp.Tuple[str, tp.Optional[str]]]) -> None:
+        if tag == 'a':
+            href = _get_attribute(attrs, 'href')
+            if href is not None:
+                self.hrefs.append(href)
+
+        elif tag == 'link' and not self.shortlink_found:
+            rel = _get_attribute(attrs, 'rel')
+            # rel is whitespace-separated list of values
+            if rel is not None and 'shortlink' in rel.split():
+                self.shortlink = _get_attribute(attrs, 'href')
+                self.shortlink_found = True
+                if self.stop_on_shortlink:
+                    raise _StopParsing
+
+
+class StreamingParser:
+    """
+    Runs stdlib html.parser tokenizer (same one BeautifulSoup
+    uses with 'html.parser'), handling start tags on the fly.
+    """
+    name = 'stream'
+
+    def hrefs(self, html: Html) -> tp.List[str]:
+        tokenizer = _LinksTokenizer()
+        tokenizer.feed(_decode(html))
+        tokenizer.close()
+        return tokenizer.hrefs
+
+    def shortlink(self, html: Html) -> tp.Optional[str]:
+        tokenizer = _LinksTokenizer(stop_on_shortlink=True)
+        try:
+            tokenizer.feed(_decode(html))
+            tokenizer.close()
+        except _StopParsing:
+            ...
+        return tokenizer.shortlink
+
+
+class LxmlParser:
+    """
+    libxml2-based backend. Requires optional lxml package.
+    """
+    name = 'lxml'
+
+    def __init__(self):
+        assert lxml is not None, 'lxml should be installed to use lxml parser'
+
+    def hrefs(self, html: Html) -> tp.List[str]:
+        document = self._parse(html)
+        if document is None:
+            return []
+        return [tag.get('href') for tag in document.iter('a') if tag.get('href') is not None]
+
+    def shortlink(self, html: Html) -> tp.Optional[str]:
+        document = self._parse(html)
+        if document is None:
+            return None
+
+        for tag in document.iter('link'):
+            if 'shortlink' in (tag.get('rel') or '').split():
+                return tag.get('href')
+        return None
+
+    @staticmethod
+    def _parse(html: Html):
+        if not html:
+            return None
+        return lxml.html.document_fromstring(html)
+
+
+class ShortlinkScanner:
+    """
+    Finds 'shortlink' link tag in raw bytes of page, as they are
+    received, without tokenizing the whole page. Scanning is over,
+    when the tag is found, or when head is over, or `max_size` bytes
+    are scanned without it. Then `shortlink` is None, and page
+    should be parsed fully. Text encoding is assumed to be
+    ASCII-compatible, which is checked by the full parse otherwise.
+
+    Usage:
+
+        scanner = ShortlinkScanner()
+        for chunk in chunks:
+            if scanner.feed(chunk):
+                break
+
+        shortlink = scanner.shortlink
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size: int = max_size or config.download_id_scan_limit
+        self.buffer: bytearray = bytearray()
+        self.shortlink: tp.Optional[str] = None
+        self.done: bool = False
+
+        # Everything before is scanned already
+        self.position: int = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        :return: True, if scanning is over.
+        """
+        if self.done:
+            return True
+        self.buffer += chunk
+
+        for match in _HEAD_TAG_PATTERN.finditer(self.buffer, self.position):
+            self.position = match.end()
+            tag = match.group()
+            if tag[:5].lower() != b'<link':
+                self.done = True
+                return True
+
+            attrs = _parse_attributes(tag[5:-1])
+            rel = _get_attribute(attrs, 'rel')
+            if rel is not None and 'shortlink' in rel.split():
+                self.shortlink = _get_attribute(attrs, 'href')
+                self.done = True
+                return True
+
+        # Tag, which is cut by chunk boundary,
+        # is scanned again with the next chunk
+        cut = self.buffer.rfind(b'<', self.position)
+        self.position = cut if cut != -1 else len(self.buffer)
+
+        self.done = len(self.buffer) >= self.max_size
+        return self.done
+
+
+PARSERS: tp.Dict[str, tp.Type] = {
+    BeautifulSoupParser.name: BeautifulSoupParser,
+    StreamingParser.name: StreamingParser,
+    LxmlParser.name: LxmlParser,
+}
+
+
+def get_parser(name: str = None):
+    """
+    Returns parser backend instance by its name,
+    `config.html_parser` by default.
+    """
+    return PARSERS[name or config.html_parser]()
+
+
+def _get_attribute(attrs: tp.List[tp.Tuple[str, tp.Optional[str]]], name: str) -> tp.Optional[str]:
+    # Last duplicate attribute wins and valueless
+    # attribute means empty string, same as in BeautifulSoup
+    value = None
+    for key, attr_value in attrs:
+        if key == name:
+            value = attr_value if attr_value is not None else ''
+    return value
+
+
+def _parse_attributes(attrs: bytes) -> tp.List[tp.Tuple[str, tp.Optional[str]]]:
+    # Names are lowercased and values are unescaped, same as in html.parser
+    parsed = []
+    for match in _ATTRIBUTE_PATTERN.finditer(attrs):
+        name, *values = match.groups()
+        value = next((value for value in values if value is not None), None)
+        parsed.append((_decode(name).lower(), unescape(_decode(value)) if value is not None else None))
+    return parsed
+
+
+def _decode(html: Html) -> str:
+    if isinstance(html, bytes):
+        return html.decode('utf-8', errors='replace')
+    return html
@@ -0,0 +1,530 @@
+import logging
+import queue
+import threading
+import typing as tp
+from dataclasses import dataclass
+from logging import Logger
+from zipfile import BadZipFile
+
+from crawler.app import App
+from crawler.config import config
+from crawler.metrics import metrics
+from crawler.page import Page
+from crawler.retry import RETRY_ERRORS, RetryQueue
+from crawler.scheduler import Scheduler, make_scheduler
+from crawler.seen_index import SeenIndex, get_seen_index
+from crawler.visited import make_visited_set
+
+# Stages of crawl in order of processing
+STAGES = ('fetch', 'extract', 'resolve', 'download', 'analyse')
+
+# Put to input queue of stage once for each of its
+# workers, when no more items will come to stage
+_END = object()
+
+# How often (seconds) workers, blocked on queue,
+# check whether pipeline is stopped
+POLL_INTERVAL = 0.1
+
+Handler = tp.Callable[[tp.Any], tp.Iterable[tp.Any]]
+
+
+@dataclass
+class StageStats:
+    # Items waiting in input queue and its size
+    queued: int = 0
+    capacity: int = 0
+    # Workers of stage and ones busy with item
+    workers: int = 0
+    busy: int = 0
+    # Items taken from queue
+    processed: int = 0
+
+
+class Stage:
+    """
+    Pool of worker threads, which take items from bounded
+    input queue, pass each to `handler` and put its results to
+    queue of the next stage. When that queue is full, workers
+    wait for free slot, so slow stage holds back upstream ones
+    instead of piling up items in memory.
+
+    Occupancy of input queue and busy workers are
+    reported as `pipeline_queue_items` and
+    `pipeline_busy_workers` gauges, labeled by stage.
+
+    Usage:
+
+        stage = Stage('fetch', handler, workers=4, queue_size=16, stop=stop)
+        stage.start(next_stage.queue, ends=next_stage.workers)
+
+        stage.put(item)
+        stage.finish()
+    """
+
+    def __init__(self,
+                 name: str,
+                 handler: Handler,
+                 workers: int,
+                 queue_size: int,
+                 stop: threading.Event,
+                 on_error: tp.Callable[[BaseException], None] = None):
+        assert workers > 0, 'stage %s should have at least one worker' % name
+
+        self.name: str = name
+        self.handler: Handler = handler
+        self.workers: int = workers
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.stop: threading.Event = stop
+        self.on_error: tp.Optional[tp.Callable[[BaseException], None]] = on_error
+
+        self.stats: StageStats = StageStats(capacity=queue_size, workers=workers)
+        self.threads: tp.List[threading.Thread] = []
+        self.lock = threading.Lock()
+
+        self.output: tp.Optional[queue.Queue] = None
+        self.ends: int = 0
+        self.running: int = 0
+
+    def start(self, output: queue.Queue, ends: int = 1) -> None:
+        """
+        Starts workers. After the last of them is over,
+        `ends` end markers are put to `output`.
+        """
+        self.output = output
+        self.ends = ends
+        self.running = self.workers
+
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name='%s-%s' % (self.name, number), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item: tp.Any) -> bool:
+        """
+        Waits for free slot in input queue.
+
+        :return: False, if pipeline is stopped meanwhile.
+        """
+        return _put(self.queue, item, self.stop)
+
+    def finish(self) -> None:
+        """
+        Tells workers, that no more items will come.
+        """
+        for _ in range(self.workers):
+            if not self.put(_END):
+                return
+
+    def join(self) -> None:
+        for thread in self.threads:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = _get(self.queue, self.stop)
+            if item is None:
+                return
+            if item is _END:
+                break
+
+            self._report(busy=1)
+            try:
+                for result in self.handler(item):
+                    if not _put(self.output, result, self.stop):
+                        return
+            except BaseException as exc:
+                if self.on_error:
+                    self.on_error(exc)
+                return
+            finally:
+                self._report(busy=-1)
+
+        # The last worker ends the next stage
+        with self.lock:
+            self.running -= 1
+            last = self.running == 0
+        if last:
+            for _ in range(self.ends):
+                if not _put(self.output, _END, self.stop):
+                    return
+
+    def _report(self, busy: int) -> None:
+        with self.lock:
+            self.stats.busy += busy
+            if busy > 0:
+                self.stats.processed += 1
+            self.stats.queued = self.queue.qsize()
+
+            metrics.set('pipeline_queue_items', self.stats.queued, stage=self.name)
+            metrics.set('pipeline_busy_workers', self.stats.busy, stage=self.name)
+
+
+class Pipeline:
+    """
+    Threaded crawler, which runs stages of crawl at once:
+    page fetch, link extraction, download ID resolution,
+    APK download and archive analysis. So APKs are downloaded
+    while pages are parsed, and fetching goes on while
+    archives are scanned.
+
+    Each stage has its own amount of worker threads
+    (`config.pipeline_workers`) and bounded input queue
+    (`config.pipeline_queue_size`). Full queue blocks
+    upstream stage, so memory is bounded by queue sizes
+    regardless of crawl size. Frontier is the only unbounded
+    queue, same as in Spider: extraction feeds it, and fetch
+    stage is fed from it, so pages never wait in a cycle.
+
+    Traverses the same graph as Spider does, retrying failed
+    Pages and Apps via RetryQueue. Yields analysed Apps in order
+    of completion. Page or App, which fails unexpectedly, is
+    logged and skipped. When consumer stops, or stage itself
+    fails, pipeline is stopped, and the error is raised to
+    consumer.
+
+    Usage:
+
+        with Pipeline(root_path='/') as pipeline:
+            for app in pipeline:
+                for file in app:
+                    ...
+
+        print(pipeline.stats)
+
+    @contextmanager
+    @iterator
+    """
+
+    def __init__(self,
+                 root_path: str = '/',
+                 max_depth: int = None,
+                 apps_to_fetch: int = None,
+                 workers: tp.Dict[str, int] = None,
+                 queue_size: int = None,
+                 scheduler: Scheduler = None,
+                 retries: RetryQueue = None,
+                 app_retries: RetryQueue = None,
+                 seen_index: SeenIndex = None,
+                 logger: Logger = None):
+        self.max_depth: int = max_depth if max_depth is not None else config.max_depth
+        self.apps_to_fetch: int = apps_to_fetch if apps_to_fetch is not None else config.apps_to_fetch
+        self.queue_size: int = queue_size or config.pipeline_queue_size
+
+        workers = {**config.pipeline_workers, **(workers or {})}
+        assert set(workers) == set(STAGES), 'workers should be set for stages %s' % ', '.join(STAGES)
+
+        # Empty scheduler and queues are falsy
+        self.frontier: Scheduler = scheduler if scheduler is not None else make_scheduler()
+        self.retries: RetryQueue[Page] = retries if retries is not None else RetryQueue()
+        self.app_retries: RetryQueue[App] = app_retries if app_retries is not None else RetryQueue()
+        self.visited_pages: tp.Set[str] = make_visited_set()
+        self.visited_apps: tp.Set[str] = make_visited_set()
+        self.seen_index: tp.Optional[SeenIndex] = seen_index or get_seen_index()
+
+        # Pages and Apps, taken from frontier or retries, which
+        # are not done yet: until they are, crawling isn't over
+        self.pages_in_flight: int = 0
+        self.apps_in_flight: int = 0
+
+        # Guards frontier, retries, visited sets and in-flight counters,
+        # notified each time any of them changes
+        self.condition = threading.Condition()
+        self.stop = threading.Event()
+        self.error: tp.Optional[BaseException] = None
+
+        handlers: tp.Dict[str, Handler] = {
+            'fetch': self._fetch_page,
+            'extract': self._extract_links,
+            'resolve': self._resolve_download_id,
+            'download': self._download_file,
+            'analyse': self._analyse_archive,
+        }
+        self.stages: tp.Dict[str, Stage] = {
+            name: Stage(name, handlers[name], workers[name], self.queue_size, self.stop, on_error=self._fail)
+            for name in STAGES
+        }
+        self.output: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self.feeder: tp.Optional[threading.Thread] = None
+
+        self.logger = logger
+        if not self.logger:
+            self.logger = logging.getLogger('pipeline')
+            self.logger.setLevel(logging.DEBUG)
+
+        root_page: Page = Page(path=root_path)
+        self.visited_pages.add(root_path)
+        self.frontier.push(root_page)
+
+    def __enter__(self) -> 'Pipeline':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __iter__(self) -> tp.Generator[App, None, None]:
+        """
+        Starts stages and yields analysed App instances,
+        until crawling is over or `apps_to_fetch` are yielded.
+        """
+        self._start()
+
+        apps_yielded = 0
+        try:
+            while apps_yielded < self.apps_to_fetch:
+                app = _get(self.output, self.stop)
+                if app is _END or app is None:
+                    break
+
+                metrics.set('pipeline_queue_items', self.output.qsize(), stage='output')
+                self._app_done()
+
+                apps_yielded += 1
+                yield app
+        finally:
+            self.close()
+
+        if self.error is not None:
+            raise self.error
+
+    @property
+    def stats(self) -> tp.Dict[str, StageStats]:
+        for stage in self.stages.values():
+            stage.stats.queued = stage.queue.qsize()
+        return {name: stage.stats for name, stage in self.stages.items()}
+
+    def close(self) -> None:
+        """
+        Stops all stages and waits for their workers.
+        """
+        self.stop.set()
+        with self.condition:
+            self.condition.notify_all()
+
+        if self.feeder is not None:
+            self.feeder.join()
+            self.feeder = None
+        for stage in self.stages.values():
+            stage.join()
+
+        # Scratch files of downloaded, but not consumed apps are removed
+        for source in [stage.queue for stage in self.stages.values()] + [self.output]:
+            while not source.empty():
+                item = source.get_nowait()
+                if isinstance(item, App):
+                    item.close()
+
+    def _start(self) -> None:
+        stages = [self.stages[name] for name in STAGES]
+        for stage, next_stage in zip(stages, stages[1:]):
+            stage.start(next_stage.queue, ends=next_stage.workers)
+        stages[-1].start(self.output)
+
+        self.feeder = threading.Thread(target=self._feed, name='feeder', daemon=True)
+        self.feeder.start()
+
+    def _feed(self) -> None:
+        """
+        Feeds fetch stage from frontier and retries, and puts
+        due retried Apps back to resolve stage. When nothing is
+        left to crawl and nothing is in flight, ends the stages.
+        """
+        while not self.stop.is_set():
+            with self.condition:
+                app: tp.Optional[App] = self.app_retries.pop_due()
+                page: tp.Optional[Page] = None
+                if app is None:
+                    page = self.retries.pop_due()
+                    if page is None and self.frontier:
+                        page = self.frontier.pop()
+
+                if app is not None:
+                    self.apps_in_flight += 1
+                elif page is not None:
+                    self.pages_in_flight += 1
+                elif self._is_over():
+                    break
+                else:
+                    # Wait for in-flight items or the earliest retry
+                    delays = [queue.next_due_in() for queue in (self.retries, self.app_retries) if queue]
+                    self.condition.wait(min(delays, default=None))
+                    continue
+
+            if app is not None:
+                self.stages['resolve'].put(app)
+            else:
+                self.logger.debug('Crawling page: %s' % page.path)
+                self.stages['fetch'].put(page)
+
+        self.stages['fetch'].finish()
+
+    def _is_over(self) -> bool:
+        return not (self.frontier or self.retries or self.app_retries or
+                    self.pages_in_flight or self.apps_in_flight)
+
+    def _fetch_page(self, page: Page) -> tp.Iterable[Page]:
+        try:
+            page.fetch_body()
+        except RETRY_ERRORS as exc:
+            # Retry page after delay if policy of error allowes
+            with self.condition:
+                self.retries.schedule(page, exc)
+                self._page_done()
+            return ()
+        except Exception:
+            self._drop_page(page)
+            return ()
+
+        return (page,)
+
+    def _extract_links(self, page: Page) -> tp.Iterable[App]:
+        try:
+            page.extract_links()
+
+            # In incremental mode only new apps are fetched, and
+            # listing of already seen apps is not descended
+            if self.seen_index and not self.seen_index.filter_page(page):
+                page.page_links = set()
+        except Exception:
+            self._drop_page(page)
+            return ()
+
+        apps: tp.List[App] = []
+        with self.condition:
+            # Do not append child to queue pages
+            # deeper than max recursion depth
+            for child in page.children():
+                if child.path not in self.visited_pages and \
+                        child.recursion_level <= self.max_depth:
+                    self.visited_pages.add(child.path)
+                    self.frontier.push(child, parent=page)
+
+            for app_path in page.app_links:
+                if app_path not in self.visited_apps:
+                    self.visited_apps.add(app_path)
+                    apps.append(App(path=app_path))
+
+            # Apps are in flight before page is done,
+            # so crawling isn't over in between
+            self.apps_in_flight += len(apps)
+            self._page_done()
+
+        return apps
+
+    def _resolve_download_id(self, app: App) -> tp.Iterable[App]:
+        try:
+            app.fetch_download_id()
+        except RETRY_ERRORS as exc:
+            self._retry_app(app, exc)
+            return ()
+        except Exception:
+            self._drop_app(app)
+            return ()
+
+        if self.seen_index and self.seen_index.skip_known_download(app):
+            self.logger.info('Skipping known release %s' % app.path)
+            self._app_done()
+            return ()
+
+        return (app,)
+
+    def _download_file(self, app: App) -> tp.Iterable[App]:
+        try:
+            if config.metadata_only:
+                app.fetch_metadata()
+            else:
+                app.download_file()
+        except RETRY_ERRORS as exc:
+            self._retry_app(app, exc)
+            return ()
+        except Exception:
+            self._drop_app(app)
+            return ()
+
+        return (app,)
+
+    def _analyse_archive(self, app: App) -> tp.Iterable[App]:
+        try:
+            app.batch()
+        except BadZipFile as exc:
+            self.logger.error('Cant analyse APK for app %s: %s' % (app.path, exc))
+            self._app_done()
+            return ()
+        except Exception:
+            self._drop_app(app)
+            return ()
+
+        return (app,)
+
+    def _retry_app(self, app: App, exc: BaseException) -> None:
+        with self.condition:
+            if self.app_retries.schedule(app, exc):
+                app.logger.warning('Cant download app %s. Retrying later.' % app.path)
+            else:
+                app.logger.error('Cant download app %s. Skipping.' % app.path)
+            self._app_done()
+
+    def _drop_page(self, page: Page) -> None:
+        """
+        Skips page, which failed unexpectedly. Failure of single
+        item doesn't stop pipeline, `_fail` is left for failures
+        of pipeline itself.
+        """
+        self.logger.exception('Cant crawl page %s. Skipping.' % page.path)
+        self._page_done()
+
+    def _drop_app(self, app: App) -> None:
+        """
+        Skips app, which failed unexpectedly, and
+        removes its scratch file, if any.
+        """
+        self.logger.exception('Cant process app %s. Skipping.' % app.path)
+        app.close()
+        self._app_done()
+
+    def _page_done(self) -> None:
+        with self.condition:
+            self.pages_in_flight -= 1
+            self.condition.notify_all()
+
+            metrics.set('frontier_pages', len(self.frontier))
+            metrics.set('retry_pages', len(self.retries))
+
+    def _app_done(self) -> None:
+        with self.condition:
+            self.apps_in_flight -= 1
+            self.condition.notify_all()
+
+            metrics.set('retry_apps', len(self.app_retries))
+
+    def _fail(self, error: BaseException) -> None:
+        self.logger.error('Pipeline stage failed', exc_info=error)
+        if self.error is None:
+            self.error = error
+        self.stop.set()
+
+        # Wake up feeder
+        with self.condition:
+            self.condition.notify_all()
+
+
+def _put(target: queue.Queue, item: tp.Any, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=POLL_INTERVAL)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(source: queue.Queue, stop: threading.Event) -> tp.Any:
+    """
+    Returns None, if pipeline is stopped while waiting.
+    """
+    while not stop.is_set():
+        try:
+            return source.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            continue
+    return None
@@ -5,6 +5,10 @@ from random import choice
 import requests
 from user_agent import generate_user_agent
 
+from crawler.metrics import metrics
+from crawler.proxy_manager import ProxyManager, get_proxy_manager
+from crawler.session_pool import SessionPool, session_pool
+
 BASE_REQUEST_HEADERS = {
     'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
     'Host': 'www.apkmirror.com',
@@ -31,12 +35,22 @@ def _get_request_headers() -> dict:
 
 
 @contextmanager
-def ProxiedSession(proxies: tp.List[str]) -> tp.Generator[requests.Session, None, None]:
+def ProxiedSession(proxies: tp.List[str],
+                   pool: SessionPool = None,
+                   manager: ProxyManager = None) -> tp.Generator[requests.Session, None, None]:
     """
     Session scoped HTTP client, which routes each request
     via random proxy from provided proxies list.
     For each request a new User agent is generated.
 
+    Underlying requests.Session is taken from SessionPool
+    and returned back on exit, so keep-alive connections
+    to the proxy are reused between calls.
+
+    If ProxyManager is provided (or `config.proxy_scoring` is on),
+    proxy is chosen by its health score instead of randomly,
+    and latency, status codes and errors are reported back to it.
+
     Usage:
 
         with ProxiedSession(
@@ -48,13 +62,33 @@ def ProxiedSession(proxies: tp.List[str]) -> tp.Generator[requests.Session, None
     """
     assert proxies, 'should instantiate HTTP client with at least one proxy'
 
+    if pool is None:
+        pool = session_pool
+    if manager is None:
+        manager = get_proxy_manager(proxies)
+
     request_headers = _get_request_headers()
-    request_proxy = choice(proxies)
-    with requests.Session() as session:
-        session.headers = request_headers
-        session.proxies = {
-            'http': request_proxy,
-            'https': request_proxy,
-        }
+    request_proxy = manager.choose() if manager else choice(proxies)
+
+    session = pool.acquire(request_proxy)
+    session.headers = request_headers
+    session.proxies = {
+        'http': request_proxy,
+        'https': request_proxy,
+    }
+
+    def report_response(response: requests.Response, *args, **kwargs) -> None:
+        manager.record_response(request_proxy, response.elapsed.total_seconds(), response.status_code)
+
+    session.hooks['response'] = [report_response] if manager else []
 
+    try:
         yield session
+    except requests.RequestException:
+        metrics.inc('proxy_errors_total', proxy=request_proxy)
+        if manager:
+            manager.record_failure(request_proxy)
+        raise
+    finally:
+        session.hooks['response'] = []
+        pool.release(request_proxy, session)
@@ -0,0 +1,210 @@
+import random
+import threading
+import typing as tp
+from dataclasses import dataclass, asdict
+from enum import Enum
+from time import monotonic
+
+from crawler.config import config
+from crawler.metrics import MetricsRegistry, metrics
+
+# Responses, which mean proxy is banned or throttled by CloudFlare
+BLOCKED_STATUS_CODES = (403, 429, 503)
+
+
+class CircuitState(Enum):
+    # Proxy gets traffic according to its score
+    CLOSED = 10
+    # Proxy is considered dead until `retry_at`
+    OPEN = 20
+    # Single probe request is allowed to check if proxy is back
+    HALF_OPEN = 30
+
+
+@dataclass
+class ProxyStats:
+    proxy: str
+    requests: int = 0
+    errors: int = 0
+    blocks: int = 0
+
+    # Exponentially weighted moving averages
+    latency: float = 1.0
+    error_rate: float = 0.0
+
+    state: CircuitState = CircuitState.CLOSED
+    consecutive_failures: int = 0
+    opens_count: int = 0
+    retry_at: float = 0.0
+    probing: bool = False
+    probe_started: float = 0.0
+
+    @property
+    def score(self) -> float:
+        # Failing proxies lose traffic faster than slow ones
+        return (1 - self.error_rate) ** 2 / max(self.latency, 0.01)
+
+
+class ProxyManager:
+    """
+    Routes requests between proxies by health score.
+
+    Each proxy is scored by moving averages of response latency and
+    failure rate, where failures are network errors and 403 / 429 / 503
+    responses. Proxy is chosen randomly with probability proportional
+    to its score.
+
+    After `failure_threshold` consecutive failures, circuit of proxy
+    opens and proxy gets no traffic. After backoff, which doubles on
+    each subsequent opening up to `max_backoff` seconds, single probe
+    request is routed via proxy. Successful probe closes circuit.
+    Probe, which result isn't reported in `probe_timeout` seconds
+    (e.g. its request was cancelled), counts as failed one.
+
+    Usage:
+
+        manager = ProxyManager(proxies=config.proxies)
+
+        proxy = manager.choose()
+        try:
+            response = ...
+        except requests.RequestException:
+            manager.record_failure(proxy)
+        else:
+            manager.record_response(proxy, latency, response.status_code)
+
+    Thread safe.
+    """
+
+    def __init__(self,
+                 proxies: tp.List[str],
+                 failure_threshold: int = None,
+                 base_backoff: float = None,
+                 max_backoff: float = None,
+                 probe_timeout: float = None,
+                 smoothing: float = 0.2):
+        assert proxies, 'should have at least one proxy'
+
+        self.failure_threshold: int = failure_threshold or config.proxy_failure_threshold
+        self.base_backoff: float = base_backoff or config.proxy_base_backoff
+        self.max_backoff: float = max_backoff or config.proxy_max_backoff
+        self.probe_timeout: float = probe_timeout or config.proxy_probe_timeout
+        self.smoothing: float = smoothing
+
+        self.stats: tp.Dict[str, ProxyStats] = {proxy: ProxyStats(proxy=proxy) for proxy in proxies}
+        self.lock = threading.Lock()
+
+    def choose(self) -> str:
+        with self.lock:
+            now = monotonic()
+
+            for stats in self.stats.values():
+                if stats.state == CircuitState.OPEN and stats.retry_at <= now:
+                    stats.state = CircuitState.HALF_OPEN
+                    stats.probing = False
+                elif stats.state == CircuitState.HALF_OPEN and stats.probing and \
+                        now - stats.probe_started >= self.probe_timeout:
+                    # Result of probe is lost
+                    self._open(stats)
+
+            # Probe recovered proxies first, one request at a time
+            for stats in self.stats.values():
+                if stats.state == CircuitState.HALF_OPEN and not stats.probing:
+                    stats.probing = True
+                    stats.probe_started = now
+                    return stats.proxy
+
+            available = [stats for stats in self.stats.values() if stats.state == CircuitState.CLOSED]
+            if not available:
+                # All proxies are down, use the one recovering first
+                return min(self.stats.values(), key=lambda stats: stats.retry_at).proxy
+
+            weights = [stats.score for stats in available]
+            return random.choices(available, weights=weights)[0].proxy
+
+    def record_response(self, proxy: str, latency: float, status_code: int) -> None:
+        if status_code in BLOCKED_STATUS_CODES:
+            self.record_failure(proxy, blocked=True)
+            return
+
+        with self.lock:
+            stats = self.stats[proxy]
+            stats.requests += 1
+            stats.latency += self.smoothing * (latency - stats.latency)
+            stats.error_rate -= self.smoothing * stats.error_rate
+
+            stats.consecutive_failures = 0
+            if stats.state != CircuitState.CLOSED:
+                stats.state = CircuitState.CLOSED
+                stats.opens_count = 0
+                stats.probing = False
+
+    def record_failure(self, proxy: str, blocked: bool = False) -> None:
+        with self.lock:
+            stats = self.stats[proxy]
+            stats.requests += 1
+            if blocked:
+                stats.blocks += 1
+            else:
+                stats.errors += 1
+            stats.error_rate += self.smoothing * (1 - stats.error_rate)
+            stats.consecutive_failures += 1
+
+            if stats.state == CircuitState.HALF_OPEN or \
+                    stats.consecutive_failures >= self.failure_threshold:
+                self._open(stats)
+
+    def export(self) -> tp.List[tp.Dict[str, tp.Any]]:
+        """
+        Returns stats of all proxies as plain dicts.
+        """
+        with self.lock:
+            exported = []
+            for stats in self.stats.values():
+                row = asdict(stats)
+                row['state'] = stats.state.name
+                row['score'] = stats.score
+                exported.append(row)
+            return exported
+
+    def _open(self, stats: ProxyStats) -> None:
+        stats.opens_count += 1
+        backoff = min(self.base_backoff * 2 ** (stats.opens_count - 1), self.max_backoff)
+
+        # Jitter prevents all dead proxies from being probed at once
+        stats.retry_at = monotonic() + backoff * random.uniform(0.8, 1.2)
+        stats.state = CircuitState.OPEN
+        stats.probing = False
+
+
+_proxy_managers: tp.Dict[tp.Tuple[str, ...], ProxyManager] = {}
+_proxy_managers_lock = threading.Lock()
+
+
+def get_proxy_manager(proxies: tp.List[str]) -> tp.Optional[ProxyManager]:
+    """
+    Returns shared ProxyManager for proxies list,
+    if `config.proxy_scoring` is enabled.
+    """
+    if not config.proxy_scoring:
+        return None
+
+    key = tuple(proxies)
+    with _proxy_managers_lock:
+        if key not in _proxy_managers:
+            _proxy_managers[key] = ProxyManager(proxies=proxies)
+        return _proxy_managers[key]
+
+
+def _collect_metrics(registry: MetricsRegistry) -> None:
+    with _proxy_managers_lock:
+        managers = list(_proxy_managers.values())
+
+    for manager in managers:
+        for row in manager.export():
+            for name in ('requests', 'errors', 'blocks', 'latency', 'error_rate', 'score'):
+                registry.set('proxy_' + name, row[name], proxy=row['proxy'])
+            registry.set('proxy_circuit_open', int(row['state'] != CircuitState.CLOSED.name), proxy=row['proxy'])
+
+
+metrics.register_collector(_collect_metrics)
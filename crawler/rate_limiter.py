@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import typing as tp
+from dataclasses import dataclass
+from time import monotonic, sleep
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import select_proxy
+
+from crawler.config import config
+from crawler.metrics import metrics
+
+# Responses, which mean we are going too fast
+THROTTLED_STATUS_CODES = (429, 503)
+
+# Budget is never reduced below this share of configured rate
+MIN_RATE_RATIO = 0.1
+
+# Longer Retry-After pauses (seconds) are cut to this
+MAX_RETRY_AFTER = 10 * 60
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average
+    and bursts of up to `burst` requests at once.
+
+    Tokens may go negative: each reservation takes a token
+    immediately and gets delay, after which it is covered,
+    so concurrent callers are spread in time.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.base_rate: float = rate
+        self.rate: float = rate
+        self.burst: int = burst
+
+        self.tokens: float = float(burst)
+        self.updated_at: float = monotonic()
+
+    def reserve(self, now: float) -> float:
+        self._refill(now)
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def slow_down(self, factor: float, now: float, pause: float = 0.0) -> None:
+        self._refill(now)
+        self.rate = max(self.rate * factor, self.base_rate * MIN_RATE_RATIO)
+
+        # No bursts right after throttling, and Retry-After
+        # pause is enforced as a debt of tokens
+        self.tokens = min(self.tokens, 0.0) - pause * self.rate
+
+    def recover(self, step: float, now: float) -> None:
+        if self.rate < self.base_rate:
+            self._refill(now)
+            self.rate = min(self.rate + self.base_rate * step, self.base_rate)
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.tokens + (now - self.updated_at) * self.rate, self.burst)
+        self.updated_at = now
+
+
+@dataclass
+class RateLimiterStats:
+    # Requests, passed through limiter
+    acquired: int = 0
+    # Requests, which had to wait
+    delayed: int = 0
+    # Total time (seconds) requests waited
+    total_delay: float = 0.0
+    # 429 / 503 responses, which reduced budgets
+    slowdowns: int = 0
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter with separate budgets
+    per target host and per proxy.
+
+    Request waits until both host and proxy buckets have a token.
+    On 429 / 503 response, rates of both buckets are multiplied by
+    `slowdown` and Retry-After is honored. Each successful response
+    recovers rates by `recovery` share of configured rate.
+
+    Usage:
+
+        limiter = RateLimiter(host_rate=2, host_burst=5, proxy_rate=0.5, proxy_burst=2)
+
+        limiter.acquire('www.apkmirror.com', proxy)
+        response = ...
+        limiter.record_response('www.apkmirror.com', proxy, response.status_code)
+
+    Thread safe.
+    """
+
+    def __init__(self,
+                 host_rate: float = None,
+                 host_burst: int = None,
+                 proxy_rate: float = None,
+                 proxy_burst: int = None,
+                 slowdown: float = None,
+                 recovery: float = None):
+        self.host_rate: float = host_rate or config.host_rate
+        self.host_burst: int = host_burst or config.host_burst
+        self.proxy_rate: float = proxy_rate or config.proxy_rate
+        self.proxy_burst: int = proxy_burst or config.proxy_burst
+        self.slowdown: float = slowdown or config.rate_limit_slowdown
+        self.recovery: float = recovery if recovery is not None else config.rate_limit_recovery
+
+        self.hosts: tp.Dict[str, TokenBucket] = {}
+        self.proxies: tp.Dict[str, TokenBucket] = {}
+        self.stats: RateLimiterStats = RateLimiterStats()
+        self.lock = threading.Lock()
+
+    def reserve(self, host: str, proxy: str = None) -> float:
+        """
+        Takes tokens for request and returns
+        delay (seconds) to wait before sending it.
+        """
+        with self.lock:
+            now = monotonic()
+            delay = max(bucket.reserve(now) for bucket in self._buckets(host, proxy))
+
+            self.stats.acquired += 1
+            if delay > 0:
+                self.stats.delayed += 1
+                self.stats.total_delay += delay
+        return delay
+
+    def acquire(self, host: str, proxy: str = None) -> None:
+        delay = self.reserve(host, proxy)
+        if delay > 0:
+            sleep(delay)
+
+    async def acquire_async(self, host: str, proxy: str = None) -> None:
+        delay = self.reserve(host, proxy)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def record_response(self, host: str, proxy: tp.Optional[str], status_code: int,
+                        retry_after: float = None) -> None:
+        with self.lock:
+            now = monotonic()
+            buckets = self._buckets(host, proxy)
+
+            if status_code in THROTTLED_STATUS_CODES:
+                self.stats.slowdowns += 1
+                for bucket in buckets:
+                    bucket.slow_down(self.slowdown, now, pause=retry_after or 0.0)
+            else:
+                for bucket in buckets:
+                    bucket.recover(self.recovery, now)
+
+    def _buckets(self, host: str, proxy: tp.Optional[str]) -> tp.List[TokenBucket]:
+        if host not in self.hosts:
+            self.hosts[host] = TokenBucket(self.host_rate, self.host_burst)
+        buckets = [self.hosts[host]]
+
+        if proxy:
+            if proxy not in self.proxies:
+                self.proxies[proxy] = TokenBucket(self.proxy_rate, self.proxy_burst)
+            buckets.append(self.proxies[proxy])
+        return buckets
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """
+    requests transport adapter, which waits for RateLimiter
+    before each request (redirects included) and reports
+    response status back to it.
+
+    Usage:
+
+        session.mount('http://', RateLimitedAdapter(limiter))
+    """
+
+    def __init__(self, limiter: RateLimiter, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter: RateLimiter = limiter
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        host = urlsplit(request.url).hostname
+        proxy = select_proxy(request.url, kwargs.get('proxies') or {})
+
+        self.limiter.acquire(host, proxy)
+        response = super().send(request, **kwargs)
+        self.limiter.record_response(host, proxy, response.status_code,
+                                     parse_retry_after(response.headers.get('Retry-After')))
+        return response
+
+
+def make_trace_config(limiter: RateLimiter) -> aiohttp.TraceConfig:
+    """
+    Returns aiohttp tracing hooks, which apply RateLimiter to
+    requests of ClientSession. Proxy of request is expected
+    in `trace_request_ctx.proxy`.
+    """
+
+    async def on_request_start(session, context, params) -> None:
+        await limiter.acquire_async(params.url.host, _get_traced_proxy(context))
+
+    async def on_request_end(session, context, params) -> None:
+        limiter.record_response(params.url.host, _get_traced_proxy(context), params.response.status,
+                                parse_retry_after(params.response.headers.get('Retry-After')))
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_redirect.append(on_request_end)
+    return trace_config
+
+
+def _get_traced_proxy(context: SimpleNamespace) -> tp.Optional[str]:
+    return getattr(context.trace_request_ctx, 'proxy', None)
+
+
+def parse_retry_after(value: tp.Optional[str]) -> tp.Optional[float]:
+    """
+    Only delay-seconds form is supported, HTTP-date is ignored.
+    """
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    # NaN fails comparison as well
+    if not seconds >= 0:
+        return None
+    return min(seconds, MAX_RETRY_AFTER)
+
+
+_rate_limiter: tp.Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> tp.Optional[RateLimiter]:
+    """
+    Returns shared RateLimiter, if `config.rate_limiting` is enabled.
+    """
+    global _rate_limiter
+
+    if not config.rate_limiting:
+        return None
+
+    if _rate_limiter is None:
+        _rate_limiter = RateLimiter()
+    return _rate_limiter
+
+
+metrics.register_stats('rate_limiter', lambda: _rate_limiter and _rate_limiter.stats)
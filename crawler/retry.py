@@ -0,0 +1,172 @@
+import asyncio
+import heapq
+import random
+import typing as tp
+from dataclasses import dataclass, field
+from time import monotonic
+from zipfile import BadZipFile
+
+import requests
+
+from crawler.config import config
+from crawler.errors import DownloadError, FileTooLargeError
+
+# Errors, after which Page or App is retried
+RETRY_ERRORS = (DownloadError, requests.RequestException)
+
+# Errors, which retry can't fix, so task is skipped right away
+FATAL_ERRORS = (FileTooLargeError, BadZipFile)
+
+# Responses, which mean proxy is banned or throttled
+BLOCKED_STATUS_CODES = (403, 429)
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int
+    base_delay: float
+    max_delay: float
+    jitter: float = 0.5
+
+    def get_delay(self, attempt: int) -> float:
+        """
+        Returns delay (seconds) before `attempt`, starting from 1.
+        """
+        delay = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+@dataclass
+class RetryStats:
+    # Retries scheduled, per error class
+    scheduled: tp.Dict[str, int] = field(default_factory=dict)
+    # Tasks dropped after max retries, per error class
+    given_up: tp.Dict[str, int] = field(default_factory=dict)
+
+
+# Policy of fatal errors
+NO_RETRIES = RetryPolicy(max_retries=0, base_delay=0, max_delay=0)
+
+# Page or App, anything with `retries_count`
+T = tp.TypeVar('T')
+
+
+def classify_error(error: BaseException) -> str:
+    """
+    Returns retry policy name for error.
+    """
+    if isinstance(error, FATAL_ERRORS):
+        return 'fatal'
+
+    if isinstance(error, (requests.Timeout, asyncio.TimeoutError)):
+        return 'timeout'
+
+    status_code = getattr(error, 'status_code', None)
+    if status_code in BLOCKED_STATUS_CODES:
+        return 'blocked'
+    if status_code is not None and status_code >= 500:
+        return 'server'
+    return 'error'
+
+
+def get_retry_policies() -> tp.Dict[str, RetryPolicy]:
+    """
+    Builds policies from `config.retry_policies`.
+    """
+    return {
+        name: RetryPolicy(max_retries=int(spec.get('max_retries', config.max_retries_count)),
+                          base_delay=spec['base_delay'],
+                          max_delay=spec['max_delay'],
+                          jitter=config.retry_jitter)
+        for name, spec in config.retry_policies.items()
+    }
+
+
+def get_policy(policies: tp.Dict[str, RetryPolicy], name: str) -> RetryPolicy:
+    """
+    Returns policy by name, given by `classify_error`.
+    """
+    if name == 'fatal':
+        return NO_RETRIES
+    return policies.get(name) or policies['error']
+
+
+class RetryQueue(tp.Generic[T]):
+    """
+    Delayed retries of failed Pages or Apps.
+
+    Failed task is scheduled with delay, given by policy of its
+    error class, and its `retries_count` is increased. After max
+    retries of the policy, task is dropped. Tasks become available
+    from `pop_due` only after their delay, so crawler keeps processing
+    fresh work in between instead of hammering throttled host.
+
+    Usage:
+
+        retries = RetryQueue()
+
+        try:
+            page.fetch_body()
+        except DownloadError as exc:
+            retries.schedule(page, exc)
+
+        page = retries.pop_due()
+    """
+
+    def __init__(self, policies: tp.Dict[str, RetryPolicy] = None):
+        self.policies: tp.Dict[str, RetryPolicy] = policies if policies is not None else get_retry_policies()
+        self.heap: tp.List[tp.Tuple[float, int, T]] = []
+        self.counter: int = 0
+        self.stats: RetryStats = RetryStats()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def schedule(self, task: T, error: BaseException) -> bool:
+        """
+        Returns False, if task should not be retried anymore.
+        """
+        delay = self.backoff(task, error)
+        if delay is None:
+            return False
+
+        # Counter keeps tasks with equal due time in order
+        self.counter += 1
+        heapq.heappush(self.heap, (monotonic() + delay, self.counter, task))
+        return True
+
+    def backoff(self, task: T, error: BaseException) -> tp.Optional[float]:
+        """
+        Counts retry of task without queueing it, for crawlers,
+        which wait for retries themselves (e.g. async ones).
+
+        :return: delay before retry, or None, if task
+        should not be retried anymore.
+        """
+        name = classify_error(error)
+        policy = get_policy(self.policies, name)
+
+        if task.retries_count >= policy.max_retries:
+            self.stats.given_up[name] = self.stats.given_up.get(name, 0) + 1
+            return None
+
+        task.retries_count += 1
+        self.stats.scheduled[name] = self.stats.scheduled.get(name, 0) + 1
+        return policy.get_delay(task.retries_count)
+
+    def pop_due(self) -> tp.Optional[T]:
+        """
+        Returns task, which delay is over, if there is any.
+        """
+        if self.heap and self.heap[0][0] <= monotonic():
+            _, _, task = heapq.heappop(self.heap)
+            return task
+        return None
+
+    def next_due_in(self) -> float:
+        """
+        Returns seconds until the earliest task is due.
+        """
+        if not self.heap:
+            return 0.0
+        return max(self.heap[0][0] - monotonic(), 0.0)
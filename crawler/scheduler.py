@@ -0,0 +1,154 @@
+import heapq
+import typing as tp
+
+from crawler.config import config
+from crawler.page import Page
+
+# Priority of pages, re-scheduled after download error:
+# they go after all other pages
+DEFERRED = float('inf')
+
+# (priority, position) of page in frontier
+FrontierKey = tp.Tuple[float, int]
+
+
+class Scheduler:
+    """
+    Heap-based frontier of Spider.
+
+    Pages are popped in order of priority (lower first), given
+    by `priority` method of subclass. Pages with equal priority are
+    popped newest first, if scheduler is `lifo`, or oldest first.
+    Deferred pages are popped after all others, oldest first.
+
+    Each page gets (priority, position) key, which is persisted
+    by FrontierStore, so order survives restart.
+
+    Usage:
+
+        scheduler = BestFirstScheduler()
+        scheduler.push(root_page)
+
+        while scheduler:
+            page = scheduler.pop()
+            ...
+            for child in page.children():
+                scheduler.push(child, parent=page)
+    """
+
+    # Pages with equal priority are popped newest first
+    lifo: bool = True
+
+    def __init__(self):
+        self.heap: tp.List[tp.Tuple[float, int, Page]] = []
+
+        # Positions of newest LIFO and FIFO pages
+        self.top: int = 0
+        self.bottom: int = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def push(self, page: Page, parent: Page = None) -> FrontierKey:
+        if self.lifo:
+            self.top -= 1
+            position = self.top
+        else:
+            self.bottom += 1
+            position = self.bottom
+
+        return self.restore(page, self.priority(page, parent), position)
+
+    def defer(self, page: Page) -> FrontierKey:
+        return self.restore(page, *self.defer_key())
+
+    def defer_key(self) -> FrontierKey:
+        """
+        Returns key of a new deferred page.
+        """
+        self.bottom += 1
+        return DEFERRED, self.bottom
+
+    def restore(self, page: Page, priority: float, position: int) -> FrontierKey:
+        """
+        Pushes page with known key, e.g. loaded from FrontierStore.
+        """
+        self.top = min(self.top, position)
+        self.bottom = max(self.bottom, position)
+
+        # Positions are unique, so pages are never compared
+        heapq.heappush(self.heap, (priority, position, page))
+        return priority, position
+
+    def pop(self) -> Page:
+        _, _, page = heapq.heappop(self.heap)
+        return page
+
+    def priority(self, page: Page, parent: tp.Optional[Page]) -> float:
+        return 0.0
+
+
+class DepthFirstScheduler(Scheduler):
+    """
+    Newest pages first, same as original Spider stack.
+    """
+
+
+class BreadthFirstScheduler(Scheduler):
+    """
+    Shallow pages first, then oldest ones.
+    """
+
+    lifo = False
+
+    def priority(self, page: Page, parent: tp.Optional[Page]) -> float:
+        return page.recursion_level
+
+
+class BestFirstScheduler(Scheduler):
+    """
+    Most promising pages first. Page score is weight of the longest
+    matching prefix from `url_weights`, plus `app_links_weight` per
+    app link found on parent page, minus `depth_penalty` per
+    recursion level. Ties are broken newest first, as in DFS.
+    """
+
+    def __init__(self,
+                 url_weights: tp.Dict[str, float] = None,
+                 app_links_weight: float = None,
+                 depth_penalty: float = None):
+        super().__init__()
+        self.url_weights: tp.Dict[str, float] = \
+            url_weights if url_weights is not None else config.frontier_url_weights
+        self.app_links_weight: float = \
+            app_links_weight if app_links_weight is not None else config.frontier_app_links_weight
+        self.depth_penalty: float = \
+            depth_penalty if depth_penalty is not None else config.frontier_depth_penalty
+
+    def priority(self, page: Page, parent: tp.Optional[Page]) -> float:
+        score = -self.depth_penalty * page.recursion_level
+
+        prefixes = [prefix for prefix in self.url_weights if page.path.startswith(prefix)]
+        if prefixes:
+            score += self.url_weights[max(prefixes, key=len)]
+
+        if parent is not None:
+            score += self.app_links_weight * len(parent.app_links)
+
+        # Heap pops lowest priority first
+        return -score
+
+
+SCHEDULERS: tp.Dict[str, tp.Callable[[], Scheduler]] = {
+    'dfs': DepthFirstScheduler,
+    'bfs': BreadthFirstScheduler,
+    'best': BestFirstScheduler,
+}
+
+
+def make_scheduler(kind: str = None) -> Scheduler:
+    """
+    Builds empty scheduler of given kind,
+    `config.frontier_strategy` by default.
+    """
+    return SCHEDULERS[kind or config.frontier_strategy]()
@@ -0,0 +1,102 @@
+import logging
+import os
+import socket
+import tempfile
+import typing as tp
+from tempfile import NamedTemporaryFile
+from time import time
+
+from crawler.config import config
+
+# Scratch files are named '<prefix><host>-<pid>-<random>.apk',
+# so files of dead processes can be told apart, even if
+# directory is shared by several hosts
+PREFIX = 'apkspider-'
+
+logger = logging.getLogger('scratch')
+
+
+def get_scratch_dir() -> str:
+    """
+    Returns `config.scratch_dir`, creating it if needed,
+    or system temp directory by default.
+    """
+    if not config.scratch_dir:
+        return tempfile.gettempdir()
+
+    os.makedirs(config.scratch_dir, exist_ok=True)
+    return config.scratch_dir
+
+
+def make_tempfile() -> tp.IO[bytes]:
+    """
+    Creates scratch file for downloaded APK, which is
+    removed as soon as it's closed or garbage collected.
+    """
+    return NamedTemporaryFile(dir=get_scratch_dir(), prefix=_get_prefix(), suffix='.apk')
+
+
+def sweep_scratch_dir(directory: str = None, max_age: float = None) -> int:
+    """
+    Removes scratch files of processes, which were killed before
+    they could close them. Only files of this host are checked by
+    PID, files of its running processes are kept. Files of any host,
+    not modified for `max_age` seconds, are removed too, as processes
+    of other hosts can't be checked and PIDs are reused.
+
+    :return: amount of removed files.
+    """
+    directory = directory or get_scratch_dir()
+    max_age = max_age if max_age is not None else config.scratch_max_age
+    local_prefix = '%s%s-' % (PREFIX, _get_hostname())
+    removed = 0
+
+    for name in os.listdir(directory):
+        if not name.startswith(PREFIX):
+            continue
+
+        path = os.path.join(directory, name)
+        try:
+            if not _is_dead_local(name, local_prefix) and time() - os.path.getmtime(path) < max_age:
+                continue
+
+            os.remove(path)
+            removed += 1
+        except OSError:
+            # Removed by another process meanwhile
+            ...
+
+    if removed:
+        logger.warning('Removed %s stale scratch files from %s' % (removed, directory))
+    return removed
+
+
+def _get_prefix() -> str:
+    return '%s%s-%s-' % (PREFIX, _get_hostname(), os.getpid())
+
+
+def _get_hostname() -> str:
+    # Dashes separate parts of file name
+    return socket.gethostname().replace('-', '_')
+
+
+def _is_dead_local(name: str, local_prefix: str) -> bool:
+    """
+    Returns True, if file belongs to dead process of this host.
+    """
+    if not name.startswith(local_prefix):
+        return False
+
+    pid = name[len(local_prefix):].split('-', 1)[0]
+    return pid.isdigit() and not _is_alive(int(pid))
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Process of other user
+        return True
+    return True
@@ -0,0 +1,165 @@
+import re
+import sqlite3
+import threading
+import typing as tp
+from dataclasses import dataclass
+from time import time
+
+from crawler.config import config
+from crawler.metrics import metrics
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS apps (
+    path TEXT PRIMARY KEY,
+    download_id INTEGER,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS apps_download_id ON apps (download_id);
+'''
+
+# SQLite limits amount of query parameters
+MAX_QUERY_PARAMS = 500
+
+
+@dataclass
+class SeenStats:
+    # App links, skipped as already seen
+    known_apps: int = 0
+    # App links, seen for the first time
+    new_apps: int = 0
+    # Listing pages, which children were not crawled
+    pruned_pages: int = 0
+    # New app paths, which resolved to known download_id
+    known_downloads: int = 0
+
+
+class SeenIndex:
+    """
+    Persistent index of app paths and download_ids, seen by
+    previous crawls. Allows incremental re-crawl: only new
+    app releases are fetched, and listing stops descending
+    at pages, which link to known apps only.
+
+    Usage:
+
+        index = SeenIndex('seen.sqlite3')
+
+        if index.filter_page(page):
+            ...  # crawl children of page
+
+        for app in page:
+            sink.write_batch(app.batch())
+            # Only after files are written, so app of
+            # crashed crawl is fetched again
+            index.remember(app.path, app.download_id)
+
+    Thread safe.
+    """
+
+    def __init__(self, path: str, listing_patterns: tp.List[str] = None):
+        self.path: str = path
+        self.listing_patterns: tp.List[tp.Pattern] = [
+            re.compile(pattern) for pattern in (listing_patterns or config.incremental_listing_patterns)]
+        self.stats: SeenStats = SeenStats()
+        self.lock = threading.Lock()
+
+        # Apps, seen by current crawl, don't prune listing
+        self.started_at: float = time()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+
+    def known_paths(self, paths: tp.Iterable[str]) -> tp.Dict[str, float]:
+        """
+        Returns time, each of known paths was seen at.
+        """
+        paths = list(paths)
+        known: tp.Dict[str, float] = {}
+
+        with self.lock:
+            for start in range(0, len(paths), MAX_QUERY_PARAMS):
+                chunk = paths[start:start + MAX_QUERY_PARAMS]
+                rows = self.connection.execute(
+                    'SELECT path, seen_at FROM apps WHERE path IN (%s)' % ', '.join('?' * len(chunk)), chunk)
+                known.update(rows)
+
+        return known
+
+    def is_known_download(self, download_id: int) -> bool:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT 1 FROM apps WHERE download_id = ? LIMIT 1', (download_id,)).fetchone()
+        return row is not None
+
+    def remember(self, path: str, download_id: int = None) -> None:
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO apps (path, download_id, seen_at) VALUES (?, ?, ?)',
+                (path, download_id, time()))
+
+    def filter_page(self, page) -> bool:
+        """
+        Drops already seen app links of page.
+
+        :return: False, if page is listing (`config.incremental_listing_patterns`),
+        which links only to apps, known by previous crawls, so its
+        children shouldn't be crawled.
+        """
+        if not page.app_links:
+            return True
+
+        known = self.known_paths(page.app_links)
+        with self.lock:
+            self.stats.known_apps += len(known)
+            self.stats.new_apps += len(page.app_links) - len(known)
+
+        seen_before = len(known) == len(page.app_links) and \
+            all(seen_at < self.started_at for seen_at in known.values())
+
+        page.app_links = {path for path in page.app_links if path not in known}
+        if not seen_before or not self.is_listing(page.path):
+            return True
+
+        with self.lock:
+            self.stats.pruned_pages += 1
+        return False
+
+    def skip_known_download(self, app) -> bool:
+        """
+        Remembers app and returns True, if its download_id is
+        already known, e.g. the same release under other path.
+        """
+        if app.download_id is None or not self.is_known_download(app.download_id):
+            return False
+
+        self.remember(app.path, app.download_id)
+        with self.lock:
+            self.stats.known_downloads += 1
+        return True
+
+    def is_listing(self, path: str) -> bool:
+        return any(pattern.match(path) for pattern in self.listing_patterns)
+
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+
+
+_seen_index: tp.Optional[SeenIndex] = None
+
+
+def get_seen_index() -> tp.Optional[SeenIndex]:
+    """
+    Returns shared SeenIndex, if `config.seen_index_path` is set.
+    """
+    global _seen_index
+
+    if not config.seen_index_path:
+        return None
+
+    if _seen_index is None or _seen_index.path != config.seen_index_path:
+        _seen_index = SeenIndex(config.seen_index_path)
+    return _seen_index
+
+
+metrics.register_stats('seen', lambda: _seen_index and _seen_index.stats)
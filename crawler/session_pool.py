@@ -0,0 +1,168 @@
+import threading
+import typing as tp
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from time import monotonic
+
+import requests
+
+from crawler.config import config
+from crawler.rate_limiter import RateLimitedAdapter, get_rate_limiter
+
+
+@dataclass
+class PoolStats:
+    # Sessions, created from scratch
+    created: int = 0
+    # Sessions, taken warm from pool
+    reused: int = 0
+    # Sessions, closed after staying idle too long
+    evicted: int = 0
+    # Sessions, closed on release because pool is full
+    discarded: int = 0
+
+
+@dataclass
+class ConnectionStats:
+    # TCP connections, opened by urllib3 pools
+    connections: int = 0
+    # HTTP requests, sent over these connections
+    requests: int = 0
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+
+class SessionPool:
+    """
+    Keeps warm requests.Session instances per proxy, so
+    keep-alive connections survive between ProxiedSession calls
+    instead of paying TCP (and TLS) handshake for each request.
+
+    Up to `pool_size` idle sessions are kept for each proxy.
+    Sessions, idle longer than `idle_timeout` seconds,
+    are closed on next acquire.
+
+    Usage:
+
+        pool = SessionPool(pool_size=4, idle_timeout=60)
+
+        session = pool.acquire('http://77.88.55.77:8081')
+        try:
+            session.get(...)
+        finally:
+            pool.release('http://77.88.55.77:8081', session)
+
+    Thread safe.
+    """
+
+    def __init__(self, pool_size: int = None, idle_timeout: float = None):
+        self.pool_size: int = pool_size if pool_size is not None else config.session_pool_size
+        self.idle_timeout: float = idle_timeout if idle_timeout is not None else config.session_idle_timeout
+
+        # Most recently released sessions are on the right
+        self.idle: tp.DefaultDict[str, tp.Deque[tp.Tuple[float, requests.Session]]] = \
+            defaultdict(deque)
+        self.stats: PoolStats = PoolStats()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(sessions) for sessions in self.idle.values())
+
+    def acquire(self, proxy: str) -> requests.Session:
+        """
+        Returns warm session for proxy, if there
+        is any, or creates a new one.
+        """
+        self.evict_idle()
+
+        with self.lock:
+            sessions = self.idle[proxy]
+            if sessions:
+                _, session = sessions.pop()
+                self.stats.reused += 1
+            else:
+                session = None
+                self.stats.created += 1
+
+        if session is None:
+            return self._create_session()
+
+        # Logical sessions should not share cookies
+        session.cookies.clear()
+        return session
+
+    def release(self, proxy: str, session: requests.Session) -> None:
+        with self.lock:
+            sessions = self.idle[proxy]
+            if len(sessions) < self.pool_size:
+                sessions.append((monotonic(), session))
+                return
+            self.stats.discarded += 1
+
+        session.close()
+
+    def evict_idle(self) -> None:
+        """
+        Closes sessions, which were not used for `idle_timeout` seconds.
+        """
+        deadline = monotonic() - self.idle_timeout
+        evicted: tp.List[requests.Session] = []
+
+        with self.lock:
+            for sessions in self.idle.values():
+                # Oldest sessions are on the left
+                while sessions and sessions[0][0] < deadline:
+                    _, session = sessions.popleft()
+                    evicted.append(session)
+            self.stats.evicted += len(evicted)
+
+        for session in evicted:
+            session.close()
+
+    def connection_stats(self) -> ConnectionStats:
+        """
+        Sums up connections and requests counters of urllib3
+        connection pools of idle sessions.
+        """
+        stats = ConnectionStats()
+
+        with self.lock:
+            sessions = [session for idle in self.idle.values() for _, session in idle]
+
+        for session in sessions:
+            for adapter in session.adapters.values():
+                managers = [adapter.poolmanager, *adapter.proxy_manager.values()]
+                for manager in managers:
+                    for key in manager.pools.keys():
+                        pool = manager.pools[key]
+                        stats.connections += pool.num_connections
+                        stats.requests += pool.num_requests
+
+        return stats
+
+    def close(self) -> None:
+        with self.lock:
+            sessions = [session for idle in self.idle.values() for _, session in idle]
+            self.idle.clear()
+
+        for session in sessions:
+            session.close()
+
+    @staticmethod
+    def _create_session() -> requests.Session:
+        session = requests.Session()
+
+        # Adapter throttles each request, including redirects
+        limiter = get_rate_limiter()
+        if limiter:
+            adapter = RateLimitedAdapter(limiter)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+        return session
+
+
+# Shared by all ProxiedSession calls by default
+session_pool = SessionPool()
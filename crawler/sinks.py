@@ -0,0 +1,301 @@
+import abc
+import csv
+import io
+import json
+import os
+import sqlite3
+import typing as tp
+from time import monotonic
+
+from crawler.config import config
+from crawler.metrics import metrics
+from crawler.structs import File, FileBatch
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+# Columns of output records
+FIELDS = ('archive_name', 'file_name', 'mime_type', 'size_deflated', 'size_compressed', 'crc', 'sha256')
+
+# When to fsync written data:
+# never, after each flushed batch or once on close
+FSYNC_NEVER = 'never'
+FSYNC_FLUSH = 'flush'
+FSYNC_CLOSE = 'close'
+
+
+class Sink(abc.ABC):
+    """
+    Buffered output of crawled files.
+
+    Records are kept in memory as tuples and written in a single
+    batch each `batch_size` records or at least every `flush_interval`
+    seconds. Whole FileBatch of archive is taken at once. Written
+    data is fsynced according to `fsync` policy. Subclasses
+    implement `_write_rows`, `_sync` and `_close`.
+
+    Usage:
+
+        with make_sink() as sink:
+            for app in apps:
+                sink.write_batch(app.batch())
+
+    @contextmanager
+    """
+
+    # Default file extension of output
+    extension: str = ''
+
+    def __init__(self,
+                 path: str,
+                 batch_size: int = None,
+                 flush_interval: float = None,
+                 fsync: str = None):
+        self.path: str = path
+        self.batch_size: int = batch_size or config.output_batch_size
+        self.flush_interval: float = flush_interval if flush_interval is not None else config.output_flush_interval
+        self.fsync: str = fsync or config.output_fsync
+        assert self.fsync in (FSYNC_NEVER, FSYNC_FLUSH, FSYNC_CLOSE), 'unknown fsync policy %s' % self.fsync
+
+        self.buffer: tp.List[tuple] = []
+        self.last_flush_at: float = monotonic()
+
+    def __enter__(self) -> 'Sink':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def write(self, file: File) -> None:
+        self.buffer.append(file.astuple())
+        self._maybe_flush()
+
+    def write_many(self, files: tp.Iterable[File]) -> None:
+        self.buffer.extend(file.astuple() for file in files)
+        self._maybe_flush()
+
+    def write_batch(self, batch: FileBatch) -> None:
+        self.buffer.extend(batch.rows())
+        metrics.inc('apps_total')
+        metrics.inc('files_total', len(batch))
+        self._maybe_flush()
+
+    def flush(self) -> None:
+        if self.buffer:
+            self._write_rows(self.buffer)
+            self.buffer = []
+            if self.fsync == FSYNC_FLUSH:
+                self._sync()
+
+        self.last_flush_at = monotonic()
+
+    def close(self) -> None:
+        self.flush()
+        if self.fsync == FSYNC_CLOSE:
+            self._sync()
+        self._close()
+
+    def _maybe_flush(self) -> None:
+        if len(self.buffer) >= self.batch_size or \
+                monotonic() - self.last_flush_at >= self.flush_interval:
+            self.flush()
+
+    @abc.abstractmethod
+    def _write_rows(self, rows: tp.List[tuple]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _sync(self) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _close(self) -> None:
+        ...
+
+
+class FileSink(Sink):
+    """
+    Base of sinks, appending to plain file.
+    """
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(path, **kwargs)
+        self.file: tp.TextIO = open(path, 'a', newline='', encoding='utf-8')
+
+    def _write_rows(self, rows: tp.List[tuple]) -> None:
+        self.file.write(self._format(rows))
+        self.file.flush()
+
+    @abc.abstractmethod
+    def _format(self, rows: tp.List[tuple]) -> str:
+        ...
+
+    def _sync(self) -> None:
+        os.fsync(self.file.fileno())
+
+    def _close(self) -> None:
+        self.file.close()
+
+
+class TextSink(FileSink):
+    """
+    Original `File.dumps()` lines.
+    """
+
+    extension = '.txt'
+
+    def _format(self, rows: tp.List[tuple]) -> str:
+        return ''.join(File(*row).dumps() for row in rows)
+
+
+class JsonLinesSink(FileSink):
+    """
+    One JSON object per line.
+    """
+
+    extension = '.jsonl'
+
+    def _format(self, rows: tp.List[tuple]) -> str:
+        return ''.join(json.dumps(dict(zip(FIELDS, row)), ensure_ascii=False) + '\n'
+                       for row in rows)
+
+
+class CsvSink(FileSink):
+    """
+    CSV with header, which is written once per file.
+    """
+
+    extension = '.csv'
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(path, **kwargs)
+        if self.file.tell() == 0:
+            self.file.write(self._format([FIELDS]))
+
+    def _format(self, rows: tp.List[tuple]) -> str:
+        output = io.StringIO(newline='')
+        csv.writer(output).writerows(rows)
+        return output.getvalue()
+
+
+class SqliteSink(Sink):
+    """
+    Table `files` of SQLite database. Each batch is a single
+    transaction, fsync policy maps to `synchronous` pragma.
+    """
+
+    extension = '.sqlite3'
+
+    SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS files (
+        archive_name TEXT,
+        file_name TEXT,
+        mime_type TEXT,
+        size_deflated INTEGER,
+        size_compressed INTEGER,
+        crc INTEGER,
+        sha256 TEXT
+    )
+    '''
+
+    SYNCHRONOUS = {
+        FSYNC_NEVER: 'OFF',
+        FSYNC_FLUSH: 'FULL',
+        FSYNC_CLOSE: 'OFF',
+    }
+
+    def __init__(self, path: str, **kwargs):
+        super().__init__(path, **kwargs)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA synchronous=%s' % self.SYNCHRONOUS[self.fsync])
+        self.connection.execute(self.SCHEMA)
+        self.connection.commit()
+
+    def _write_rows(self, rows: tp.List[tuple]) -> None:
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO files (%s) VALUES (%s)' % (', '.join(FIELDS), ', '.join('?' * len(FIELDS))),
+                rows)
+
+    def _sync(self) -> None:
+        # Batches are already synced by SQLite itself
+        if self.fsync == FSYNC_CLOSE:
+            _fsync_path(self.path)
+
+    def _close(self) -> None:
+        self.connection.close()
+
+
+class ParquetSink(Sink):
+    """
+    Columnar Parquet file, each batch is a row group.
+    Requires optional pyarrow package. Parquet can't be
+    appended to, so existing file is overwritten.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, path: str, **kwargs):
+        assert pyarrow is not None, 'pyarrow should be installed to use parquet sink'
+        super().__init__(path, **kwargs)
+
+        self.schema = pyarrow.schema([
+            ('archive_name', pyarrow.string()),
+            ('file_name', pyarrow.string()),
+            ('mime_type', pyarrow.string()),
+            ('size_deflated', pyarrow.int64()),
+            ('size_compressed', pyarrow.int64()),
+            ('crc', pyarrow.uint32()),
+            ('sha256', pyarrow.string()),
+        ])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def _write_rows(self, rows: tp.List[tuple]) -> None:
+        columns = zip(*rows)
+        self.writer.write_table(pyarrow.Table.from_arrays(
+            [pyarrow.array(column, type=field.type) for column, field in zip(columns, self.schema)],
+            schema=self.schema))
+
+    def _sync(self) -> None:
+        # File is readable only after footer
+        # is written on close, so it's synced then
+        ...
+
+    def close(self) -> None:
+        self.flush()
+        self._close()
+        if self.fsync != FSYNC_NEVER:
+            _fsync_path(self.path)
+
+    def _close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def _fsync_path(path: str) -> None:
+    with open(path, 'rb') as f:
+        os.fsync(f.fileno())
+
+
+SINKS: tp.Dict[str, tp.Type[Sink]] = {
+    'text': TextSink,
+    'jsonl': JsonLinesSink,
+    'csv': CsvSink,
+    'sqlite': SqliteSink,
+    'parquet': ParquetSink,
+}
+
+
+def make_sink(kind: str = None, path: str = None, **kwargs) -> Sink:
+    """
+    Builds sink of given kind, `config.output_format` by default.
+    Path defaults to `config.output_path` or 'files' with
+    extension of sink, e.g. 'files.jsonl'.
+    """
+    sink_class = SINKS[kind or config.output_format]
+    path = path or config.output_path or 'files' + sink_class.extension
+    return sink_class(path, **kwargs)
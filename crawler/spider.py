@@ -1,78 +1,181 @@
 import logging
 import typing as tp
-from collections import deque
 from logging import Logger
+from time import sleep
 
-from crawler.config import config
-from crawler.errors import DownloadError
-from crawler.page import Page
+from crawler.app import App
+from crawler.frontier_store import FrontierStore
+from crawler.metrics import metrics
+from crawler.page import Page, fetch_app
+from crawler.retry import RETRY_ERRORS, RetryQueue
+from crawler.scheduler import Scheduler, make_scheduler
+from crawler.seen_index import SeenIndex, get_seen_index
+from crawler.visited import make_visited_set
 
 
 class Spider:
     """
-    DFS-based recursive crawler.
+    Recursive crawler, DFS-based by default.
 
-    Manages stack of Pages, which are queued for parsing.
-    Initialized with one element in stack — root Page node.
+    Manages frontier of Pages, which are queued for parsing.
+    Initialized with one element in frontier — root Page node.
     After fetching root Page contests, adds all new
-    retrieved Pages to stack. Apps are piped to generator-like
+    retrieved Pages to frontier. Apps are piped to generator-like
     interface directly without actual storing in memory.
+    Order of crawling is defined by Scheduler
+    (`config.frontier_strategy` by default).
 
     If Page download error occures, DownloadError is raised.
-    Page is re-scheduled to download to the bottom of the stack,
-    increasing it's own retries_count. It retries_count >=
-    max_retries_count, safely removes from Pages stack.
+    Page is scheduled to RetryQueue and crawled again after delay,
+    given by policy of error class, increasing it's own retries_count.
+    If policy allows no more retries, safely removes from Pages frontier.
+    Fresh pages are crawled while retries are waiting. Failed Apps
+    are retried the same way via `app_retries`, shared with Pages.
+
+    If FrontierStore is provided, frontier and visited pages are
+    persisted to it, and Spider resumes from stored state on restart.
+
+    If SeenIndex is provided (`config.seen_index_path`), crawl is
+    incremental: apps, seen by previous crawls, are skipped.
 
     @iterator
     """
 
-    def __init__(self, root_path: str = '/', max_depth: int = 6, logger: Logger = None):
-        self.stack: tp.Deque[Page] = deque()
-        self.visited_pages: tp.Set[str] = set()
+    def __init__(self,
+                 root_path: str = '/',
+                 max_depth: int = 6,
+                 logger: Logger = None,
+                 store: FrontierStore = None,
+                 scheduler: Scheduler = None,
+                 retries: RetryQueue = None,
+                 app_retries: RetryQueue = None,
+                 seen_index: SeenIndex = None):
+        # Empty scheduler and queues are falsy
+        self.frontier: Scheduler = scheduler if scheduler is not None else make_scheduler()
+        self.retries: RetryQueue[Page] = retries if retries is not None else RetryQueue()
+        self.app_retries: RetryQueue[App] = app_retries if app_retries is not None else RetryQueue()
+        self.visited_pages: tp.Set[str] = make_visited_set()
         self.max_depth: int = max_depth
-
-        # Build and add root page to queue
-        # as first node to start graph traverse
-        root_page: Page = Page(path=root_path)
-        self.visited_pages.add(root_path)
-        self.stack.append(root_page)
+        self.store: tp.Optional[FrontierStore] = store
+        self.seen_index: tp.Optional[SeenIndex] = seen_index or get_seen_index()
 
         self.logger = logger
         if not self.logger:
             self.logger = logging.getLogger('spider')
             self.logger.setLevel(logging.DEBUG)
 
+        if self.store and not self.store.is_empty():
+            self._resume()
+            return
+
+        # Build and add root page to queue
+        # as first node to start graph traverse
+        root_page: Page = Page(path=root_path)
+        self.visited_pages.add(root_path)
+        self._schedule(root_page)
+
     def __iter__(self) -> tp.Generator[Page, None, None]:
         """
-        Iterates over graph with DFS starting from `root_path`.
+        Iterates over graph in scheduler order starting from `root_path`.
 
         On each iteration yields `Page` instance.
         """
-        while self.stack:
-            # Pop next page from top of stack
-            page: Page = self.stack.popleft()
+        try:
+            yield from self._crawl()
+        finally:
+            if self.store:
+                self.store.flush()
+
+    def retried_apps(self) -> tp.Generator[App, None, None]:
+        """
+        Yields apps, which are still waiting for retry
+        after crawling is over, sleeping until they are due.
+        """
+        while self.app_retries:
+            sleep(self.app_retries.next_due_in())
+
+            app: tp.Optional[App] = self.app_retries.pop_due()
+            if app and fetch_app(app, self.app_retries):
+                yield app
+
+    def _crawl(self) -> tp.Generator[Page, None, None]:
+        while self.frontier or self.retries:
+            # Retries, which delay is over, go first,
+            # then next page with the highest priority
+            page: tp.Optional[Page] = self.retries.pop_due()
+            if page is None:
+                if not self.frontier:
+                    sleep(self.retries.next_due_in())
+                    continue
+                page = self.frontier.pop()
             self.logger.debug('Crawling page: %s' % page.path)
 
+            fetched = False
             try:
                 page.fetch_body()
-            except DownloadError:
-                # If fetching data fails for some reason,
-                # re-schedule page to the bottom of the stack
-                # if max_retries_count allowes.
-                if page.retries_count >= config.max_retries_count:
+            except RETRY_ERRORS as exc:
+                # If fetching data fails for some reason, retry
+                # page after delay if policy of error allowes.
+                if not self.retries.schedule(page, exc):
+                    self._mark_done(page)
                     continue
-                page.retries_count += 1
-                self.stack.append(page)
+                self._defer(page)
             else:
                 page.extract_links()
+                fetched = True
+
+                # In incremental mode only new apps are fetched, and
+                # listing of already seen apps is not descended
+                if self.seen_index and not self.seen_index.filter_page(page):
+                    page.page_links = set()
 
             # Do not append child to queue pages
             # deeper than max recursion depth
             for child in page.children():
                 if child.path not in self.visited_pages and \
-                        child.recursion_level <= config.max_depth:
+                        child.recursion_level <= self.max_depth:
                     self.visited_pages.add(child.path)
-                    self.stack.appendleft(child)
+                    self._schedule(child, parent=page)
 
-            self.logger.info('Pages in queue: %s' % len(self.stack))
+            self.logger.info('Pages in queue: %s' % len(self.frontier))
+            metrics.set('frontier_pages', len(self.frontier))
+            metrics.set('retry_pages', len(self.retries))
+            metrics.set('retry_apps', len(self.app_retries))
+            page.app_retries = self.app_retries
             yield page
+
+            # Page is done only when its apps are consumed,
+            # otherwise it's crawled again after resume
+            if fetched:
+                self._mark_done(page)
+
+    def _resume(self) -> None:
+        """
+        Restores frontier and visited pages from store.
+        """
+        self.visited_pages.update(self.store.visited())
+
+        for path, recursion_level, retries_count, priority, position in self.store.frontier():
+            page: Page = Page(path=path, recursion_level=recursion_level)
+            page.retries_count = retries_count
+            self.frontier.restore(page, priority, position)
+
+        self.logger.info('Resumed crawling with %s pages in queue' % len(self.frontier))
+
+    def _schedule(self, page: Page, parent: Page = None) -> None:
+        priority, position = self.frontier.push(page, parent=parent)
+        if self.store:
+            self.store.push(page.path, page.recursion_level, page.retries_count, priority, position)
+
+    def _defer(self, page: Page) -> None:
+        """
+        Records page, waiting for retry, as deferred
+        one, so it's crawled last after resume.
+        """
+        priority, position = self.frontier.defer_key()
+        if self.store:
+            self.store.push(page.path, page.recursion_level, page.retries_count, priority, position)
+
+    def _mark_done(self, page: Page) -> None:
+        if self.store:
+            self.store.mark_done(page.path, page.recursion_level, page.retries_count)
@@ -1,14 +1,52 @@
-from dataclasses import dataclass
+import sys
+import typing as tp
+from array import array
 from enum import Enum
 
+# Sizes and CRC, which are unknown, are
+# stored in FileBatch arrays as MISSING
+MISSING = -1
+
 
-@dataclass
 class File:
-    archive_name: str = None
-    file_name: str = None
-    mime_type: str = None
-    size_deflated: int = None
-    size_compressed: int = None
+    """
+    Single entry of APK. Instances are created per ZIP entry,
+    i.e. millions per crawl, so attributes are slotted.
+    """
+
+    __slots__ = ('archive_name', 'file_name', 'mime_type',
+                 'size_deflated', 'size_compressed', 'crc', 'sha256')
+
+    def __init__(self,
+                 archive_name: str = None,
+                 file_name: str = None,
+                 mime_type: str = None,
+                 size_deflated: int = None,
+                 size_compressed: int = None,
+                 crc: int = None,
+                 sha256: str = None):
+        self.archive_name: str = archive_name
+        self.file_name: str = file_name
+        self.mime_type: str = mime_type
+        self.size_deflated: int = size_deflated
+        self.size_compressed: int = size_compressed
+
+        # Filled by listing, if CRC is known, and by deep inspection
+        self.crc: int = crc
+        # Filled by deep inspection only
+        self.sha256: str = sha256
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self.astuple() == other.astuple()
+
+    def __repr__(self):
+        return 'File(%s)' % ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.__slots__)
+
+    def astuple(self) -> tuple:
+        return (self.archive_name, self.file_name, self.mime_type,
+                self.size_deflated, self.size_compressed, self.crc, self.sha256)
 
     def dumps(self, add_newline: bool = True):
         """
@@ -18,16 +56,102 @@ class File:
             self.archive_name, self.file_name,
             self.mime_type, self.size_deflated
         )
+        if self.sha256 is not None:
+            line += ' – {:08x} – {}'.format(self.crc, self.sha256)
         if add_newline:
             line += '\n'
 
         return line
 
 
+class FileBatch:
+    """
+    Columnar list of entries of single archive.
+
+    Sizes and CRCs are kept in arrays and mime types are interned,
+    so batch takes a fraction of memory of the same File objects.
+    Iteration builds File objects on the fly.
+
+    Usage:
+
+        batch = FileBatch(archive_name='foo.apk')
+        batch.append('classes.dex', 'application/vnd.android.dex', 1024, 512)
+
+        for file in batch:
+            ...
+
+        sink.write_batch(batch)
+
+    @iterable
+    """
+
+    __slots__ = ('archive_name', 'file_names', 'mime_types',
+                 'sizes_deflated', 'sizes_compressed', 'crcs', 'sha256s')
+
+    def __init__(self, archive_name: str = None):
+        self.archive_name: tp.Optional[str] = archive_name
+        self.file_names: tp.List[str] = []
+        self.mime_types: tp.List[str] = []
+        self.sizes_deflated: array = array('q')
+        self.sizes_compressed: array = array('q')
+        self.crcs: array = array('q')
+        self.sha256s: tp.List[tp.Optional[str]] = []
+
+    @classmethod
+    def from_files(cls, files: tp.Iterable[File], archive_name: str = None) -> 'FileBatch':
+        batch = cls(archive_name)
+        for file in files:
+            batch.add(file)
+        return batch
+
+    def __len__(self):
+        return len(self.file_names)
+
+    def __iter__(self) -> tp.Generator[File, None, None]:
+        for row in self.rows():
+            yield File(*row)
+
+    def append(self,
+               file_name: str,
+               mime_type: str,
+               size_deflated: int,
+               size_compressed: int,
+               crc: int = None,
+               sha256: str = None) -> None:
+        self.file_names.append(file_name)
+        self.mime_types.append(sys.intern(mime_type) if mime_type else mime_type)
+        self.sizes_deflated.append(MISSING if size_deflated is None else size_deflated)
+        self.sizes_compressed.append(MISSING if size_compressed is None else size_compressed)
+        self.crcs.append(MISSING if crc is None else crc)
+        self.sha256s.append(sha256)
+
+    def add(self, file: File) -> None:
+        if self.archive_name is None:
+            self.archive_name = file.archive_name
+        self.append(file.file_name, file.mime_type, file.size_deflated,
+                    file.size_compressed, file.crc, file.sha256)
+
+    def rows(self) -> tp.Generator[tuple, None, None]:
+        """
+        Yields tuples, ordered as File fields.
+        """
+        for file_name, mime_type, size_deflated, size_compressed, crc, sha256 in zip(
+                self.file_names, self.mime_types, self.sizes_deflated,
+                self.sizes_compressed, self.crcs, self.sha256s):
+            yield (self.archive_name, file_name, mime_type,
+                   None if size_deflated == MISSING else size_deflated,
+                   None if size_compressed == MISSING else size_compressed,
+                   None if crc == MISSING else crc,
+                   sha256)
+
+
 class AppState(Enum):
     INITIALIZED = 10
     FETCHED = 20
     DOWNLOADED = 30
+    # Final state: contents are known, either from downloaded
+    # APK, or right after FETCHED via Range requests or replay
+    LISTED = 40
 
 
 class PageState(Enum):
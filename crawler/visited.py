@@ -0,0 +1,197 @@
+import math
+import typing as tp
+from array import array
+from hashlib import blake2b
+
+from crawler.config import config
+
+
+def _hash64(path: str) -> int:
+    return int.from_bytes(blake2b(path.encode(), digest_size=8).digest(), 'little')
+
+
+def _hash128(path: str) -> tp.Tuple[int, int]:
+    digest = blake2b(path.encode(), digest_size=16).digest()
+    # Second hash should be odd to cover all bits
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class HashedPathSet:
+    """
+    Set of 64-bit path hashes in open-addressing table,
+    backed by a single array of unsigned longs.
+
+    Takes ~16 bytes per path instead of path string itself
+    plus set entry. Chance of two paths colliding is
+    negligible for crawls of any practical size.
+
+    @set
+    """
+    # Marks empty slot, real zero hash is stored as 1
+    EMPTY = 0
+    MAX_LOAD_FACTOR = 0.5
+
+    def __init__(self, paths: tp.Iterable[str] = (), capacity: int = 1024):
+        self.size: int = 0
+        self.table: array = self._build_table(capacity)
+        self.update(paths)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, path: str) -> bool:
+        value = _hash64(path) or 1
+        return self.table[self._find_slot(self.table, value)] == value
+
+    def add(self, path: str) -> None:
+        value = _hash64(path) or 1
+        slot = self._find_slot(self.table, value)
+        if self.table[slot] == value:
+            return
+
+        self.table[slot] = value
+        self.size += 1
+
+        if self.size > len(self.table) * self.MAX_LOAD_FACTOR:
+            self._grow()
+
+    def update(self, paths: tp.Iterable[str]) -> None:
+        for path in paths:
+            self.add(path)
+
+    @staticmethod
+    def _build_table(capacity: int) -> array:
+        # Table size is power of two, so slot is taken by mask
+        size = 1 << max(capacity - 1, 1).bit_length()
+        return array('Q', bytes(8 * size))
+
+    @classmethod
+    def _find_slot(cls, table: array, value: int) -> int:
+        """
+        Linear probing: returns slot holding value
+        or the first empty slot on its way.
+        """
+        mask = len(table) - 1
+        slot = value & mask
+        while True:
+            stored = table[slot]
+            if stored == value or stored == cls.EMPTY:
+                return slot
+            slot = (slot + 1) & mask
+
+    def _grow(self) -> None:
+        table = self._build_table(len(self.table) * 2)
+        for value in self.table:
+            if value != self.EMPTY:
+                table[self._find_slot(table, value)] = value
+        self.table = table
+
+
+class BloomFilter:
+    """
+    Fixed size Bloom filter for up to `capacity` items
+    with `error_rate` false positive probability.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity: int = capacity
+        self.error_rate: float = error_rate
+        self.size: int = 0
+
+        # Optimal amount of bits and hash functions
+        self.bits_count: int = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes_count: int = max(int(round(self.bits_count / capacity * math.log(2))), 1)
+        self.bits: bytearray = bytearray((self.bits_count + 7) // 8)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, path: str) -> bool:
+        return self.contains_hashes(*_hash128(path))
+
+    def add(self, path: str) -> None:
+        self.add_hashes(*_hash128(path))
+
+    def contains_hashes(self, h1: int, h2: int) -> bool:
+        # Double hashing: i-th hash is h1 + i * h2
+        bits, bits_count = self.bits, self.bits_count
+        for i in range(self.hashes_count):
+            bit = (h1 + i * h2) % bits_count
+            if not bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+
+    def add_hashes(self, h1: int, h2: int) -> None:
+        bits, bits_count = self.bits, self.bits_count
+        for i in range(self.hashes_count):
+            bit = (h1 + i * h2) % bits_count
+            bits[bit >> 3] |= 1 << (bit & 7)
+        self.size += 1
+
+
+class ScalableBloomFilter:
+    """
+    Growing series of Bloom filters, so capacity is not needed
+    to be known in advance. Each next filter is twice larger and has
+    twice lower error rate, so overall false positive probability
+    stays below `error_rate`.
+
+    False positive means path is considered visited, while it's not,
+    so some pages may be skipped. Paths are never forgotten.
+
+    ref: Almeida et al., Scalable Bloom Filters, 2007
+
+    @set
+    """
+    GROWTH_FACTOR = 2
+    TIGHTENING_RATIO = 0.5
+
+    def __init__(self, paths: tp.Iterable[str] = (), error_rate: float = None, capacity: int = 1024):
+        self.error_rate: float = error_rate or config.visited_error_rate
+        self.initial_capacity: int = capacity
+        self.filters: tp.List[BloomFilter] = []
+        self.update(paths)
+
+    def __len__(self) -> int:
+        return sum(len(bloom_filter) for bloom_filter in self.filters)
+
+    def __contains__(self, path: str) -> bool:
+        hashes = _hash128(path)
+        return any(bloom_filter.contains_hashes(*hashes) for bloom_filter in self.filters)
+
+    def add(self, path: str) -> None:
+        hashes = _hash128(path)
+        if any(bloom_filter.contains_hashes(*hashes) for bloom_filter in self.filters):
+            return
+
+        if not self.filters or len(self.filters[-1]) >= self.filters[-1].capacity:
+            self._add_filter()
+
+        self.filters[-1].add_hashes(*hashes)
+
+    def update(self, paths: tp.Iterable[str]) -> None:
+        for path in paths:
+            self.add(path)
+
+    def _add_filter(self) -> None:
+        index = len(self.filters)
+        capacity = self.initial_capacity * self.GROWTH_FACTOR ** index
+
+        # Error rates form geometric series, summing up to error_rate
+        error_rate = self.error_rate * (1 - self.TIGHTENING_RATIO) * self.TIGHTENING_RATIO ** index
+        self.filters.append(BloomFilter(capacity=capacity, error_rate=error_rate))
+
+
+VISITED_SETS: tp.Dict[str, tp.Callable[[], tp.Any]] = {
+    'set': set,
+    'hashed': HashedPathSet,
+    'bloom': ScalableBloomFilter,
+}
+
+
+def make_visited_set(kind: str = None):
+    """
+    Builds empty visited pages structure of given
+    kind, `config.visited_set` by default.
+    """
+    return VISITED_SETS[kind or config.visited_set]()
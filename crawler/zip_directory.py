@@ -0,0 +1,229 @@
+import mmap
+import struct
+import typing as tp
+from dataclasses import dataclass
+
+from crawler.errors import BadArchiveError
+
+# Minimal ZIP central directory reader, which lists archive
+# entries without having whole archive at hand.
+# ref:https://pkware.cachefly.net/webdocs/casestudies/APPNOTE.TXT
+END_OF_CENTRAL_DIRECTORY = struct.Struct('<4s4H2LH')
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR = struct.Struct('<4sLQL')
+ZIP64_END_OF_CENTRAL_DIRECTORY = struct.Struct('<4sQ2H2L4Q')
+CENTRAL_DIRECTORY_FILE_HEADER = struct.Struct('<4s6H3L5H2L')
+EXTRA_FIELD_HEADER = struct.Struct('<2H')
+
+END_OF_CENTRAL_DIRECTORY_SIGNATURE = b'PK\x05\x06'
+ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE = b'PK\x06\x07'
+ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE = b'PK\x06\x06'
+CENTRAL_DIRECTORY_FILE_HEADER_SIGNATURE = b'PK\x01\x02'
+
+ZIP64_EXTRA_FIELD_ID = 0x0001
+UTF8_FILENAME_FLAG = 0x800
+
+# End of central directory record may be followed by
+# up to 64K of archive comment and preceded by zip64 locator
+MAX_TAIL_SIZE = END_OF_CENTRAL_DIRECTORY.size + 0xFFFF + \
+                ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.size
+
+
+@dataclass
+class CentralDirectory:
+    offset: int = None
+    size: int = None
+    entries: int = None
+
+    # Set when archive is zip64, and actual values should
+    # be read from zip64 end of central directory record
+    zip64_record_offset: tp.Optional[int] = None
+
+
+class ZipEntry(tp.NamedTuple):
+    filename: str
+    file_size: int
+    compress_size: int
+    crc: int
+    header_offset: int
+
+
+def find_central_directory(tail: bytes) -> CentralDirectory:
+    """
+    Finds end of central directory record in last bytes
+    of archive (up to MAX_TAIL_SIZE).
+
+    For zip64 archives only `zip64_record_offset` is set,
+    ref:parse_zip64_central_directory.
+    """
+    position = len(tail)
+    while True:
+        position = tail.rfind(END_OF_CENTRAL_DIRECTORY_SIGNATURE, 0, position)
+        if position < 0:
+            raise BadArchiveError('end of central directory record is not found')
+
+        record = tail[position:position + END_OF_CENTRAL_DIRECTORY.size]
+        if len(record) == END_OF_CENTRAL_DIRECTORY.size:
+            (_, _, _, _, entries,
+             size, offset, comment_length) = END_OF_CENTRAL_DIRECTORY.unpack(record)
+
+            # Signature may occur inside archive comment,
+            # real record ends exactly with comment
+            if position + END_OF_CENTRAL_DIRECTORY.size + comment_length == len(tail):
+                break
+
+    locator_position = position - ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.size
+    if locator_position >= 0:
+        locator = tail[locator_position:position]
+        signature, _, zip64_record_offset, _ = \
+            ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR.unpack(locator)
+        if signature == ZIP64_END_OF_CENTRAL_DIRECTORY_LOCATOR_SIGNATURE:
+            return CentralDirectory(zip64_record_offset=zip64_record_offset)
+
+    if entries == 0xFFFF or size == 0xFFFFFFFF or offset == 0xFFFFFFFF:
+        raise BadArchiveError('zip64 end of central directory locator is not found')
+
+    return CentralDirectory(offset=offset, size=size, entries=entries)
+
+
+def parse_zip64_central_directory(record: bytes) -> CentralDirectory:
+    """
+    Parses zip64 end of central directory record, found
+    at `CentralDirectory.zip64_record_offset`.
+    """
+    if len(record) < ZIP64_END_OF_CENTRAL_DIRECTORY.size:
+        raise BadArchiveError('zip64 end of central directory record is truncated')
+
+    (signature, _, _, _, _, _, _,
+     entries, size, offset) = ZIP64_END_OF_CENTRAL_DIRECTORY.unpack(
+        record[:ZIP64_END_OF_CENTRAL_DIRECTORY.size])
+    if signature != ZIP64_END_OF_CENTRAL_DIRECTORY_SIGNATURE:
+        raise BadArchiveError('bad zip64 end of central directory record')
+
+    return CentralDirectory(offset=offset, size=size, entries=entries)
+
+
+def iter_central_directory(data: bytes) -> tp.Generator[ZipEntry, None, None]:
+    """
+    Iterates over central directory file headers,
+    yielding same values, ZipFile.infolist() provides.
+    """
+    data = memoryview(data)
+    position = 0
+    header_size = CENTRAL_DIRECTORY_FILE_HEADER.size
+
+    while position + header_size <= len(data):
+        (signature, _, _, flags, _, _, _,
+         crc, compress_size, file_size,
+         filename_length, extra_length, comment_length,
+         _, _, _, header_offset) = CENTRAL_DIRECTORY_FILE_HEADER.unpack_from(data, position)
+        if signature != CENTRAL_DIRECTORY_FILE_HEADER_SIGNATURE:
+            raise BadArchiveError('bad central directory file header')
+
+        position += header_size
+        raw_filename = bytes(data[position:position + filename_length])
+        position += filename_length
+        extra = data[position:position + extra_length]
+        position += extra_length + comment_length
+
+        if file_size == 0xFFFFFFFF or compress_size == 0xFFFFFFFF or header_offset == 0xFFFFFFFF:
+            file_size, compress_size, header_offset = \
+                _parse_zip64_extra(extra, file_size, compress_size, header_offset)
+
+        yield ZipEntry(
+            filename=_decode_filename(raw_filename, flags),
+            file_size=file_size,
+            compress_size=compress_size,
+            crc=crc,
+            header_offset=header_offset,
+        )
+
+
+def read_central_directory(file: tp.BinaryIO) -> tp.List[ZipEntry]:
+    """
+    Lists entries of whole archive file, mapped into memory.
+    Only pages of end records and central directory are
+    touched, and nothing but file names is copied out of them.
+    """
+    try:
+        mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        # Empty file can't be mapped
+        raise BadArchiveError('archive is empty')
+
+    with mapped:
+        directory = find_central_directory(mapped[-MAX_TAIL_SIZE:])
+        if directory.zip64_record_offset is not None:
+            record_end = directory.zip64_record_offset + ZIP64_END_OF_CENTRAL_DIRECTORY.size
+            directory = parse_zip64_central_directory(mapped[directory.zip64_record_offset:record_end])
+
+        if directory.offset + directory.size > len(mapped):
+            raise BadArchiveError('central directory is truncated')
+
+        # All views should be released before mapping is closed
+        with memoryview(mapped) as view, \
+                view[directory.offset:directory.offset + directory.size] as data:
+            try:
+                return list(iter_central_directory(data))
+            except (BadArchiveError, UnicodeDecodeError) as exc:
+                # Traceback keeps views of parser alive,
+                # so error is raised again after closing
+                error = BadArchiveError(str(exc))
+
+    raise error
+
+
+def _parse_zip64_extra(extra: memoryview,
+                       file_size: int,
+                       compress_size: int,
+                       header_offset: int) -> tp.Tuple[int, int, int]:
+    """
+    Zip64 extra field holds only those values,
+    which are set to 0xFFFFFFFF in file header, in fixed order.
+    """
+    position = 0
+    while position + EXTRA_FIELD_HEADER.size <= len(extra):
+        field_id, field_length = EXTRA_FIELD_HEADER.unpack_from(extra, position)
+        position += EXTRA_FIELD_HEADER.size
+
+        if field_id == ZIP64_EXTRA_FIELD_ID:
+            values = extra[position:position + field_length]
+            index = 0
+
+            def next_value() -> int:
+                nonlocal index
+                value, = struct.unpack_from('<Q', values, index)
+                index += 8
+                return value
+
+            try:
+                if file_size == 0xFFFFFFFF:
+                    file_size = next_value()
+                if compress_size == 0xFFFFFFFF:
+                    compress_size = next_value()
+                if header_offset == 0xFFFFFFFF:
+                    header_offset = next_value()
+            except struct.error:
+                raise BadArchiveError('zip64 extra field is truncated')
+
+            break
+
+        position += field_length
+
+    return file_size, compress_size, header_offset
+
+
+def _decode_filename(raw_filename: bytes, flags: int) -> str:
+    # Both encodings are ASCII-compatible, and cp437 codec is slow
+    if raw_filename.isascii():
+        filename = raw_filename.decode('ascii')
+    elif flags & UTF8_FILENAME_FLAG:
+        filename = raw_filename.decode('utf-8')
+    else:
+        filename = raw_filename.decode('cp437')
+
+    # Same normalization as zipfile.ZipInfo does
+    null_byte = filename.find(chr(0))
+    if null_byte >= 0:
+        filename = filename[0:null_byte]
+
+    return filename
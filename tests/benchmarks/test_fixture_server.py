@@ -0,0 +1,73 @@
+from io import BytesIO
+from unittest.mock import patch
+from zipfile import ZipFile
+
+import pytest
+import requests
+
+from benchmarks.bench_crawl import run
+from benchmarks.fixture_server import FixtureServer, FixtureSite
+from crawler.config import config
+
+
+def get(server, path, **kwargs):
+    url = 'http://%s%s' % (config.network_location, path)
+    return requests.get(url, proxies={'http': server.url}, **kwargs)
+
+
+def test_site_graph():
+    site = FixtureSite(pages=5, fanout=2, apps_per_page=2, apk_entries=4)
+
+    with FixtureServer(site) as server:
+        root = get(server, '/').text
+        assert '/page/1/' in root and '/page/2/' in root and '/page/3/' not in root
+        assert site.app_path(1) in root
+
+        assert 'href="http://%s/?p=2"' % config.network_location in get(server, site.app_path(1)).text
+        assert get(server, '/page/5/').status_code == 404
+
+        response = get(server, '%s?id=2' % config.download_handler_path)
+        assert response.history[0].status_code == 302
+        with ZipFile(BytesIO(response.content)) as apk:
+            assert len(apk.infolist()) == 4
+
+        tail = get(server, '/wp-content/uploads/app-1.apk', headers={'Range': 'bytes=-10'})
+        assert tail.status_code == 206
+        assert tail.content == response.content[-10:]
+        assert tail.headers['Content-Range'] == 'bytes %s-%s/%s' % (
+            len(response.content) - 10, len(response.content) - 1, len(response.content))
+
+
+def test_failure_injection():
+    with FixtureServer(FixtureSite(pages=1), failure_rate=1.0) as server:
+        assert get(server, '/').status_code == 503
+        assert server.failures_count == 1
+
+
+@pytest.mark.parametrize('engine,metadata_only', [
+    ('spider', False), ('spider', True), ('async', False), ('pipeline', False), ('pipeline', True),
+])
+def test_crawl(engine, metadata_only):
+    site = FixtureSite(pages=4, fanout=2, apps_per_page=2, apk_entries=5)
+    result = run(site, engine, latency=0.0, failure_rate=0.0, metadata_only=metadata_only)
+
+    assert result['pages'] == site.pages
+    assert result['apps'] == site.apps
+    assert result['files'] == site.apps * site.apk_entries
+
+
+@pytest.mark.parametrize('engine', ['spider', 'async', 'pipeline'])
+def test_incremental_crawl(tmp_path, engine):
+    site = FixtureSite(pages=4, fanout=2, apps_per_page=2, apk_entries=5)
+
+    with patch.object(config, 'seen_index_path', str(tmp_path / 'seen.sqlite3')):
+        first = run(site, engine, latency=0.0, failure_rate=0.0, metadata_only=False)
+
+        # The next run is the next process
+        with patch('crawler.seen_index._seen_index', None):
+            second = run(site, engine, latency=0.0, failure_rate=0.0, metadata_only=False)
+
+    assert first['apps'] == site.apps
+    # Root page links to known apps only, so it's the only fetched page
+    assert second['pages'] == 1
+    assert second['apps'] == 0
@@ -0,0 +1,45 @@
+from tempfile import NamedTemporaryFile
+from zipfile import ZipFile
+
+from crawler.analysis import AnalysisPool
+from crawler.app import App
+from crawler.structs import AppState, File
+
+
+def build_app(name, entries):
+    app = App(path='/apk/%s-download/' % name)
+    app.filename = '%s.apk' % name
+    app.tempfile = NamedTemporaryFile()
+
+    if entries is None:
+        app.tempfile.write(b'not a zip')
+    else:
+        with ZipFile(app.tempfile, 'w') as zipfile:
+            for entry in entries:
+                zipfile.writestr(entry, b'foo')
+    app.tempfile.flush()
+    return app
+
+
+def test_analyse():
+    apps = [build_app('app-%s' % i, ['classes.dex', 'res/%s.png' % i]) for i in range(5)]
+    expected = [list(build_app('app-%s' % i, ['classes.dex', 'res/%s.png' % i])) for i in range(5)]
+
+    listed = App(path='/apk/listed-download/')
+    listed.files = [File(archive_name='listed.apk', file_name='classes.dex')]
+    listed.state = AppState.LISTED
+
+    broken = build_app('broken', None)
+
+    with AnalysisPool(workers=2, queue_size=2) as pool:
+        analysed = list(pool.analyse([apps[0], listed, broken, *apps[1:]]))
+
+    # Order is kept, broken archive is skipped
+    assert analysed == [apps[0], listed, *apps[1:]]
+    assert [list(app) for app in apps] == expected
+    # Scratch files are removed
+    assert all(app.tempfile is None for app in apps + [broken])
+    assert list(listed) == listed.files
+
+    assert pool.stats.apps == 7
+    assert pool.stats.analysis_time > 0
@@ -0,0 +1,55 @@
+import io
+import os
+from zipfile import BadZipFile, ZipFile
+
+import pytest
+
+from crawler.app import App
+from crawler.scratch import make_tempfile
+from crawler.structs import AppState
+
+MOCK_ENTRIES = ['AndroidManifest.xml', 'classes.dex', 'res/drawable/icon.png']
+
+
+def build_archive():
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w') as zipfile:
+        for entry in MOCK_ENTRIES:
+            zipfile.writestr(entry, b'foo')
+    return buffer.getvalue()
+
+
+def build_app(data):
+    app = App(path='/apk/foo-download/')
+    app.filename = 'foo.apk'
+    app.tempfile = make_tempfile()
+    app.tempfile.write(data)
+    app.tempfile.flush()
+    return app
+
+
+@pytest.mark.parametrize('prefix', [b'', b'#!/bin/sh\n'])
+def test_batch(prefix):
+    # Data before the first entry is read by ZipFile
+    app = build_app(prefix + build_archive())
+    name = app.tempfile.name
+
+    batch = app.batch()
+
+    assert [file.file_name for file in batch] == MOCK_ENTRIES
+    assert [file.mime_type for file in batch][1] == 'application/vnd.android.dex'
+    assert app.state == AppState.LISTED
+    assert app.tempfile is None
+    assert not os.path.exists(name)
+
+
+def test_broken_archive():
+    app = build_app(b'not a zip')
+    name = app.tempfile.name
+
+    with pytest.raises(BadZipFile):
+        app.batch()
+
+    # Scratch file is removed anyway
+    assert app.tempfile is None
+    assert not os.path.exists(name)
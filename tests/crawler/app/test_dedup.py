@@ -0,0 +1,66 @@
+import hashlib
+import io
+from unittest.mock import patch, MagicMock
+from zipfile import ZipFile
+
+from crawler.app import App
+from crawler.dedup import DedupIndex
+from crawler.structs import AppState
+from tests.helpers import build_proxied_session
+
+MOCK_URL = 'http://www.apkmirror.com/wp-content/uploads/foo.apk'
+
+
+def build_archive() -> bytes:
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w') as archive:
+        archive.writestr('classes.dex', b'dex\n035\x00')
+    return buffer.getvalue()
+
+
+def build_session(archive: bytes):
+    response = MagicMock()
+    response.status_code = 200
+    response.url = MOCK_URL
+    response.iter_content.side_effect = lambda chunk_size: iter([archive])
+
+    return build_proxied_session(response)
+
+
+def download(download_id: int, index: DedupIndex, proxied_session) -> App:
+    app = App(path='foo')
+    app.download_id = download_id
+
+    with patch('crawler.app.get_dedup_index', return_value=index), \
+            patch('crawler.app.ProxiedSession', proxied_session):
+        app.download_file()
+        list(app)
+
+    return app
+
+
+def test_known_download_id(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite3'))
+    proxied_session, session = build_session(build_archive())
+
+    first_app = download(1, index, proxied_session)
+    assert first_app.content_hash == hashlib.sha256(build_archive()).hexdigest()
+
+    second_app = download(1, index, proxied_session)
+    assert session.get.call_count == 1
+    assert second_app.state == AppState.LISTED
+    assert [f.file_name for f in second_app] == ['classes.dex']
+    assert second_app.filename == 'foo.apk'
+
+
+def test_known_content_hash(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite3'))
+    proxied_session, session = build_session(build_archive())
+
+    download(1, index, proxied_session)
+    second_app = download(2, index, proxied_session)
+
+    assert session.get.call_count == 2
+    assert second_app.state == AppState.LISTED
+    assert second_app.tempfile is None
+    assert index.lookup_download(2) is not None
@@ -0,0 +1,58 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from crawler.app import App
+from crawler.errors import DownloadError, FileTooLargeError
+from tests.helpers import build_proxied_session
+
+MOCK_CHUNKS = [b'foo', b'bar', b'baz']
+MOCK_URL = 'http://www.apkmirror.com/wp-content/uploads/foo.apk'
+
+
+def build_session(status_code=200):
+    response = MagicMock()
+    response.status_code = status_code
+    response.url = MOCK_URL
+    response.iter_content.return_value = iter(MOCK_CHUNKS)
+
+    mock_proxied_session, _ = build_proxied_session(response)
+    return mock_proxied_session, response
+
+
+def test_basic():
+    mock_proxied_session, response = build_session()
+    app = App(path='foo')
+    app.download_id = 1
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session):
+        app.download_file()
+
+    app.tempfile.seek(0)
+    assert app.tempfile.read() == b'foobarbaz'
+    assert app.download_size == 9
+    assert app.filename == 'foo.apk'
+    response.iter_content.assert_called()
+
+
+def test_max_download_size():
+    mock_proxied_session, response = build_session()
+    app = App(path='foo')
+    app.download_id = 1
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session), \
+            patch('crawler.app.config.max_download_size', 5):
+        with pytest.raises(FileTooLargeError):
+            app.download_file()
+
+    assert app.tempfile is None
+
+
+def test_bad_status_code():
+    mock_proxied_session, response = build_session(status_code=404)
+    app = App(path='foo')
+    app.download_id = 1
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session):
+        with pytest.raises(DownloadError):
+            app.download_file()
@@ -0,0 +1,75 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from crawler.app import App
+from crawler.download_id_cache import DownloadIdCache
+from crawler.errors import DownloadError
+from crawler.structs import AppState
+from tests.helpers import build_proxied_session
+
+MOCK_HEAD = b'<html><head><link rel="shortlink" href="https://www.apkmirror.com/?p=913765"></head>'
+MOCK_BODY = b'<body>' + b'<p>foo</p>' * 1000 + b'</body></html>'
+
+
+def build_session(chunks, status_code=200):
+    chunks = iter(chunks)
+
+    response = MagicMock()
+    response.status_code = status_code
+    response.iter_content.return_value = chunks
+    response.__enter__.return_value = response
+
+    mock_proxied_session, _ = build_proxied_session(response)
+    return mock_proxied_session, chunks
+
+
+def test_scan():
+    mock_proxied_session, chunks = build_session([MOCK_HEAD[:20], MOCK_HEAD[20:], MOCK_BODY])
+    app = App(path='foo')
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session):
+        app.fetch_download_id()
+
+    assert app.download_id == 913765
+    assert app.state == AppState.FETCHED
+    # Body after shortlink isn't read
+    assert list(chunks) == [MOCK_BODY]
+
+
+def test_full_parse():
+    # Shortlink is in body, so head scan fails
+    html = b'<html><head></head><body><link rel="shortlink" href="/?p=2"></body></html>'
+    mock_proxied_session, chunks = build_session([html[:10], html[10:]])
+    app = App(path='foo')
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session):
+        app.fetch_download_id()
+
+    assert app.download_id == 2
+
+
+def test_bad_status_code():
+    mock_proxied_session, chunks = build_session([MOCK_HEAD], status_code=404)
+    app = App(path='foo')
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session), pytest.raises(DownloadError):
+        app.fetch_download_id()
+
+
+def test_cache(tmp_path):
+    cache = DownloadIdCache(str(tmp_path / 'download_ids.sqlite3'))
+    mock_proxied_session, chunks = build_session([MOCK_HEAD])
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session), \
+            patch('crawler.app.get_download_id_cache', MagicMock(return_value=cache)):
+        App(path='foo').fetch_download_id()
+
+        # Known app path isn't fetched again
+        with patch('crawler.app.ProxiedSession', MagicMock(side_effect=AssertionError)):
+            app = App(path='foo')
+            app.fetch_download_id()
+
+    assert app.download_id == 913765
+    assert app.state == AppState.FETCHED
+    assert cache.stats.hits == 1
@@ -0,0 +1,78 @@
+import io
+from unittest.mock import patch, MagicMock
+from zipfile import ZipFile
+
+from crawler.app import App
+from crawler.structs import AppState
+from tests.helpers import build_proxied_session
+
+MOCK_URL = 'http://www.apkmirror.com/wp-content/uploads/foo.apk'
+
+
+def build_archive() -> bytes:
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w') as archive:
+        archive.writestr('AndroidManifest.xml', b'<manifest/>')
+        archive.writestr('classes.dex', b'dex\n035\x00')
+    return buffer.getvalue()
+
+
+def build_session(archive: bytes, honor_range: bool = True):
+    requested_bytes = []
+
+    def get(url, headers=None, stream=False):
+        response = MagicMock()
+        response.url = MOCK_URL
+
+        if not honor_range:
+            response.status_code = 200
+            response.iter_content.return_value = iter([archive])
+            return response
+
+        byte_range = headers['Range'][len('bytes='):]
+        if byte_range.startswith('-'):
+            body = archive[int(byte_range):]
+        else:
+            start, end = byte_range.split('-')
+            body = archive[int(start):int(end) + 1]
+
+        requested_bytes.append(len(body))
+        response.status_code = 206
+        response.content = body
+        response.headers = {
+            'Content-Range': 'bytes %s-%s/%s' % (len(archive) - len(body), len(archive) - 1, len(archive))
+        }
+        return response
+
+    mock_proxied_session, _ = build_proxied_session(get=get)
+    return mock_proxied_session, requested_bytes
+
+
+def test_basic():
+    archive = build_archive()
+    mock_proxied_session, requested_bytes = build_session(archive)
+    app = App(path='foo')
+    app.download_id = 1
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session):
+        app.fetch_metadata()
+
+    assert app.state == AppState.LISTED
+    assert app.tempfile is None
+    assert [(f.archive_name, f.file_name, f.size_deflated) for f in app] == [
+        ('foo.apk', 'AndroidManifest.xml', 11),
+        ('foo.apk', 'classes.dex', 8),
+    ]
+
+
+def test_range_ignored():
+    archive = build_archive()
+    mock_proxied_session, _ = build_session(archive, honor_range=False)
+    app = App(path='foo')
+    app.download_id = 1
+
+    with patch('crawler.app.ProxiedSession', mock_proxied_session):
+        app.fetch_metadata()
+
+    assert app.state == AppState.DOWNLOADED
+    assert [f.file_name for f in app] == ['AndroidManifest.xml', 'classes.dex']
@@ -0,0 +1,33 @@
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import aiohttp
+import pytest
+
+from crawler.async_session import AsyncProxiedSession
+from crawler.metrics import MetricsRegistry
+
+
+class FailingRequest:
+    async def __aenter__(self):
+        raise aiohttp.ClientConnectionError
+
+    async def __aexit__(self, *args):
+        ...
+
+
+@patch('crawler.async_session.get_proxy_manager', lambda proxies: None)
+@patch('crawler.async_session.get_rate_limiter', lambda: None)
+def test_proxy_errors_counted_without_manager():
+    registry = MetricsRegistry()
+
+    async def fetch():
+        async with AsyncProxiedSession(proxies=['foo']) as session:
+            session.session.get = MagicMock(return_value=FailingRequest())
+            async with session.get('http://example.com/'):
+                ...
+
+    with patch('crawler.async_session.metrics', registry), pytest.raises(aiohttp.ClientError):
+        asyncio.run(fetch())
+
+    assert registry.counter('proxy_errors_total').get(proxy='foo') == 1
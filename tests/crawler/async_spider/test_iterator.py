@@ -0,0 +1,169 @@
+import asyncio
+from time import monotonic
+from unittest.mock import patch, MagicMock
+
+from crawler.async_spider import AsyncSpider
+from crawler.errors import DownloadError
+from crawler.retry import RetryPolicy, RetryQueue
+from tests.helpers import build_retries
+
+MOCK_HTML = {
+    '/': '<a href="/page/2/">next</a>'
+         '<a href="/apk/foo/foo-download/">foo</a>'
+         '<a href="/apk/bar/bar-download/">bar</a>',
+    '/page/2/': '<a href="/apk/baz/baz-download/">baz</a>'
+                '<a href="/apk/foo/foo-download/">foo</a>',
+}
+
+
+class MockSession:
+    def __init__(self, *args, **kwargs):
+        ...
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        ...
+
+
+async def mock_fetch_body(page, session):
+    page.html = MOCK_HTML[page.path]
+
+
+async def mock_noop(app, session):
+    ...
+
+
+def crawl(spider):
+    async def collect():
+        return [app async for app in spider]
+
+    return asyncio.run(collect())
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+@patch('crawler.async_spider.App.download_file_async', mock_noop)
+@patch('crawler.async_spider.App.fetch_download_id_async', mock_noop)
+@patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body)
+def test_basic():
+    apps = crawl(AsyncSpider(root_path='/', max_depth=1))
+    assert sorted(app.path for app in apps) == [
+        '/apk/bar/bar-download/',
+        '/apk/baz/baz-download/',
+        '/apk/foo/foo-download/',
+    ]
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+@patch('crawler.async_spider.App.download_file_async', mock_noop)
+@patch('crawler.async_spider.App.fetch_download_id_async', mock_noop)
+@patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body)
+def test_max_depth():
+    apps = crawl(AsyncSpider(root_path='/', max_depth=0))
+    assert len(apps) == 2
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+@patch('crawler.async_spider.App.download_file_async', mock_noop)
+@patch('crawler.async_spider.App.fetch_download_id_async', mock_noop)
+@patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body)
+def test_apps_to_fetch():
+    apps = crawl(AsyncSpider(root_path='/', max_depth=1, apps_to_fetch=1))
+    assert len(apps) == 1
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+@patch('crawler.async_spider.App.download_file_async', mock_noop)
+def test_failed_app_skipped():
+    async def mock_fetch_download_id(app, session):
+        if app.path == '/apk/foo/foo-download/':
+            raise DownloadError
+
+    with patch('crawler.async_spider.App.fetch_download_id_async', mock_fetch_download_id), \
+            patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body):
+        spider = AsyncSpider(root_path='/', max_depth=1, apps_to_fetch=2, app_retries=build_retries(max_retries=2))
+        apps = crawl(spider)
+
+    # App is given up after its retries
+    assert sorted(app.path for app in apps) == [
+        '/apk/bar/bar-download/',
+        '/apk/baz/baz-download/',
+    ]
+    assert spider.app_retries.stats.given_up == {'error': 1}
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+@patch('crawler.async_spider.App.download_file_async', mock_noop)
+@patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body)
+def test_broken_app_skipped():
+    async def mock_fetch_download_id(app, session):
+        if app.path == '/apk/foo/foo-download/':
+            raise ValueError('broken')
+
+    # Slots of broken app are freed for the rest
+    with patch('crawler.async_spider.App.fetch_download_id_async', mock_fetch_download_id):
+        spider = AsyncSpider(root_path='/', max_depth=1, apps_to_fetch=2, max_concurrent_downloads=1)
+        apps = crawl(spider)
+
+    assert sorted(app.path for app in apps) == [
+        '/apk/bar/bar-download/',
+        '/apk/baz/baz-download/',
+    ]
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+@patch('crawler.async_spider.App.download_file_async', mock_noop)
+@patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body)
+def test_failed_app_retried():
+    failures = {'/apk/foo/foo-download/': 2}
+
+    async def mock_fetch_download_id(app, session):
+        if failures.get(app.path):
+            failures[app.path] -= 1
+            raise DownloadError
+
+    with patch('crawler.async_spider.App.fetch_download_id_async', mock_fetch_download_id):
+        spider = AsyncSpider(root_path='/', max_depth=1, max_concurrent_downloads=1,
+                             app_retries=build_retries(max_retries=2))
+        apps = crawl(spider)
+
+    assert sorted(app.path for app in apps) == [
+        '/apk/bar/bar-download/',
+        '/apk/baz/baz-download/',
+        '/apk/foo/foo-download/',
+    ]
+    assert spider.app_retries.stats.scheduled == {'error': 2}
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+def test_max_retries_count():
+    mock_fetch = MagicMock(side_effect=DownloadError)
+
+    async def mock_fetch_body_failing(page, session):
+        mock_fetch(page.path)
+
+    with patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body_failing):
+        spider = AsyncSpider(root_path='/', retries=build_retries(max_retries=3))
+        apps = crawl(spider)
+
+    assert apps == []
+    # The first try and three retries
+    assert mock_fetch.call_count == 4
+
+
+@patch('crawler.async_spider.AsyncProxiedSession', MockSession)
+def test_retry_delay():
+    mock_fetch = MagicMock(side_effect=DownloadError)
+
+    async def mock_fetch_body_failing(page, session):
+        mock_fetch(monotonic())
+
+    retries = RetryQueue(policies={'error': RetryPolicy(max_retries=1, base_delay=0.05, max_delay=0.05, jitter=0)})
+
+    with patch('crawler.async_spider.Page.fetch_body_async', mock_fetch_body_failing):
+        crawl(AsyncSpider(root_path='/', retries=retries))
+
+    # Page is retried after delay of policy, not right away
+    first, second = (call.args[0] for call in mock_fetch.call_args_list)
+    assert second - first >= 0.05
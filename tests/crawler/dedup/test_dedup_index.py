@@ -0,0 +1,75 @@
+import sqlite3
+
+from crawler.dedup import DEEP, SHALLOW, DedupIndex
+from crawler.structs import File
+
+MOCK_FILES = [
+    File(archive_name='foo.apk', file_name='classes.dex', mime_type='application/dex',
+         size_deflated=10, size_compressed=5),
+    File(archive_name='foo.apk', file_name='AndroidManifest.xml', mime_type='application/xml',
+         size_deflated=20, size_compressed=10, crc=0x1234abcd),
+]
+
+MOCK_DEEP_FILES = [
+    File(archive_name='foo.apk', file_name='classes.dex', mime_type='application/dex',
+         size_deflated=10, size_compressed=5, crc=0xabcd1234, sha256='a' * 64),
+]
+
+
+def test_lookup(tmp_path):
+    path = str(tmp_path / 'dedup.sqlite3')
+
+    index = DedupIndex(path)
+    assert index.lookup_download(1) is None
+    index.record(1, 'hash', 'foo.apk', MOCK_FILES)
+    index.close()
+
+    # Index persists across runs
+    index = DedupIndex(path)
+    archive = index.lookup_download(1)
+    assert archive.files == MOCK_FILES
+    assert archive.archive_name == 'foo.apk'
+    assert index.lookup_content('hash').files == MOCK_FILES
+    assert index.stats.download_hits == 1
+    assert index.stats.content_hits == 1
+
+
+def test_link_download(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite3'))
+    index.record(1, 'hash', 'foo.apk', MOCK_FILES)
+    index.link_download(2, 'hash')
+
+    assert index.lookup_download(2).files == MOCK_FILES
+
+
+def test_inspection_mode(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite3'))
+    index.record(1, 'hash', 'foo.apk', MOCK_FILES, SHALLOW)
+
+    # Shallow listing isn't replayed instead of deep inspection
+    assert index.lookup_download(1, DEEP) is None
+    assert index.lookup_content('hash', DEEP) is None
+    # CRC of listing is kept without SHA-256
+    assert index.lookup_download(1, SHALLOW).files == MOCK_FILES
+
+    # Deep inspection replaces shallow listing
+    index.record(1, 'hash', 'foo.apk', MOCK_DEEP_FILES, DEEP)
+    assert index.lookup_download(1, DEEP).files == MOCK_DEEP_FILES
+    assert index.lookup_download(1, SHALLOW) is None
+
+
+def test_migration(tmp_path):
+    path = str(tmp_path / 'dedup.sqlite3')
+    connection = sqlite3.connect(path)
+    connection.executescript(
+        'CREATE TABLE downloads (download_id INTEGER PRIMARY KEY, content_hash TEXT NOT NULL);'
+        'CREATE TABLE archives (content_hash TEXT PRIMARY KEY, archive_name TEXT NOT NULL, files TEXT NOT NULL);'
+        "INSERT INTO downloads VALUES (1, 'hash');"
+        "INSERT INTO archives VALUES ('hash', 'foo.apk', '[]');")
+    connection.close()
+
+    # Archives of unknown inspection mode are analysed again
+    index = DedupIndex(path)
+    assert index.lookup_download(1, SHALLOW) is None
+    index.record(1, 'hash', 'foo.apk', MOCK_FILES, SHALLOW)
+    assert index.lookup_download(1, SHALLOW).files == MOCK_FILES
@@ -0,0 +1,136 @@
+import sqlite3
+
+from crawler.distributed import WorkQueue, APP, PAGE, get_worker_path, get_worker_proxies
+from crawler.errors import DownloadError
+from crawler.retry import RetryPolicy
+
+
+def build_policies(max_retries, delay=0):
+    return {'error': RetryPolicy(max_retries=max_retries, base_delay=delay, max_delay=delay, jitter=0)}
+
+
+def build_queue(tmp_path, **kwargs):
+    kwargs.setdefault('policies', build_policies(max_retries=0))
+    return WorkQueue(str(tmp_path / 'queue.sqlite3'), **kwargs)
+
+
+def test_dedup(tmp_path):
+    queue = build_queue(tmp_path)
+    queue.put_pages([('/', 0), ('/page/2/', 1)])
+    queue.put_pages([('/page/2/', 1)])
+    queue.put_apps(['/apk/foo-download/', '/apk/foo-download/'])
+
+    assert queue.stats() == {'page_pending': 2, 'app_pending': 1}
+
+
+def test_apps_claimed_first(tmp_path):
+    queue = build_queue(tmp_path)
+    queue.put_pages([('/', 0)])
+    queue.put_apps(['/apk/foo-download/'])
+
+    assert queue.claim('worker').kind == APP
+    assert queue.claim('worker').kind == PAGE
+    assert queue.claim('worker') is None
+
+
+def test_apps_to_fetch(tmp_path):
+    queue = build_queue(tmp_path, apps_to_fetch=1)
+    queue.put_apps(['/apk/foo-download/', '/apk/bar-download/'])
+
+    task = queue.claim('worker')
+    assert queue.claim('worker') is None
+
+    # Failed app frees its slot
+    queue.fail(task, DownloadError())
+    task = queue.claim('worker')
+    assert task.kind == APP
+
+    queue.complete(task)
+    assert queue.is_finished()
+
+
+def test_skipped_apps_not_counted(tmp_path):
+    queue = build_queue(tmp_path, apps_to_fetch=1)
+    queue.put_apps(['/apk/foo-download/', '/apk/bar-download/'])
+
+    queue.skip(queue.claim('worker'))
+    assert not queue.is_finished()
+
+    queue.complete(queue.claim('worker'))
+    assert queue.is_finished()
+    assert queue.stats() == {'app_skipped': 1, 'app_done': 1}
+
+
+def test_retries(tmp_path):
+    queue = build_queue(tmp_path, policies=build_policies(max_retries=1))
+    queue.put_pages([('/', 0)])
+    queue.put_apps(['/apk/foo-download/'])
+
+    for kind in (APP, PAGE):
+        task = queue.claim('worker')
+        assert task.kind == kind
+        assert queue.fail(task, DownloadError())
+
+        task = queue.claim('worker')
+        assert (task.kind, task.retries_count) == (kind, 1)
+        assert not queue.fail(task, DownloadError())
+
+    assert queue.claim('worker') is None
+    assert queue.is_finished()
+    assert queue.stats() == {'page_failed': 1, 'app_failed': 1}
+
+
+def test_retry_delay(tmp_path):
+    policies = build_policies(max_retries=1)
+    policies['server'] = RetryPolicy(max_retries=1, base_delay=60, max_delay=60, jitter=0)
+    queue = build_queue(tmp_path, policies=policies)
+    queue.put_pages([('/', 0), ('/page/2/', 1)])
+
+    queue.fail(queue.claim('worker'), DownloadError(status_code=503))
+
+    # Task isn't claimed before it's due,
+    # but other tasks are claimed meanwhile
+    task = queue.claim('worker')
+    assert task.path == '/'
+    queue.complete(task)
+
+    assert queue.claim('worker') is None
+    assert not queue.is_finished()
+
+
+def test_migration(tmp_path):
+    path = str(tmp_path / 'queue.sqlite3')
+    connection = sqlite3.connect(path)
+    connection.execute(
+        'CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, '
+        'path TEXT NOT NULL, recursion_level INTEGER NOT NULL, retries_count INTEGER NOT NULL DEFAULT 0, '
+        'state TEXT NOT NULL, worker TEXT, claimed_at REAL, UNIQUE (kind, path))')
+    connection.execute("INSERT INTO tasks (kind, path, recursion_level, state) VALUES ('page', '/', 0, 'pending')")
+    connection.commit()
+    connection.close()
+
+    # Queue file of older version is still claimed from
+    queue = build_queue(tmp_path)
+    assert queue.claim('worker').path == '/'
+
+
+def test_requeue_stale(tmp_path):
+    queue = build_queue(tmp_path)
+    queue.put_pages([('/', 0)])
+    queue.claim('worker')
+
+    assert not queue.is_finished()
+    assert queue.requeue_stale(timeout=-1) == 1
+    assert queue.claim('worker').path == '/'
+
+
+def test_worker_proxies():
+    proxies = ['a', 'b', 'c']
+    assert get_worker_proxies(0, 2, proxies) == ['a', 'c']
+    assert get_worker_proxies(1, 2, proxies) == ['b']
+    assert get_worker_proxies(3, 4, proxies) == ['a']
+
+
+def test_worker_path():
+    assert get_worker_path('metrics.json', 'worker-1') == 'metrics.worker-1.json'
+    assert get_worker_path('/tmp/crawl.prof', 'worker-0') == '/tmp/crawl.worker-0.prof'
@@ -0,0 +1,117 @@
+from unittest.mock import patch, MagicMock
+from zipfile import BadZipFile
+
+from crawler.distributed import WorkQueue, Worker, run_worker
+from crawler.errors import DownloadError
+from crawler.structs import File, FileBatch
+from tests.helpers import build_extract_links
+
+MOCK_LINKS = {
+    '/': ['/page/2/'],
+    '/page/2/': [],
+}
+
+MOCK_APP_LINKS = {
+    '/': ['/apk/foo-download/'],
+    '/page/2/': ['/apk/foo-download/', '/apk/bar-download/'],
+}
+
+mock_extract_links = build_extract_links(MOCK_LINKS, MOCK_APP_LINKS)
+
+
+def mock_fetch_body(page):
+    if page.path not in MOCK_LINKS:
+        raise DownloadError
+
+
+@patch('crawler.distributed.config', MagicMock(max_depth=5, metadata_only=False))
+@patch('crawler.distributed.App.batch', lambda app: FileBatch.from_files([File(archive_name=app.path)]))
+@patch('crawler.distributed.App.download_file', lambda app: None)
+@patch('crawler.distributed.App.fetch_download_id', lambda app: None)
+@patch('crawler.distributed.Page.extract_links', mock_extract_links)
+@patch('crawler.distributed.Page.fetch_body', mock_fetch_body)
+def test_basic(tmp_path):
+    queue_path = str(tmp_path / 'queue.sqlite3')
+    output_path = str(tmp_path / 'files.txt')
+
+    queue = WorkQueue(queue_path, apps_to_fetch=10)
+    queue.put_pages([('/', 0)])
+
+    with patch('crawler.distributed.WorkQueue', lambda path: WorkQueue(path, apps_to_fetch=10)):
+        Worker(queue_path=queue_path, name='worker', proxies=['foo'],
+               output_path=output_path, poll_interval=0).run()
+
+    assert queue.is_finished()
+    assert queue.stats() == {'page_done': 2, 'app_done': 2}
+    with open(output_path) as output:
+        assert sorted(output.read().splitlines()) == [
+            File(archive_name='/apk/bar-download/').dumps(add_newline=False),
+            File(archive_name='/apk/foo-download/').dumps(add_newline=False),
+        ]
+
+
+def mock_batch(app):
+    if app.path == '/apk/bar-download/':
+        raise BadZipFile('File is not a zip file')
+    return FileBatch.from_files([File(archive_name=app.path)])
+
+
+def mock_skip_known_download(app):
+    return app.path == '/apk/foo-download/'
+
+
+@patch('crawler.distributed.config', MagicMock(max_depth=5, metadata_only=False))
+@patch('crawler.distributed.get_seen_index', lambda: MagicMock(skip_known_download=mock_skip_known_download))
+@patch('crawler.distributed.App.batch', mock_batch)
+@patch('crawler.distributed.App.download_file', lambda app: None)
+@patch('crawler.distributed.App.fetch_download_id', lambda app: None)
+@patch('crawler.distributed.Page.extract_links', mock_extract_links)
+@patch('crawler.distributed.Page.fetch_body', mock_fetch_body)
+def test_skipped_and_broken_apps(tmp_path):
+    queue_path = str(tmp_path / 'queue.sqlite3')
+    queue = WorkQueue(queue_path)
+    queue.put_pages([('/', 0)])
+
+    with patch('crawler.distributed.WorkQueue', lambda path: WorkQueue(path, apps_to_fetch=10)):
+        Worker(queue_path=queue_path, name='worker', proxies=['foo'],
+               output_path=str(tmp_path / 'files.txt'), poll_interval=0).run()
+
+    # Broken APK fails its own task only, and isn't retried
+    assert queue.stats() == {'page_done': 2, 'app_skipped': 1, 'app_failed': 1}
+
+
+def mock_broken_extract_links(page, parser=None):
+    if page.path == '/page/2/':
+        raise AssertionError('Unexpected markup')
+    mock_extract_links(page, parser)
+
+
+@patch('crawler.distributed.config', MagicMock(max_depth=5, metadata_only=False))
+@patch('crawler.distributed.App.batch', lambda app: FileBatch.from_files([File(archive_name=app.path)]))
+@patch('crawler.distributed.App.download_file', lambda app: None)
+@patch('crawler.distributed.App.fetch_download_id', lambda app: None)
+@patch('crawler.distributed.Page.extract_links', mock_broken_extract_links)
+@patch('crawler.distributed.Page.fetch_body', mock_fetch_body)
+def test_unexpected_error(tmp_path):
+    queue_path = str(tmp_path / 'queue.sqlite3')
+    queue = WorkQueue(queue_path)
+    queue.put_pages([('/', 0)])
+
+    with patch('crawler.distributed.WorkQueue', lambda path: WorkQueue(path, apps_to_fetch=10)):
+        Worker(queue_path=queue_path, name='worker', proxies=['foo'],
+               output_path=str(tmp_path / 'files.txt'), poll_interval=0).run()
+
+    # Page is failed without retries, and worker goes on with other tasks
+    assert queue.stats() == {'page_done': 1, 'page_failed': 1, 'app_done': 1}
+
+
+def test_run_worker_reports_own_metrics(tmp_path):
+    dump_path = str(tmp_path / 'metrics.json')
+
+    with patch.multiple('crawler.distributed.config', proxies=['foo', 'bar'], metrics_port=None,
+                        metrics_dump_path=dump_path, profiler=None), \
+            patch('crawler.distributed.Worker') as mock_worker:
+        run_worker(str(tmp_path / 'queue.sqlite3'), index=1, workers_count=2)
+
+    mock_worker.assert_called_once_with(queue_path=str(tmp_path / 'queue.sqlite3'), name='worker-1', proxies=['bar'])
+    assert (tmp_path / 'metrics.worker-1.json').exists()
@@ -0,0 +1,16 @@
+from crawler.download_id_cache import DownloadIdCache
+
+
+def test_get(tmp_path):
+    path = str(tmp_path / 'download_ids.sqlite3')
+
+    cache = DownloadIdCache(path)
+    assert cache.get('/apk/foo/') is None
+    cache.put('/apk/foo/', 1)
+    cache.close()
+
+    # Cache persists across runs
+    cache = DownloadIdCache(path)
+    assert cache.get('/apk/foo/') == 1
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 0
@@ -0,0 +1,65 @@
+from unittest.mock import patch
+
+from crawler.frontier_store import FrontierStore
+from crawler.spider import Spider
+from tests.helpers import build_extract_links
+
+MOCK_LINKS = {
+    '/': ['/page/1/', '/page/2/'],
+    '/page/1/': ['/page/3/'],
+    '/page/2/': [],
+    '/page/3/': [],
+}
+
+
+mock_extract_links = build_extract_links(MOCK_LINKS)
+
+
+@patch('crawler.spider.Page.extract_links', mock_extract_links)
+@patch('crawler.spider.Page.fetch_body', lambda page: None)
+def test_resume(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite3')
+
+    with FrontierStore(path, commit_interval=1) as store:
+        spider = Spider(root_path='/', store=store)
+        crawled = iter(spider)
+        first_pages = [next(crawled).path, next(crawled).path]
+
+    with FrontierStore(path, commit_interval=1) as store:
+        spider = Spider(root_path='/', store=store)
+        assert spider.visited_pages == {'/', '/page/1/', '/page/2/'}
+        rest_pages = [page.path for page in spider]
+
+    # Second page was not done yet, so it's crawled again
+    assert first_pages[1] in rest_pages
+    assert set(first_pages + rest_pages) == set(MOCK_LINKS)
+    assert len(rest_pages) == 3
+
+
+def test_retries_count(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite3')
+
+    with FrontierStore(path) as store:
+        store.push('/', 0, 0, priority=0.0, position=1)
+        store.push('/page/1/', 1, 0, priority=0.0, position=0)
+        store.push('/page/2/', 1, 2, priority=0.0, position=2)
+        store.mark_done('/', 0)
+
+    with FrontierStore(path) as store:
+        assert list(store.frontier()) == [
+            ('/page/1/', 1, 0, 0.0, 0),
+            ('/page/2/', 1, 2, 0.0, 2),
+        ]
+        assert set(store.visited()) == {'/', '/page/1/', '/page/2/'}
+
+
+def test_batched_commits(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite3')
+    store = FrontierStore(path, commit_interval=3, commit_timeout=60)
+
+    store.push('/', 0, 0, priority=0.0, position=0)
+    store.push('/page/1/', 1, 0, priority=0.0, position=-1)
+    assert FrontierStore(path).is_empty()
+
+    store.push('/page/2/', 1, 0, priority=0.0, position=-2)
+    assert not FrontierStore(path).is_empty()
@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+from crawler.http_cache import HttpCache
+
+MOCK_URL = 'http://www.apkmirror.com/page/2/'
+MOCK_HEADERS = {'ETag': '"foo"', 'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'}
+
+
+def test_hit(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=1024, ttls={'/': 60})
+    assert cache.lookup(MOCK_URL) is None
+
+    cache.store(MOCK_URL, 'привет'.encode(), encoding='utf-8', headers=MOCK_HEADERS)
+    entry = cache.lookup(MOCK_URL)
+
+    assert cache.is_fresh(entry)
+    assert cache.read(entry) == 'привет'
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 1
+
+
+def test_ttl_prefix(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=1024, ttls={'/': 60, '/page/': 0})
+
+    assert cache.get_ttl('http://www.apkmirror.com/') == 60
+    assert cache.get_ttl(MOCK_URL) == 0
+
+    cache.store(MOCK_URL, b'foo')
+    assert not cache.is_fresh(cache.lookup(MOCK_URL))
+
+
+def test_revalidation(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=1024, ttls={'/': 60})
+    cache.store(MOCK_URL, b'foo', headers=MOCK_HEADERS)
+
+    entry = cache.lookup(MOCK_URL)
+    assert cache.conditional_headers(entry) == {
+        'If-None-Match': '"foo"',
+        'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT',
+    }
+
+    with patch('crawler.http_cache.time', return_value=entry.fetched_at + 120):
+        assert not cache.is_fresh(entry)
+        assert cache.read(entry, revalidated=True) == 'foo'
+        assert cache.is_fresh(cache.lookup(MOCK_URL))
+
+    assert cache.stats.revalidations == 1
+
+
+def test_revalidation_validators(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=1024, ttls={'/': 0})
+    cache.store(MOCK_URL, b'foo', headers=MOCK_HEADERS)
+
+    cache.read(cache.lookup(MOCK_URL), revalidated=True, headers={'ETag': '"bar"'})
+    assert cache.conditional_headers(cache.lookup(MOCK_URL)) == {
+        'If-None-Match': '"bar"',
+        'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT',
+    }
+
+
+def test_lost_body(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=1024, ttls={'/': 60})
+    cache.store(MOCK_URL, b'foo')
+    for path in (tmp_path / 'bodies').glob('*/*'):
+        path.unlink()
+
+    assert cache.read(cache.lookup(MOCK_URL)) is None
+    assert cache.lookup(MOCK_URL) is None
+    assert cache.total_size == 0
+
+
+def test_content_addressed(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=1024, ttls={'/': 60})
+    cache.store(MOCK_URL, b'foo')
+    cache.store('http://www.apkmirror.com/page/3/', b'foo')
+
+    bodies = list((tmp_path / 'bodies').glob('*/*'))
+    assert len(bodies) == 1
+
+
+def test_lru_eviction(tmp_path):
+    cache = HttpCache(str(tmp_path), max_size=8, ttls={'/': 60})
+
+    with patch('crawler.http_cache.time', return_value=1):
+        cache.store('http://www.apkmirror.com/page/1/', b'1111')
+    with patch('crawler.http_cache.time', return_value=2):
+        cache.store('http://www.apkmirror.com/page/2/', b'2222')
+    with patch('crawler.http_cache.time', return_value=3):
+        cache.read(cache.lookup('http://www.apkmirror.com/page/1/'))
+        cache.store('http://www.apkmirror.com/page/3/', b'3333')
+
+    assert cache.lookup('http://www.apkmirror.com/page/1/')
+    assert cache.lookup('http://www.apkmirror.com/page/2/') is None
+    assert cache.lookup('http://www.apkmirror.com/page/3/')
+    assert cache.stats.evictions == 1
+    assert len(list((tmp_path / 'bodies').glob('*/*'))) == 2
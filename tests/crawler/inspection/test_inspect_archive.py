@@ -0,0 +1,118 @@
+import hashlib
+import io
+import zlib
+from tempfile import NamedTemporaryFile
+from unittest.mock import patch
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+from crawler.app import App
+from crawler.inspection import InspectionStats, inspect_archive
+from crawler.metrics import MetricsRegistry
+
+MANIFEST = b'Manifest-Version: 1.0\n'
+
+
+def build_zip(entries, compression=ZIP_STORED) -> bytes:
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w', compression=compression) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def build_apk() -> bytes:
+    deepest = build_zip({'deepest.txt': b'foo'})
+    inner = build_zip({'META-INF/MANIFEST.MF': MANIFEST, 'deeper.zip': deepest})
+    split = build_zip({'classes.dex': b'dex\n035\x00'})
+    return build_zip({
+        'classes.dex': b'dex\n035\x00',
+        'classes2.dex': b'dex\n035\x00',
+        'lib/inner.jar': inner,
+        'split_config.arm64_v8a.apk': split,
+        'assets/fake.zip': b'not an archive',
+    })
+
+
+def inspect(data, **kwargs):
+    stats = InspectionStats()
+    with ZipFile(io.BytesIO(data)) as zipfile:
+        files = list(inspect_archive(zipfile, 'foo.apk', App._get_mime_type, stats, **kwargs))
+    return {file.file_name: file for file in files}, stats
+
+
+def test_nested_archives():
+    files, stats = inspect(build_apk(), max_depth=2, max_nested_size=2 ** 20)
+
+    assert set(files) == {
+        'classes.dex', 'classes2.dex', 'assets/fake.zip',
+        'lib/inner.jar', 'lib/inner.jar!/META-INF/MANIFEST.MF',
+        'lib/inner.jar!/deeper.zip', 'lib/inner.jar!/deeper.zip!/deepest.txt',
+        'split_config.arm64_v8a.apk', 'split_config.arm64_v8a.apk!/classes.dex',
+    }
+    assert stats.dex_count == 3
+    assert stats.nested_archives == 3
+
+    manifest = files['lib/inner.jar!/META-INF/MANIFEST.MF']
+    assert manifest.archive_name == 'foo.apk'
+    assert manifest.sha256 == hashlib.sha256(MANIFEST).hexdigest()
+    assert manifest.crc == zlib.crc32(MANIFEST)
+
+
+def test_limits():
+    files, stats = inspect(build_apk(), max_depth=1, max_nested_size=2 ** 20)
+    assert 'lib/inner.jar!/deeper.zip' in files
+    assert 'lib/inner.jar!/deeper.zip!/deepest.txt' not in files
+
+    files, stats = inspect(build_apk(), max_depth=2, max_nested_size=1)
+    assert stats.nested_archives == 0
+    assert files['lib/inner.jar'].sha256 is not None
+
+
+def test_nested_archives_not_extracted(tmp_path):
+    # Nested archives are read in place, nothing goes to scratch dir
+    with patch('crawler.inspection.config.scratch_dir', str(tmp_path)):
+        files, stats = inspect(build_apk(), max_depth=2, max_nested_size=2 ** 20)
+
+    assert 'lib/inner.jar!/deeper.zip!/deepest.txt' in files
+    assert stats.nested_archives == 3
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_deflated_nested_archive():
+    inner = build_zip({'META-INF/MANIFEST.MF': MANIFEST}, compression=ZIP_DEFLATED)
+    files, stats = inspect(build_zip({'lib/inner.jar': inner}, compression=ZIP_DEFLATED))
+
+    # Compressed entry stream is seeked by nested ZipFile as well
+    assert files['lib/inner.jar!/META-INF/MANIFEST.MF'].sha256 == hashlib.sha256(MANIFEST).hexdigest()
+    assert stats.nested_archives == 1
+
+
+def test_broken_entry():
+    data = build_zip({'foo.txt': b'hello world', 'bar.txt': b'bar'})
+    data = data.replace(b'hello world', b'hello wordl')
+
+    files, stats = inspect(data)
+    assert files['foo.txt'].sha256 is None
+    assert files['bar.txt'].sha256 == hashlib.sha256(b'bar').hexdigest()
+    assert stats.broken_entries == 1
+
+
+@patch('crawler.app.config.deep_inspection', True)
+def test_app_iterator():
+    app = App(path='/apk/foo-download/')
+    app.filename = 'foo.apk'
+    app.tempfile = NamedTemporaryFile()
+    app.tempfile.write(build_apk())
+    app.tempfile.flush()
+
+    registry = MetricsRegistry()
+    with patch('crawler.app.metrics', registry):
+        files = list(app)
+
+    assert len(files) == 9
+    assert app.inspection.dex_count == 3
+    # Counts are exported per app
+    assert registry.counter('dex_files_total').get() == 3
+    assert registry.counter('nested_archives_total').get() == 3
+    assert registry.histogram('apk_dex_files').count == 1
+    assert files[0].dumps().endswith('%08x – %s\n' % (files[0].crc, files[0].sha256))
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import pstats
+import tracemalloc
+from dataclasses import dataclass
+from unittest.mock import patch
+from urllib.request import urlopen
+
+import pytest
+
+from crawler.metrics import MetricsDumper, MetricsRegistry, MetricsServer, profiling
+
+
+@dataclass
+class FakeStats:
+    hits: int = 3
+    misses: int = 1
+    name: str = 'ignored'
+
+
+def test_counter_labels():
+    registry = MetricsRegistry()
+    registry.inc('proxy_errors_total', proxy='foo')
+    registry.inc('proxy_errors_total', 2, proxy='foo')
+    registry.inc('proxy_errors_total', proxy='bar')
+
+    counter = registry.counter('proxy_errors_total')
+    assert counter.get(proxy='foo') == 3
+    assert counter.get(proxy='bar') == 1
+    assert counter.get(proxy='baz') == 0
+
+
+def test_metric_type_conflict():
+    registry = MetricsRegistry()
+    registry.inc('pages_total')
+    with pytest.raises(AssertionError):
+        registry.observe('pages_total', 1.0)
+
+
+def test_histogram_render():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('page_fetch_seconds', 'Page fetch latency', buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines == [
+        '# HELP crawler_page_fetch_seconds Page fetch latency',
+        '# TYPE crawler_page_fetch_seconds histogram',
+        'crawler_page_fetch_seconds_bucket{le="0.1"} 1',
+        'crawler_page_fetch_seconds_bucket{le="1.0"} 3',
+        'crawler_page_fetch_seconds_bucket{le="+Inf"} 4',
+        'crawler_page_fetch_seconds_sum 6.25',
+        'crawler_page_fetch_seconds_count 4',
+    ]
+
+
+def test_label_escaping():
+    registry = MetricsRegistry()
+    registry.set('proxy_score', 0.5, proxy='http://"foo"')
+    assert 'crawler_proxy_score{proxy="http://\\"foo\\""} 0.5' in registry.render()
+
+
+def test_export_rates():
+    registry = MetricsRegistry()
+    registry.inc('pages_total', 10)
+    registry.set('frontier_pages', 4)
+
+    with patch('crawler.metrics.monotonic', lambda: registry.started_at + 5):
+        exported = registry.export()
+
+    assert exported['uptime'] == 5
+    assert exported['pages_total'] == 10
+    assert exported['frontier_pages'] == 4
+    assert exported['rates'] == {'pages_total': 2.0}
+
+
+def test_timed():
+    registry = MetricsRegistry()
+
+    @registry.timed('parse_seconds')
+    def parse(value):
+        return value * 2
+
+    @registry.timed('fetch_seconds')
+    async def fetch(value):
+        return value * 3
+
+    assert parse(2) == 4
+    assert asyncio.run(fetch(2)) == 6
+    assert registry.histogram('parse_seconds').count == 1
+    assert registry.histogram('fetch_seconds').count == 1
+
+
+def test_register_stats():
+    registry = MetricsRegistry()
+    stats = FakeStats()
+    registry.register_stats('cache', lambda: stats)
+    registry.register_stats('unused', lambda: None)
+
+    stats.hits += 1
+    exported = registry.export()
+    assert exported['cache_hits'] == 4
+    assert exported['cache_misses'] == 1
+    assert 'cache_name' not in exported
+    assert not any(name.startswith('unused') for name in exported)
+
+
+def test_server():
+    registry = MetricsRegistry()
+    registry.inc('pages_total', 7)
+
+    with MetricsServer(port=0, registry=registry) as server:
+        port = server.server.server_address[1]
+        with urlopen('http://127.0.0.1:%s/metrics' % port) as response:
+            body = response.read().decode()
+
+    assert 'crawler_pages_total 7' in body.splitlines()
+
+
+def test_dumper(tmp_path):
+    registry = MetricsRegistry()
+    path = str(tmp_path / 'metrics.json')
+
+    with MetricsDumper(path=path, interval=60, registry=registry):
+        registry.inc('apps_total', 3)
+
+    with open(path) as f:
+        assert json.load(f)['apps_total'] == 3
+
+
+def test_profiling_cprofile(tmp_path):
+    path = str(tmp_path / 'crawl.prof')
+    with profiling('cprofile', path):
+        sorted(range(1000), key=lambda x: -x)
+
+    assert pstats.Stats(path).total_calls > 0
+
+
+def test_profiling_tracemalloc(tmp_path):
+    path = str(tmp_path / 'crawl.tracemalloc')
+    with profiling('tracemalloc', path):
+        data = [bytes(1024) for _ in range(100)]
+
+    assert not tracemalloc.is_tracing()
+    assert tracemalloc.Snapshot.load(path).traces
+    del data
+
+
+def test_profiling_disabled(tmp_path):
+    with patch('crawler.metrics.config') as config:
+        config.profiler = None
+        with profiling():
+            ...
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,51 @@
+import mimetypes
+import pathlib
+from zipfile import ZipInfo
+
+from crawler.config import config
+from crawler.mime import get_extension, get_mime_type, get_mime_types, _get_extension_mime_type
+
+FILENAMES = [
+    'AndroidManifest.xml', 'res/drawable/icon.png', 'assets/index.html', 'assets/data.json',
+    'assets/archive.tar.gz', 'assets/file.gz', 'assets/IMAGE.PNG', 'META-INF/MANIFEST',
+    'res/raw/.hidden', 'res/raw/file.', 'res/dir.d/file', 'model.binaryproto',
+]
+
+
+def legacy_get_mime_type(filename):
+    mime_type, _ = mimetypes.guess_type(filename, strict=True)
+    if mime_type:
+        return mime_type
+
+    suffix = pathlib.Path(filename).suffix
+    if suffix:
+        return 'application/{}'.format(suffix[1:])
+    return config.unknown_mime_failback
+
+
+def test_android_types():
+    assert get_mime_type('classes.dex') == 'application/vnd.android.dex'
+    assert get_mime_type('resources.arsc') == 'application/vnd.android.arsc'
+    assert get_mime_type('lib/arm64-v8a/libfoo.so') == 'application/x-sharedlib'
+    assert get_mime_type('split_config.APK') == 'application/vnd.android.package-archive'
+
+
+def test_same_as_legacy():
+    for filename in FILENAMES:
+        assert get_mime_type(filename) == legacy_get_mime_type(filename), filename
+
+
+def test_extension():
+    assert get_extension('assets/archive.tar.gz') == '.tar.gz'
+    assert get_extension('assets/.tar.gz') == '.gz'
+    assert get_extension('res/dir.d/file') == ''
+    assert get_extension('.bashrc') == ''
+
+
+def test_batch():
+    infolist = [ZipInfo(filename) for filename in FILENAMES + ['classes.dex', 'classes2.dex']]
+    assert get_mime_types(infolist) == [get_mime_type(zipinfo.filename) for zipinfo in infolist]
+
+
+def test_bounded_cache():
+    assert _get_extension_mime_type.cache_info().maxsize is not None
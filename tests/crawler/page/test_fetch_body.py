@@ -0,0 +1,69 @@
+from unittest.mock import patch, MagicMock
+
+from crawler.http_cache import HttpCache
+from crawler.page import Page
+from tests.helpers import build_proxied_session
+
+
+def build_session(status_code, text=''):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    response.content = text.encode()
+    response.encoding = 'utf-8'
+    response.headers = {'ETag': '"foo"'}
+
+    return build_proxied_session(response)
+
+
+def test_cache_miss_and_revalidation(tmp_path):
+    cache = HttpCache(str(tmp_path), ttls={'/': 0})
+
+    mock_proxied_session, session = build_session(200, '<html>foo</html>')
+    with patch('crawler.page.get_http_cache', return_value=cache), \
+            patch('crawler.page.ProxiedSession', mock_proxied_session):
+        Page('/page/2/').fetch_body()
+
+    mock_proxied_session, session = build_session(304)
+    with patch('crawler.page.get_http_cache', return_value=cache), \
+            patch('crawler.page.ProxiedSession', mock_proxied_session):
+        page = Page('/page/2/')
+        page.fetch_body()
+
+    assert page.html == '<html>foo</html>'
+    assert session.get.call_args[1]['headers'] == {'If-None-Match': '"foo"'}
+
+
+def test_fresh_cache_hit(tmp_path):
+    cache = HttpCache(str(tmp_path), ttls={'/': 60})
+    cache.store(Page('/page/2/').absolute_url, b'<html>foo</html>')
+
+    mock_proxied_session, session = build_session(200)
+    with patch('crawler.page.get_http_cache', return_value=cache), \
+            patch('crawler.page.ProxiedSession', mock_proxied_session):
+        page = Page('/page/2/')
+        page.fetch_body()
+
+    assert page.html == '<html>foo</html>'
+    session.get.assert_not_called()
+
+
+def test_lost_cached_body(tmp_path):
+    cache = HttpCache(str(tmp_path), ttls={'/': 0})
+    cache.store(Page('/page/2/').absolute_url, b'<html>foo</html>', headers={'ETag': '"foo"'})
+    for path in (tmp_path / 'bodies').glob('*/*'):
+        path.unlink()
+
+    not_modified = MagicMock(status_code=304)
+    modified = MagicMock(status_code=200, text='<html>bar</html>', content=b'<html>bar</html>',
+                         encoding='utf-8', headers={})
+    mock_proxied_session, session = build_proxied_session(get=MagicMock(side_effect=[not_modified, modified]))
+    with patch('crawler.page.get_http_cache', return_value=cache), \
+            patch('crawler.page.ProxiedSession', mock_proxied_session):
+        page = Page('/page/2/')
+        page.fetch_body()
+
+    # Page is fetched again without conditional headers
+    assert page.html == '<html>bar</html>'
+    assert session.get.call_args_list[1][1].get('headers') is None
+    assert cache.read(cache.lookup(page.absolute_url)) == '<html>bar</html>'
@@ -0,0 +1,97 @@
+import pytest
+
+from crawler.page import Page
+from crawler.parsers import get_parser, BeautifulSoupParser, ShortlinkScanner, StreamingParser
+
+MOCK_HTML = '''
+<!DOCTYPE html>
+<html>
+<head>
+    <link rel='stylesheet' href='/style.css'>
+    <LINK REL="shortlink other" HREF="https://www.apkmirror.com/?p=913765"/>
+    <link rel='shortlink' href='https://www.apkmirror.com/?p=1'>
+    <script>var a = '<a href="/apk/script-download/">';</script>
+</head>
+<body>
+    <!-- <a href="/apk/commented-download/"> -->
+    <a href="/apk/foo/foo-download/">foo</a>
+    <A HREF="/page/2/">next</A>
+    <a href="/apk/bar/?a=1&amp;b=2">bar</a>
+    <a href="/apk/baz/" href="/apk/baz/baz-download/">baz</a>
+    <a href>empty</a>
+    <a name="anchor">no href</a>
+    <a href="https://example.com/apk/external-download/">external</a>
+    <a href="http://www.apkmirror.com/apk/absolute/absolute-download/"/>
+    <a href="/apk/unclosed/"
+</body>
+</html>
+'''
+
+
+def extract_links(parser_name):
+    page = Page('foo')
+    page.html = MOCK_HTML
+
+    page.extract_links(parser=get_parser(parser_name))
+
+    return page.app_links, page.page_links
+
+
+@pytest.mark.parametrize('parser_name', ['stream', 'lxml'])
+def test_same_links(parser_name):
+    if parser_name == 'lxml':
+        pytest.importorskip('lxml')
+
+    assert extract_links(parser_name) == extract_links('bs4')
+
+
+def test_same_hrefs():
+    assert StreamingParser().hrefs(MOCK_HTML) == BeautifulSoupParser().hrefs(MOCK_HTML)
+
+
+def test_shortlink():
+    expected_shortlink = 'https://www.apkmirror.com/?p=913765'
+
+    assert BeautifulSoupParser().shortlink(MOCK_HTML) == expected_shortlink
+    assert StreamingParser().shortlink(MOCK_HTML) == expected_shortlink
+    assert StreamingParser().shortlink(MOCK_HTML.encode()) == expected_shortlink
+
+
+def test_no_shortlink():
+    assert BeautifulSoupParser().shortlink('<html></html>') is None
+    assert StreamingParser().shortlink('<html></html>') is None
+
+
+def scan(html, chunk_size, max_size=None):
+    scanner = ShortlinkScanner(max_size=max_size)
+    for start in range(0, len(html), chunk_size):
+        if scanner.feed(html[start:start + chunk_size]):
+            break
+    return scanner
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_shortlink_scanner(chunk_size):
+    html = MOCK_HTML.encode()
+    scanner = scan(html, chunk_size)
+
+    assert scanner.shortlink == StreamingParser().shortlink(MOCK_HTML)
+    # Tag is found in head, and the rest of page isn't needed
+    assert len(scanner.buffer) < len(html) or chunk_size > len(html)
+    assert len(scanner.buffer) < html.index(b'</head>') + chunk_size
+
+
+def test_shortlink_scanner_failure():
+    # Head is over
+    scanner = scan(b'<html><head><link rel="stylesheet"></head><body><link rel="shortlink" href="/?p=1">', 4)
+    assert scanner.done and scanner.shortlink is None
+
+    # Limit is reached
+    scanner = scan(b'<html><head>' + b' ' * 100 + b'<link rel="shortlink" href="/?p=1">', 10, max_size=50)
+    assert scanner.done and scanner.shortlink is None
+    assert len(scanner.buffer) == 50
+
+
+def test_get_parser():
+    assert isinstance(get_parser('stream'), StreamingParser)
+    assert isinstance(get_parser('bs4'), BeautifulSoupParser)
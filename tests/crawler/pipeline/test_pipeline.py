@@ -0,0 +1,162 @@
+import queue
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from crawler.errors import DownloadError, FileTooLargeError
+from crawler.pipeline import Pipeline, Stage
+from crawler.structs import AppState, FileBatch
+from tests.helpers import build_extract_links, build_retries
+
+MOCK_LINKS = {
+    '/': ['/page/1/', '/page/2/'],
+    '/page/1/': ['/page/3/', '/'],
+    '/page/2/': ['/page/3/', '/page/1/'],
+    '/page/3/': ['/page/4/'],
+    '/page/4/': [],
+}
+
+
+def app_path(path):
+    return '/apk/%s-download/' % path.strip('/').replace('/', '-')
+
+
+# Each page links to its own app and to app of root page
+mock_extract_links = build_extract_links(
+    {path: set(links) for path, links in MOCK_LINKS.items()},
+    {path: {app_path(path), app_path('/')} for path in MOCK_LINKS})
+
+
+def mock_batch(app):
+    app.state = AppState.LISTED
+    return FileBatch()
+
+
+def crawl(pipeline):
+    with patch('crawler.pipeline.Page.extract_links', mock_extract_links), \
+            patch('crawler.pipeline.App.fetch_download_id', MagicMock()), \
+            patch('crawler.pipeline.App.batch', mock_batch), \
+            pipeline:
+        return sorted(app.path for app in pipeline)
+
+
+@patch('crawler.pipeline.Page.fetch_body', MagicMock())
+@patch('crawler.pipeline.App.download_file', MagicMock())
+def test_crawl():
+    pipeline = Pipeline(root_path='/', max_depth=5, workers={'fetch': 2, 'download': 3}, queue_size=2)
+
+    # Apps, linked from several pages, are fetched once
+    assert crawl(pipeline) == sorted(app_path(path) for path in MOCK_LINKS)
+
+    stats = pipeline.stats
+    assert stats['fetch'].processed == len(MOCK_LINKS)
+    assert stats['download'].workers == 3
+    assert all(stage.busy == 0 and stage.queued == 0 for stage in stats.values())
+    assert not any(thread.is_alive() for stage in pipeline.stages.values() for thread in stage.threads)
+
+
+@patch('crawler.pipeline.Page.fetch_body', MagicMock())
+@patch('crawler.pipeline.App.download_file', MagicMock())
+def test_recursion_level():
+    pipeline = Pipeline(root_path='/', max_depth=1)
+    assert crawl(pipeline) == sorted(app_path(path) for path in ('/', '/page/1/', '/page/2/'))
+
+
+def test_retries():
+    failures = {'/page/2/': 1, app_path('/page/3/'): 2, app_path('/page/4/'): 5}
+
+    def fail(path):
+        if failures.get(path):
+            failures[path] -= 1
+            raise DownloadError
+
+    with patch('crawler.pipeline.Page.fetch_body', lambda page: fail(page.path)), \
+            patch('crawler.pipeline.App.download_file', lambda app: fail(app.path)):
+        pipeline = Pipeline(root_path='/', max_depth=5,
+                            retries=build_retries(max_retries=1),
+                            app_retries=build_retries(max_retries=2))
+        crawled = crawl(pipeline)
+
+    # App of page 4 is given up after two retries
+    assert crawled == sorted(app_path(path) for path in MOCK_LINKS if path != '/page/4/')
+    assert pipeline.app_retries.stats.given_up == {'error': 1}
+
+
+@patch('crawler.pipeline.Page.fetch_body', MagicMock())
+def test_oversized_app_not_retried():
+    mock_download_file = MagicMock(side_effect=FileTooLargeError)
+    pipeline = Pipeline(root_path='/', max_depth=0, app_retries=build_retries(max_retries=2))
+
+    with patch('crawler.pipeline.App.download_file', mock_download_file):
+        assert crawl(pipeline) == []
+
+    assert mock_download_file.call_count == 1
+    assert pipeline.app_retries.stats.given_up == {'fatal': 1}
+
+
+@patch('crawler.pipeline.Page.fetch_body', MagicMock())
+@patch('crawler.pipeline.App.download_file', MagicMock())
+def test_apps_to_fetch():
+    pipeline = Pipeline(root_path='/', max_depth=5, apps_to_fetch=2, queue_size=1)
+
+    assert len(crawl(pipeline)) == 2
+    assert pipeline.stop.is_set()
+    assert not any(thread.is_alive() for stage in pipeline.stages.values() for thread in stage.threads)
+
+
+def test_item_error():
+    def fail(path):
+        if path in ('/page/4/', app_path('/page/1/')):
+            raise ValueError('broken')
+
+    # Broken page and app are skipped, the rest is crawled
+    with patch('crawler.pipeline.Page.fetch_body', lambda page: fail(page.path)), \
+            patch('crawler.pipeline.App.download_file', lambda app: fail(app.path)):
+        pipeline = Pipeline(root_path='/', max_depth=5)
+        crawled = crawl(pipeline)
+
+    assert crawled == sorted(app_path(path) for path in MOCK_LINKS if path not in ('/page/1/', '/page/4/'))
+    assert pipeline.error is None
+
+
+@patch('crawler.pipeline.Page.fetch_body', MagicMock())
+@patch('crawler.pipeline.App.download_file', MagicMock())
+def test_stage_error():
+    pipeline = Pipeline(root_path='/', max_depth=5)
+
+    with patch('crawler.pipeline.Page.children', MagicMock(side_effect=ValueError('broken'))), \
+            pytest.raises(ValueError, match='broken'):
+        crawl(pipeline)
+
+
+def test_stage_backpressure():
+    release = threading.Event()
+    stop = threading.Event()
+    output = queue.Queue()
+
+    def handler(item):
+        release.wait()
+        return [item * 10]
+
+    stage = Stage('test', handler, workers=1, queue_size=2, stop=stop)
+    stage.start(output, ends=2)
+
+    producer = threading.Thread(target=lambda: [stage.put(item) for item in range(5)] and stage.finish())
+    producer.start()
+    producer.join(timeout=0.5)
+
+    # One item is being handled, two are queued,
+    # and producer waits for free slot
+    assert producer.is_alive()
+    assert stage.queue.full()
+    assert stage.stats.busy == 1
+
+    release.set()
+    producer.join()
+    stage.join()
+
+    results = [output.get_nowait() for _ in range(output.qsize())]
+    assert results[:5] == [0, 10, 20, 30, 40]
+    # The next stage gets end marker for each of its workers
+    assert len(results) == 7
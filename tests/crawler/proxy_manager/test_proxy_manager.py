@@ -0,0 +1,116 @@
+from collections import Counter
+from unittest.mock import patch, MagicMock
+
+import pytest
+import requests
+
+from crawler.proxied_session import ProxiedSession
+from crawler.proxy_manager import ProxyManager, CircuitState
+
+
+def build_manager(proxies=('foo', 'bar')):
+    return ProxyManager(proxies=list(proxies), failure_threshold=2, base_backoff=10, max_backoff=40,
+                        probe_timeout=5)
+
+
+def test_weighted_routing():
+    manager = build_manager()
+    for _ in range(10):
+        manager.record_response('foo', latency=0.1, status_code=200)
+        manager.record_response('bar', latency=2.0, status_code=200)
+
+    chosen = Counter(manager.choose() for _ in range(1000))
+    assert chosen['foo'] > chosen['bar'] * 5
+
+
+def test_blocked_responses():
+    manager = build_manager()
+    manager.record_response('foo', latency=0.1, status_code=403)
+    manager.record_response('foo', latency=0.1, status_code=503)
+
+    stats = manager.stats['foo']
+    assert stats.blocks == 2
+    assert stats.state == CircuitState.OPEN
+    assert all(manager.choose() == 'bar' for _ in range(100))
+
+
+@patch('crawler.proxy_manager.random.uniform', return_value=1)
+@patch('crawler.proxy_manager.monotonic')
+def test_circuit_probing(mock_monotonic, mock_uniform):
+    manager = build_manager()
+
+    mock_monotonic.return_value = 0
+    manager.record_failure('foo')
+    manager.record_failure('foo')
+    assert manager.stats['foo'].retry_at == 10
+
+    # After backoff single probe is allowed
+    mock_monotonic.return_value = 11
+    assert manager.choose() == 'foo'
+    assert manager.choose() == 'bar'
+
+    # Failed probe doubles backoff
+    manager.record_failure('foo')
+    assert manager.stats['foo'].state == CircuitState.OPEN
+    assert manager.stats['foo'].retry_at == 31
+
+    mock_monotonic.return_value = 32
+    assert manager.choose() == 'foo'
+    manager.record_response('foo', latency=0.1, status_code=200)
+    assert manager.stats['foo'].state == CircuitState.CLOSED
+
+
+@patch('crawler.proxy_manager.random.uniform', return_value=1)
+@patch('crawler.proxy_manager.monotonic')
+def test_lost_probe(mock_monotonic, mock_uniform):
+    manager = build_manager()
+
+    mock_monotonic.return_value = 0
+    manager.record_failure('foo')
+    manager.record_failure('foo')
+
+    mock_monotonic.return_value = 11
+    assert manager.choose() == 'foo'
+
+    # Probe result is never reported
+    mock_monotonic.return_value = 15
+    assert manager.choose() == 'bar'
+
+    # After probe timeout proxy is back to OPEN with doubled backoff
+    mock_monotonic.return_value = 16
+    assert manager.choose() == 'bar'
+    assert manager.stats['foo'].state == CircuitState.OPEN
+    assert manager.stats['foo'].retry_at == 36
+
+    mock_monotonic.return_value = 36
+    assert manager.choose() == 'foo'
+
+
+def test_all_open():
+    manager = build_manager(proxies=['foo'])
+    manager.record_failure('foo')
+    manager.record_failure('foo')
+
+    assert manager.choose() == 'foo'
+
+
+def test_export():
+    manager = build_manager()
+    manager.record_response('foo', latency=0.5, status_code=200)
+
+    exported = {row['proxy']: row for row in manager.export()}
+    assert exported['foo']['requests'] == 1
+    assert exported['foo']['state'] == 'CLOSED'
+    assert exported['bar']['requests'] == 0
+
+
+@patch('crawler.session_pool.requests.Session')
+def test_proxied_session_reports_errors(mock_session_factory):
+    mock_session_factory.side_effect = lambda: MagicMock()
+    manager = build_manager(proxies=['foo'])
+
+    with pytest.raises(requests.ConnectionError):
+        with ProxiedSession(proxies=['foo'], manager=manager):
+            raise requests.ConnectionError
+
+    assert manager.stats['foo'].errors == 1
@@ -0,0 +1,70 @@
+from unittest.mock import patch, MagicMock
+
+import requests
+
+from crawler.rate_limiter import RateLimiter, RateLimitedAdapter, parse_retry_after
+
+MOCK_HOST = 'www.apkmirror.com'
+MOCK_PROXY = 'http://foo:8081'
+
+
+def build_limiter():
+    return RateLimiter(host_rate=2, host_burst=2, proxy_rate=1, proxy_burst=1, slowdown=0.5, recovery=0.5)
+
+
+@patch('crawler.rate_limiter.monotonic', return_value=0)
+def test_host_burst(mock_monotonic):
+    limiter = build_limiter()
+
+    delays = [limiter.reserve(MOCK_HOST) for _ in range(4)]
+    assert delays == [0, 0, 0.5, 1.0]
+    assert limiter.stats.delayed == 2
+
+
+@patch('crawler.rate_limiter.monotonic', return_value=0)
+def test_proxy_budget(mock_monotonic):
+    limiter = build_limiter()
+
+    # Proxy bucket is tighter than host one
+    assert limiter.reserve(MOCK_HOST, MOCK_PROXY) == 0
+    assert limiter.reserve(MOCK_HOST, MOCK_PROXY) == 1.0
+    # Other proxy has own budget
+    assert limiter.reserve(MOCK_HOST, 'http://bar:8081') == 0.5
+
+
+@patch('crawler.rate_limiter.monotonic', return_value=0)
+def test_adaptive_slowdown(mock_monotonic):
+    limiter = build_limiter()
+
+    limiter.record_response(MOCK_HOST, None, 429, retry_after=3)
+    bucket = limiter.hosts[MOCK_HOST]
+    assert bucket.rate == 1
+    assert limiter.reserve(MOCK_HOST) == 4.0
+
+    limiter.record_response(MOCK_HOST, None, 200)
+    limiter.record_response(MOCK_HOST, None, 200)
+    assert bucket.rate == 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('5') == 5
+    assert parse_retry_after('100000') == 600
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') is None
+    assert parse_retry_after('nan') is None
+    assert parse_retry_after(None) is None
+
+
+@patch('requests.adapters.HTTPAdapter.send')
+def test_adapter(mock_send):
+    response = requests.Response()
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    mock_send.return_value = response
+    limiter = MagicMock()
+
+    session = requests.Session()
+    session.mount('http://', RateLimitedAdapter(limiter))
+    session.get('http://%s/apk/' % MOCK_HOST, proxies={'http': MOCK_PROXY})
+
+    limiter.acquire.assert_called_once_with(MOCK_HOST, MOCK_PROXY)
+    limiter.record_response.assert_called_once_with(MOCK_HOST, MOCK_PROXY, 503, 1.0)
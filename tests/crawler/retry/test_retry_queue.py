@@ -0,0 +1,133 @@
+import asyncio
+from unittest.mock import patch, MagicMock
+from zipfile import BadZipFile
+
+import requests
+
+from crawler.errors import DownloadError, FileTooLargeError
+from crawler.page import Page, fetch_app
+from crawler.retry import RetryPolicy, RetryQueue, classify_error
+from crawler.spider import Spider
+from tests.helpers import build_extract_links
+
+MOCK_LINKS = {
+    '/': ['/page/1/', '/page/2/'],
+    '/page/1/': [],
+    '/page/2/': [],
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def build_policies():
+    return {
+        'server': RetryPolicy(max_retries=2, base_delay=10, max_delay=15, jitter=0),
+        'error': RetryPolicy(max_retries=1, base_delay=1, max_delay=1, jitter=0),
+    }
+
+
+def test_classify_error():
+    assert classify_error(requests.Timeout()) == 'timeout'
+    assert classify_error(asyncio.TimeoutError()) == 'timeout'
+    assert classify_error(DownloadError(status_code=403)) == 'blocked'
+    assert classify_error(DownloadError(status_code=502)) == 'server'
+    assert classify_error(DownloadError()) == 'error'
+    assert classify_error(FileTooLargeError()) == 'fatal'
+    assert classify_error(BadZipFile()) == 'fatal'
+
+
+def test_jitter():
+    policy = RetryPolicy(max_retries=5, base_delay=10, max_delay=100, jitter=0.5)
+    for _ in range(100):
+        assert 10 <= policy.get_delay(2) <= 30
+        assert 50 <= policy.get_delay(5) <= 150
+
+
+def test_backoff():
+    clock = FakeClock()
+    retries = RetryQueue(policies=build_policies())
+    page = Page(path='/page/1/')
+
+    with patch('crawler.retry.monotonic', clock.monotonic):
+        assert retries.schedule(page, DownloadError(status_code=500))
+        assert retries.pop_due() is None
+        assert retries.next_due_in() == 10
+
+        clock.sleep(10)
+        assert retries.pop_due() is page
+
+        # Delay doubles, but not above max_delay
+        assert retries.schedule(page, DownloadError(status_code=500))
+        assert retries.next_due_in() == 15
+
+        # Policy of other error class is applied
+        assert retries.schedule(Page(path='/page/2/'), DownloadError())
+        assert not retries.schedule(page, DownloadError(status_code=500))
+
+    assert page.retries_count == 2
+    assert retries.stats.scheduled == {'server': 2, 'error': 1}
+    assert retries.stats.given_up == {'server': 1}
+
+
+def test_spider_retries_later():
+    clock = FakeClock()
+    failures = {'/page/2/': 1}
+
+    def mock_fetch_body(page):
+        if failures.get(page.path):
+            failures[page.path] -= 1
+            raise DownloadError(status_code=503)
+
+    with patch('crawler.retry.monotonic', clock.monotonic), \
+            patch('crawler.spider.sleep', clock.sleep), \
+            patch('crawler.spider.Page.fetch_body', mock_fetch_body), \
+            patch('crawler.spider.Page.extract_links', build_extract_links(MOCK_LINKS)):
+        spider = Spider(root_path='/', retries=RetryQueue(policies=build_policies()))
+        crawled = [(page.path, clock.now) for page in spider]
+
+    # Failed page is yielded without apps, fresh page is
+    # not blocked, retry waits for its delay
+    assert crawled == [('/', 0), ('/page/2/', 0), ('/page/1/', 0), ('/page/2/', 10)]
+
+
+@patch('crawler.page.App')
+def test_app_retries(mock_app_constructor):
+    app = MagicMock(retries_count=0)
+    app.download_file.side_effect = [DownloadError(status_code=500), None]
+    mock_app_constructor.return_value = app
+
+    clock = FakeClock()
+    retries = RetryQueue(policies=build_policies())
+
+    with patch('crawler.retry.monotonic', clock.monotonic):
+        page = Page(path='/page/1/')
+        page.app_links = ['/apk/foo-download/']
+        page.app_retries = retries
+        assert list(page) == []
+
+        clock.sleep(10)
+        next_page = Page(path='/page/2/')
+        next_page.app_retries = retries
+        assert list(next_page) == [app]
+
+    assert app.retries_count == 1
+
+
+def test_oversized_app_not_retried():
+    app = MagicMock(retries_count=0)
+    app.download_file.side_effect = FileTooLargeError
+    retries = RetryQueue(policies=build_policies())
+
+    assert not fetch_app(app, retries)
+    assert len(retries) == 0
+    assert app.retries_count == 0
+    assert retries.stats.given_up == {'fatal': 1}
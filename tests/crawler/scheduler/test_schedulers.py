@@ -0,0 +1,73 @@
+from unittest.mock import patch
+
+from crawler.frontier_store import FrontierStore
+from crawler.page import Page
+from crawler.scheduler import BestFirstScheduler, BreadthFirstScheduler, DepthFirstScheduler
+from crawler.spider import Spider
+from tests.helpers import build_extract_links
+
+MOCK_LINKS = {
+    '/': ['/page/2/', '/apk/foo/'],
+    '/page/2/': ['/page/3/'],
+    '/page/3/': [],
+    '/apk/foo/': ['/apk/foo/bar/'],
+    '/apk/foo/bar/': [],
+}
+
+
+mock_extract_links = build_extract_links(MOCK_LINKS)
+
+
+def drain(scheduler):
+    return [scheduler.pop().path for _ in range(len(scheduler))]
+
+
+def test_depth_first():
+    scheduler = DepthFirstScheduler()
+    for path in ['/page/1/', '/page/2/', '/page/3/']:
+        scheduler.push(Page(path=path))
+    scheduler.defer(Page(path='/page/4/'))
+    scheduler.push(Page(path='/page/5/'))
+
+    assert drain(scheduler) == ['/page/5/', '/page/3/', '/page/2/', '/page/1/', '/page/4/']
+
+
+def test_breadth_first():
+    scheduler = BreadthFirstScheduler()
+    scheduler.push(Page(path='/page/1/', recursion_level=2))
+    scheduler.push(Page(path='/page/2/', recursion_level=1))
+    scheduler.push(Page(path='/page/3/', recursion_level=1))
+    scheduler.defer(Page(path='/page/4/'))
+
+    assert drain(scheduler) == ['/page/2/', '/page/3/', '/page/1/', '/page/4/']
+
+
+def test_best_first():
+    scheduler = BestFirstScheduler(url_weights={'/apk/': 10, '/page/': 0}, app_links_weight=1, depth_penalty=1)
+    rich_parent = Page(path='/page/1/')
+    rich_parent.app_links = {'/apk/1-download/', '/apk/2-download/', '/apk/3-download/'}
+
+    scheduler.push(Page(path='/page/2/', recursion_level=1))
+    scheduler.push(Page(path='/page/3/', recursion_level=1), parent=rich_parent)
+    scheduler.push(Page(path='/apk/foo/', recursion_level=3))
+
+    # 10 - 3 > 3 - 1 > 0 - 1
+    assert drain(scheduler) == ['/apk/foo/', '/page/3/', '/page/2/']
+
+
+@patch('crawler.spider.Page.extract_links', mock_extract_links)
+@patch('crawler.spider.Page.fetch_body', lambda page: None)
+def test_resume_order(tmp_path):
+    path = str(tmp_path / 'frontier.sqlite3')
+    build_scheduler = lambda: BestFirstScheduler(url_weights={'/apk/': 10}, depth_penalty=0)
+
+    with FrontierStore(path, commit_interval=1) as store:
+        crawled = iter(Spider(root_path='/', store=store, scheduler=build_scheduler()))
+        first_pages = [next(crawled).path, next(crawled).path]
+
+    with FrontierStore(path, commit_interval=1) as store:
+        rest_pages = [page.path for page in Spider(root_path='/', store=store, scheduler=build_scheduler())]
+
+    assert first_pages == ['/', '/apk/foo/']
+    # Not done page is crawled again in its stored place
+    assert rest_pages == ['/apk/foo/bar/', '/apk/foo/', '/page/2/', '/page/3/']
@@ -0,0 +1,45 @@
+import os
+import socket
+from time import time
+from unittest.mock import patch
+
+from crawler.scratch import PREFIX, make_tempfile, sweep_scratch_dir
+
+LOCAL_PREFIX = '%s%s-' % (PREFIX, socket.gethostname().replace('-', '_'))
+
+
+def test_make_tempfile(tmp_path):
+    scratch_dir = tmp_path / 'scratch'
+
+    with patch('crawler.scratch.config.scratch_dir', str(scratch_dir)):
+        file = make_tempfile()
+
+    assert os.path.dirname(file.name) == str(scratch_dir)
+    assert os.path.basename(file.name).startswith('%s%s-' % (LOCAL_PREFIX, os.getpid()))
+
+    file.close()
+    assert not os.listdir(str(scratch_dir))
+
+
+def test_sweep(tmp_path):
+    with patch('crawler.scratch.config.scratch_dir', str(tmp_path)):
+        own = make_tempfile()
+
+    # PID of killed process and unrelated file
+    stale = tmp_path / ('%s%s-foo.apk' % (LOCAL_PREFIX, 2 ** 22 + 1))
+    stale.write_bytes(b'foo')
+    other = tmp_path / 'other.apk'
+    other.write_bytes(b'bar')
+
+    # Files of other hosts are kept until they are too old,
+    # even if their PIDs aren't running locally
+    remote = tmp_path / ('%sother_host-%s-foo.apk' % (PREFIX, 2 ** 22 + 1))
+    remote.write_bytes(b'baz')
+    abandoned = tmp_path / ('%sother_host-%s-bar.apk' % (PREFIX, os.getpid()))
+    abandoned.write_bytes(b'baz')
+    os.utime(str(abandoned), (time() - 100, time() - 100))
+
+    assert sweep_scratch_dir(str(tmp_path), max_age=50) == 2
+    assert sorted(os.listdir(str(tmp_path))) == \
+        sorted([os.path.basename(own.name), remote.name, 'other.apk'])
+    own.close()
@@ -0,0 +1,95 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from crawler.main import write_files
+from crawler.page import Page, fetch_app
+from crawler.seen_index import SeenIndex
+
+
+def build_page(path, app_links):
+    page = Page(path=path)
+    page.app_links = set(app_links)
+    page.page_links = {'/page/9/'}
+    return page
+
+
+def test_remember(tmp_path):
+    index = SeenIndex(str(tmp_path / 'seen.sqlite3'))
+    index.remember('/apk/foo/foo-download/', 10)
+    index.remember('/apk/bar/bar-download/')
+
+    assert set(index.known_paths(['/apk/foo/foo-download/', '/apk/baz/baz-download/'])) == \
+        {'/apk/foo/foo-download/'}
+    assert index.is_known_download(10)
+    assert not index.is_known_download(11)
+
+
+def test_filter_page(tmp_path):
+    path = str(tmp_path / 'seen.sqlite3')
+    with patch('crawler.seen_index.time', lambda: 100.0):
+        previous = SeenIndex(path)
+        previous.remember('/apk/foo/foo-download/', 1)
+        previous.remember('/apk/bar/bar-download/', 2)
+
+    with patch('crawler.seen_index.time', lambda: 200.0):
+        index = SeenIndex(path)
+
+        # Listing with new app is descended, only new app is fetched
+        page = build_page('/page/2/', ['/apk/foo/foo-download/', '/apk/baz/baz-download/'])
+        assert index.filter_page(page)
+        assert page.app_links == {'/apk/baz/baz-download/'}
+
+        # Listing of known apps only is not
+        page = build_page('/page/3/', ['/apk/foo/foo-download/', '/apk/bar/bar-download/'])
+        assert not index.filter_page(page)
+        assert page.app_links == set()
+
+        # Neither app page, nor listing without apps are pruned
+        assert index.filter_page(build_page('/apk/foo/foo-app/', ['/apk/foo/foo-download/']))
+        assert index.filter_page(build_page('/page/4/', []))
+
+        # Apps, seen by the current crawl, don't prune listing
+        index.remember('/apk/baz/baz-download/', 3)
+        page = build_page('/page/5/', ['/apk/baz/baz-download/'])
+        assert index.filter_page(page)
+        assert page.app_links == set()
+
+    assert index.stats.known_apps == 5
+    assert index.stats.new_apps == 1
+    assert index.stats.pruned_pages == 1
+
+
+def test_fetch_app_skips_known_download(tmp_path):
+    index = SeenIndex(str(tmp_path / 'seen.sqlite3'))
+    index.remember('/apk/foo/foo-download/', 1)
+
+    def fetch_download_id(app):
+        app.download_id = 1 if 'foo' in app.path else 2
+
+    with patch('crawler.page.get_seen_index', lambda: index), \
+            patch('crawler.page.App.fetch_download_id', fetch_download_id), \
+            patch('crawler.page.App.download_file', MagicMock()) as download_file:
+        from crawler.app import App
+
+        assert not fetch_app(App(path='/apk/foo/foo-2-download/'))
+        assert fetch_app(App(path='/apk/bar/bar-download/'))
+
+    assert download_file.call_count == 1
+    assert index.stats.known_downloads == 1
+    # Fetched app isn't remembered before its files are written
+    assert set(index.known_paths(['/apk/foo/foo-2-download/', '/apk/bar/bar-download/'])) == \
+        {'/apk/foo/foo-2-download/'}
+
+
+def test_write_files_remembers_written_apps(tmp_path):
+    index = SeenIndex(str(tmp_path / 'seen.sqlite3'))
+    apps = [MagicMock(path='/apk/foo/foo-download/', download_id=1),
+            MagicMock(path='/apk/bar/bar-download/', download_id=2)]
+    sink = MagicMock()
+    sink.write_batch.side_effect = [None, OSError('disk full')]
+
+    with patch('crawler.main.get_seen_index', lambda: index), pytest.raises(OSError):
+        write_files(apps, sink)
+
+    assert set(index.known_paths(app.path for app in apps)) == {'/apk/foo/foo-download/'}
@@ -0,0 +1,65 @@
+from unittest.mock import patch, MagicMock
+
+from crawler.proxied_session import ProxiedSession
+from crawler.session_pool import SessionPool
+
+MOCK_PROXY = 'foo'
+
+
+@patch('crawler.session_pool.requests.Session')
+def test_reuse(mock_session_factory):
+    mock_session_factory.side_effect = lambda: MagicMock()
+    pool = SessionPool(pool_size=1, idle_timeout=60)
+
+    with ProxiedSession(proxies=[MOCK_PROXY], pool=pool) as session_1:
+        ...
+    with ProxiedSession(proxies=[MOCK_PROXY], pool=pool) as session_2:
+        ...
+
+    assert session_1 is session_2
+    assert pool.stats.created == 1
+    assert pool.stats.reused == 1
+
+
+@patch('crawler.session_pool.requests.Session')
+def test_user_agent_rotated(mock_session_factory):
+    mock_session_factory.side_effect = lambda: MagicMock()
+    pool = SessionPool(pool_size=1, idle_timeout=60)
+
+    with ProxiedSession(proxies=[MOCK_PROXY], pool=pool) as session:
+        ua_1 = session.headers['User-Agent']
+    with ProxiedSession(proxies=[MOCK_PROXY], pool=pool) as session:
+        ua_2 = session.headers['User-Agent']
+
+    assert ua_1 != ua_2
+
+
+@patch('crawler.session_pool.requests.Session')
+def test_pool_size(mock_session_factory):
+    mock_session_factory.side_effect = lambda: MagicMock()
+    pool = SessionPool(pool_size=1, idle_timeout=60)
+
+    session_1 = pool.acquire(MOCK_PROXY)
+    session_2 = pool.acquire(MOCK_PROXY)
+    pool.release(MOCK_PROXY, session_1)
+    pool.release(MOCK_PROXY, session_2)
+
+    assert len(pool) == 1
+    assert pool.stats.discarded == 1
+    session_2.close.assert_called()
+
+
+@patch('crawler.session_pool.monotonic')
+@patch('crawler.session_pool.requests.Session')
+def test_idle_eviction(mock_session_factory, mock_monotonic):
+    mock_session_factory.side_effect = lambda: MagicMock()
+    pool = SessionPool(pool_size=1, idle_timeout=60)
+
+    mock_monotonic.return_value = 0
+    session = pool.acquire(MOCK_PROXY)
+    pool.release(MOCK_PROXY, session)
+
+    mock_monotonic.return_value = 61
+    assert pool.acquire(MOCK_PROXY) is not session
+    assert pool.stats.evicted == 1
+    session.close.assert_called()
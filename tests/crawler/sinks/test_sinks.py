@@ -0,0 +1,151 @@
+import csv
+import json
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from crawler.config import config
+from crawler.sinks import FIELDS, SINKS, CsvSink, FileSink, JsonLinesSink, SqliteSink, TextSink, make_sink
+from crawler.structs import File, FileBatch
+
+FILES = [
+    File('app.apk', 'classes.dex', 'application/vnd.android.dex', 100, 50, 0x1234abcd, 'ab' * 32),
+    File('app.apk', 'res/icon.png', 'image/png', 10, 10),
+]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def count_lines(path):
+    with open(path) as f:
+        return sum(1 for _ in f)
+
+
+def test_batch_size(tmp_path):
+    path = str(tmp_path / 'files.txt')
+    with TextSink(path, batch_size=3, flush_interval=60) as sink:
+        sink.write(FILES[0])
+        sink.write(FILES[1])
+        assert count_lines(path) == 0
+
+        sink.write(FILES[0])
+        assert count_lines(path) == 3
+        sink.write(FILES[1])
+
+    assert count_lines(path) == 4
+
+
+def test_flush_interval(tmp_path):
+    path = str(tmp_path / 'files.txt')
+    clock = FakeClock()
+    with patch('crawler.sinks.monotonic', clock):
+        with TextSink(path, batch_size=100, flush_interval=5) as sink:
+            sink.write(FILES[0])
+            assert count_lines(path) == 0
+
+            clock.now = 5.0
+            sink.write(FILES[1])
+            assert count_lines(path) == 2
+
+
+def test_text_is_legacy_format(tmp_path):
+    path = str(tmp_path / 'files.txt')
+    with TextSink(path) as sink:
+        sink.write_many(FILES)
+
+    with open(path) as f:
+        assert f.read() == ''.join(file.dumps() for file in FILES)
+
+
+def test_jsonl(tmp_path):
+    path = str(tmp_path / 'files.jsonl')
+    with JsonLinesSink(path) as sink:
+        sink.write_many(FILES)
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    assert records[0]['file_name'] == 'classes.dex'
+    assert records[0]['crc'] == 0x1234abcd
+    assert records[1]['sha256'] is None
+    assert list(records[1]) == list(FIELDS)
+
+
+def test_csv_header_written_once(tmp_path):
+    path = str(tmp_path / 'files.csv')
+    for _ in range(2):
+        with CsvSink(path) as sink:
+            sink.write_many(FILES)
+
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+
+    assert rows[0] == list(FIELDS)
+    assert len(rows) == 1 + 2 * len(FILES)
+    assert rows[1][1] == 'classes.dex'
+
+
+@pytest.mark.parametrize('fsync', ['never', 'flush', 'close'])
+def test_sqlite(tmp_path, fsync):
+    path = str(tmp_path / 'files.sqlite3')
+    with SqliteSink(path, batch_size=1, fsync=fsync) as sink:
+        sink.write_many(FILES)
+
+    connection = sqlite3.connect(path)
+    rows = connection.execute('SELECT file_name, size_deflated, crc FROM files ORDER BY rowid').fetchall()
+    connection.close()
+
+    assert rows == [('classes.dex', 100, 0x1234abcd), ('res/icon.png', 10, None)]
+
+
+def test_parquet(tmp_path):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+
+    path = str(tmp_path / 'files.parquet')
+    with make_sink('parquet', path=path, batch_size=1) as sink:
+        sink.write_many(FILES)
+
+    table = pyarrow_parquet.read_table(path)
+    assert table.column_names == list(FIELDS)
+    assert table.num_rows == len(FILES)
+
+
+def test_make_sink_default_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with patch.object(config, 'output_format', 'jsonl'), patch.object(config, 'output_path', None):
+        with make_sink() as sink:
+            assert isinstance(sink, JsonLinesSink)
+            assert sink.path == 'files.jsonl'
+
+
+def test_unknown_fsync_policy(tmp_path):
+    with pytest.raises(AssertionError):
+        TextSink(str(tmp_path / 'files.txt'), fsync='sometimes')
+
+
+def test_abstract_hooks(tmp_path):
+    class IncompleteSink(FileSink):
+        ...
+
+    with pytest.raises(TypeError):
+        IncompleteSink(str(tmp_path / 'files.txt'))
+
+    assert not any(sink_class.__abstractmethods__ for sink_class in SINKS.values())
+
+
+def test_write_batch(tmp_path):
+    path = str(tmp_path / 'files.jsonl')
+    with JsonLinesSink(path, batch_size=2) as sink:
+        sink.write_batch(FileBatch.from_files(FILES))
+
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+
+    assert [tuple(record.values()) for record in records] == [file.astuple() for file in FILES]
@@ -1,24 +1,93 @@
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from crawler.errors import DownloadError
 from crawler.spider import Spider
+from tests.helpers import build_extract_links, build_retries
 
+MOCK_LINKS = {
+    '/': ['/page/1/', '/page/2/'],
+    '/page/1/': ['/page/3/', '/'],
+    '/page/2/': ['/page/3/', '/page/1/'],
+    '/page/3/': ['/page/4/'],
+    '/page/4/': [],
+}
 
+
+mock_extract_links = build_extract_links(MOCK_LINKS)
+
+
+def crawl(spider):
+    with patch('crawler.spider.Page.extract_links', mock_extract_links):
+        return [(page.path, page.recursion_level) for page in spider]
+
+
+@patch('crawler.spider.Page.fetch_body', MagicMock())
 def test_basic():
-    assert False
+    # Depth-first, the last found link goes first
+    assert crawl(Spider(root_path='/')) == [
+        ('/', 0),
+        ('/page/2/', 1),
+        ('/page/3/', 2),
+        ('/page/4/', 3),
+        ('/page/1/', 1),
+    ]
 
 
+@patch('crawler.spider.Page.fetch_body', MagicMock())
 def test_existing_pages():
-    assert False
+    crawled = crawl(Spider(root_path='/'))
+
+    # Pages, linked from several pages, are crawled once
+    paths = [path for path, _ in crawled]
+    assert sorted(paths) == sorted(MOCK_LINKS)
 
 
+@patch('crawler.spider.Page.fetch_body', MagicMock())
 def test_recustion_level():
-    assert False
+    assert crawl(Spider(root_path='/', max_depth=1)) == [
+        ('/', 0),
+        ('/page/2/', 1),
+        ('/page/1/', 1),
+    ]
+    assert crawl(Spider(root_path='/page/3/', max_depth=0)) == [('/page/3/', 0)]
 
 
 def test_task_try_on_failure():
-    assert False
+    failures = {'/page/2/': 1}
+
+    def mock_fetch_body(page):
+        if failures.get(page.path):
+            failures[page.path] -= 1
+            raise DownloadError
+
+    with patch('crawler.spider.Page.fetch_body', mock_fetch_body):
+        spider = Spider(root_path='/', retries=build_retries(max_retries=3))
+        crawled = crawl(spider)
+
+    # Failed page is yielded without links and retried
+    # after its delay, its children are crawled then
+    assert crawled == [
+        ('/', 0),
+        ('/page/2/', 1),
+        ('/page/2/', 1),
+        ('/page/3/', 2),
+        ('/page/4/', 3),
+        ('/page/1/', 1),
+    ]
+    assert spider.retries.stats.scheduled == {'error': 1}
 
 
 def test_max_retries_count():
-    assert False
+    fetch_body = MagicMock(side_effect=DownloadError)
+
+    with patch('crawler.spider.Page.fetch_body', fetch_body):
+        spider = Spider(root_path='/', retries=build_retries(max_retries=2))
+        crawled = crawl(spider)
+
+    # Failed tries, after which page is retried, are yielded
+    # without apps. The last of three tries exhausts retries
+    # and drops page from crawling without yielding it
+    assert crawled == [('/', 0), ('/', 0)]
+    assert fetch_body.call_count == 3
+    assert spider.retries.stats.given_up == {'error': 1}
+    assert not spider.retries
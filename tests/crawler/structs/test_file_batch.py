@@ -0,0 +1,43 @@
+import pickle
+
+import pytest
+
+from crawler.structs import File, FileBatch
+
+FILES = [
+    File('app.apk', 'classes.dex', 'application/vnd.android.dex', 100, 50, 0x1234abcd, 'ab' * 32),
+    File('app.apk', 'res/icon.png', 'image/png', 10, 10),
+    File('app.apk', 'META-INF/'),
+]
+
+
+def test_file_is_slotted():
+    file = File('app.apk', 'classes.dex')
+    with pytest.raises(AttributeError):
+        file.foo = 'bar'
+
+    file.sha256 = 'ab' * 32
+    assert file == File('app.apk', 'classes.dex', sha256='ab' * 32)
+    assert pickle.loads(pickle.dumps(file)) == file
+
+
+def test_round_trip():
+    batch = FileBatch.from_files(FILES)
+
+    assert batch.archive_name == 'app.apk'
+    assert len(batch) == len(FILES)
+    assert list(batch) == FILES
+    assert list(batch.rows()) == [file.astuple() for file in FILES]
+
+
+def test_mime_types_are_interned():
+    batch = FileBatch('app.apk')
+    batch.append('a.png', ''.join(['image/', 'png']), 1, 1)
+    batch.append('b.png', ''.join(['image/', 'png']), 1, 1)
+
+    assert batch.mime_types[0] is batch.mime_types[1]
+
+
+def test_pickle():
+    batch = FileBatch.from_files(FILES)
+    assert list(pickle.loads(pickle.dumps(batch))) == FILES
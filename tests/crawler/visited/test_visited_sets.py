@@ -0,0 +1,38 @@
+import pytest
+
+from crawler.visited import HashedPathSet, ScalableBloomFilter, make_visited_set
+
+MOCK_PATHS = ['/apk/vendor-%s/app-%s/' % (i, i) for i in range(5000)]
+MOCK_UNSEEN_PATHS = ['/page/%s/' % i for i in range(5000)]
+
+
+@pytest.mark.parametrize('visited_set_class', [HashedPathSet, ScalableBloomFilter])
+def test_no_false_negatives(visited_set_class):
+    visited = visited_set_class()
+    for path in MOCK_PATHS:
+        visited.add(path)
+
+    assert all(path in visited for path in MOCK_PATHS)
+
+
+def test_hashed_set():
+    visited = HashedPathSet(MOCK_PATHS)
+    visited.update(MOCK_PATHS)
+
+    assert len(visited) == len(MOCK_PATHS)
+    assert not any(path in visited for path in MOCK_UNSEEN_PATHS)
+
+
+def test_bloom_error_rate():
+    visited = ScalableBloomFilter(MOCK_PATHS, error_rate=0.01, capacity=100)
+
+    assert len(visited.filters) > 1
+    # Leave some room for sampling noise
+    false_positives = sum(path in visited for path in MOCK_UNSEEN_PATHS)
+    assert false_positives / len(MOCK_UNSEEN_PATHS) < 0.02
+
+
+def test_make_visited_set():
+    assert isinstance(make_visited_set('set'), set)
+    assert isinstance(make_visited_set('hashed'), HashedPathSet)
+    assert isinstance(make_visited_set('bloom'), ScalableBloomFilter)
@@ -0,0 +1,103 @@
+import io
+import tempfile
+import zipfile
+from unittest.mock import patch
+from zipfile import ZipFile
+
+import pytest
+
+from crawler.errors import BadArchiveError
+from crawler.zip_directory import MAX_TAIL_SIZE, ZIP64_END_OF_CENTRAL_DIRECTORY, \
+    find_central_directory, iter_central_directory, parse_zip64_central_directory, read_central_directory
+
+
+def build_archive(comment: bytes = b'') -> bytes:
+    buffer = io.BytesIO()
+    with ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('AndroidManifest.xml', b'<manifest/>' * 100)
+        archive.writestr('classes.dex', b'dex\n035\x00' * 10)
+        archive.writestr('res/drawable/icon.png', b'')
+        archive.writestr('assets/юникод.txt', b'foo')
+        archive.comment = comment
+    return buffer.getvalue()
+
+
+def list_archive(archive: bytes):
+    tail = archive[-MAX_TAIL_SIZE:]
+    directory = find_central_directory(tail)
+    if directory.zip64_record_offset is not None:
+        record_end = directory.zip64_record_offset + ZIP64_END_OF_CENTRAL_DIRECTORY.size
+        directory = parse_zip64_central_directory(
+            archive[directory.zip64_record_offset:record_end])
+
+    data = archive[directory.offset:directory.offset + directory.size]
+    return [(entry.filename, entry.file_size, entry.compress_size, entry.crc)
+            for entry in iter_central_directory(data)]
+
+
+def list_archive_with_zipfile(archive: bytes):
+    with ZipFile(io.BytesIO(archive)) as zip_file:
+        return [(info.filename, info.file_size, info.compress_size, info.CRC)
+                for info in zip_file.infolist()]
+
+
+def test_basic():
+    archive = build_archive()
+    assert list_archive(archive) == list_archive_with_zipfile(archive)
+
+
+def test_comment():
+    archive = build_archive(comment=b'archive comment')
+    assert list_archive(archive) == list_archive_with_zipfile(archive)
+
+
+def test_signature_in_comment():
+    # ZipFile itself can't read such archives
+    expected = list_archive_with_zipfile(build_archive())
+    archive = build_archive(comment=b'PK\x05\x06 looks like a signature')
+    assert list_archive(archive) == expected
+
+
+def test_zip64():
+    with patch('zipfile.ZIP64_LIMIT', 8), patch('zipfile.ZIP_FILECOUNT_LIMIT', 2):
+        archive = build_archive()
+
+    directory = find_central_directory(archive[-MAX_TAIL_SIZE:])
+    assert directory.zip64_record_offset is not None
+    assert list_archive(archive) == list_archive_with_zipfile(archive)
+
+
+def test_not_an_archive():
+    with pytest.raises(BadArchiveError):
+        find_central_directory(b'<html></html>')
+
+
+def read_archive(archive: bytes):
+    with tempfile.TemporaryFile() as file:
+        file.write(archive)
+        file.flush()
+        return [(entry.filename, entry.file_size, entry.compress_size, entry.crc)
+                for entry in read_central_directory(file)]
+
+
+def test_read_central_directory():
+    archive = build_archive(comment=b'archive comment')
+    assert read_archive(archive) == list_archive_with_zipfile(archive)
+
+    with patch('zipfile.ZIP64_LIMIT', 8), patch('zipfile.ZIP_FILECOUNT_LIMIT', 2):
+        archive = build_archive()
+    assert read_archive(archive) == list_archive_with_zipfile(archive)
+
+
+@pytest.mark.parametrize('archive', [
+    b'',
+    b'<html></html>',
+    # Central directory is cut off
+    build_archive()[-100:],
+    # Broken file header in the middle of central directory
+    build_archive().replace(b'PK\x01\x02', b'PK\x01\x00', 2).replace(b'PK\x01\x00', b'PK\x01\x02', 1),
+])
+def test_read_broken_archive(archive):
+    # Mapping is closed, even if parser fails midway
+    with pytest.raises(BadArchiveError):
+        read_archive(archive)
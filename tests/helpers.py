@@ -0,0 +1,51 @@
+"""
+Mocks, shared by tests of several modules.
+"""
+import typing as tp
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+from crawler.retry import RetryPolicy, RetryQueue
+
+
+def build_extract_links(page_links: tp.Dict[str, tp.Iterable[str]],
+                        app_links: tp.Dict[str, tp.Iterable[str]] = None) -> tp.Callable:
+    """
+    Builds replacement of Page.extract_links, which takes links
+    of page from given site graph by page path. Links are taken
+    as is, so their order is kept.
+    """
+    def mock_extract_links(page, parser=None):
+        page.page_links = page_links[page.path]
+        if app_links is not None:
+            page.app_links = app_links[page.path]
+
+    return mock_extract_links
+
+
+def build_retries(max_retries: int) -> RetryQueue:
+    # Retries are due right away
+    return RetryQueue(policies={
+        'error': RetryPolicy(max_retries=max_retries, base_delay=0, max_delay=0, jitter=0),
+    })
+
+
+def build_proxied_session(response: MagicMock = None,
+                          get: tp.Callable = None) -> tp.Tuple[tp.Callable, MagicMock]:
+    """
+    Builds replacement of ProxiedSession, which yields mock session.
+    Session returns `response` or result of `get` to each request.
+
+    :return: replacement and session.
+    """
+    session = MagicMock()
+    if get is not None:
+        session.get.side_effect = get
+    else:
+        session.get.return_value = response
+
+    @contextmanager
+    def mock_proxied_session(proxies):
+        yield session
+
+    return mock_proxied_session, session